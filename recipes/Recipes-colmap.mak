@@ -108,6 +108,7 @@ define recipe-colmap-prepare-images
 			--output-masked-image-dir= \
 			--filter=$$MASK_TYPE \
 			--workers=16 ; \
+			cp -lf $(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/images/*.* $(@)/images 2>/dev/null || \
 			cp $(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/images/*.* $(@)/images ; \
 		elif echo "$(1)" | grep -q "mode=direct"; then \
 			echo ">>> [DIRECT MODE] Generating masked images with filter='$$MASK_TYPE'"; \
@@ -123,17 +124,23 @@ define recipe-colmap-prepare-images
 		fi; \
 	else \
 		echo ">>> [OPEN MODE] No masking applied. Copying raw images."; \
+		cp -lf $(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/images/*.* $(@)/images 2>/dev/null || \
 		cp $(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/images/*.* $(@)/images ; \
 	fi
 endef
 
+# Seeded from the feature cache when an earlier extraction used the same source frames,
+# masks (and masking mode) and options.  The models of the default matrix never share a
+# key with each other (0/1 and 2/3 differ in masking, 0/2 and 1/3 in extract options):
+# the cache saves the extraction when a model is rebuilt, or when another project or
+# target extracts the same frames the same way.
 define recipe-colmap-feature-extracter
 	echo ">>> Feature extractor with options: $(1) $(2)"; \
-	docker compose -f ./docker/docker-compose.yml \
-	run --rm --user 1000:1000 colmap \
-	colmap feature_extractor \
-		--database_path /$(@)/db.db \
-		--image_path /$(@)/images \
+	poetry run python scripts/cli.py colmap-features \
+		--database-path=$(@)/db.db \
+		--image-path=$(@)/images \
+		--source-image-path=$(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/images \
+		--mask-dir=$(@)/masks \
 		--ImageReader.single_camera 1 \
 		--ImageReader.camera_model PINHOLE \
 		--SiftExtraction.use_gpu 1 \
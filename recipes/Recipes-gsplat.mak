@@ -79,15 +79,13 @@ define recipe-gsplat-model
 	echo "Expecting final file: /$(@)/point_cloud/$$ITER_DIR/point_cloud.splat"; \
 	docker compose -f ./docker/docker-compose.yml \
 	run --rm --user 1000:1000 gsplat \
-	python train.py \
+	sh -c "python train.py \
 		--source_path /$(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/colmap/$(call ELEM5,$(@),4)/sparse \
 		--model_path /$(@) \
 		--images /$(call ELEM5,$(@),1)/$(call ELEM5,$(@),2)/colmap/$(call ELEM5,$(@),4)/images \
 		$$FLAT_GSPLAT_OPTS; \
-	echo "Running convert loop inside single container..."; \
-	docker compose -f ./docker/docker-compose.yml \
-	run --rm --user 1000:1000 gsplat \
-	sh -c "find /$(@)/point_cloud -type f -name \"point_cloud.ply\" | while read ply_file; do \
+	echo 'Running convert loop in the training container...'; \
+	find /$(@)/point_cloud -type f -name \"point_cloud.ply\" | while read ply_file; do \
 		ply_dir=\$$(dirname \"\$$ply_file\"); \
 		echo \"Converting \$$ply_file to \$$ply_dir/point_cloud.splat\"; \
 		python /opt/point-cloud-tools/convert.py \"\$$ply_file\" \"\$$ply_dir/point_cloud.splat\"; \
@@ -38,3 +38,57 @@ define recipe-images-folder
 		--greyscale ; \
 	fi
 endef
+
+# expects targets like:  batch-images-DJI_0145
+# -> extracts every base-roots variant of the video from one decode per ffmpeg pass; each
+#    format/fps/width is scaled once and its filter variants are copies of it, and a pass
+#    writes at most $(max-outputs-per-pass) outputs
+define recipe-images-batch
+	@echo -------------------------------------------------------------------
+	@echo Batch extracting images: $(call ELEM1,$(@),3)
+	@echo -------------------------------------------------------------------
+	$(poetry-base) extract-frames-batch $(videos-folder)/$(call ELEM1,$(@),3).MP4 \
+		--projects-folder=$(projects-folder) \
+		--skip=$(or $($(call ELEM1,$(@),3).skip),0) \
+		$(foreach base,$(base-roots),--variant=$(base)) \
+		--max-outputs-per-pass=$(max-outputs-per-pass) \
+		$(extract-options)
+endef
+
+# Same targets as recipe-images-folder, but frames are decoded, filtered and
+# written with EXIF in one streaming pass (select with extract-mode = stream)
+define recipe-images-stream
+	@echo -------------------------------------------------------------------
+	@echo Streaming images: $(call ELEM5,$(@),2)
+	@echo -------------------------------------------------------------------
+	$(poetry-base) extract-frames $(videos-folder)/$(call ELEM3,$(@),2).MP4 \
+		--output-dir=$(@) \
+		--skip=$(or $($(call ELEM3,$(@),2).skip),0) \
+		--tag=$(call ELEM5,$(@),2) \
+		--format=$(call ELEM4,$(call ELEM3,$(@),3),1) \
+		--fps=$(call ELEM4,$(call ELEM3,$(@),3),2) \
+		--max_width=$(call ELEM4,$(call ELEM3,$(@),3),3) \
+		--stream \
+		--filter=$(call ELEM4,$(call ELEM3,$(@),3),4) \
+		--workers=8 \
+		$(extract-options)
+endef
+
+# Same targets as recipe-images-folder, populated from the frame store with hardlinks
+# (select with extract-mode = cache).  Filters are applied once, inside the store.
+define recipe-images-cache
+	@echo -------------------------------------------------------------------
+	@echo Cached images: $(call ELEM5,$(@),2)
+	@echo -------------------------------------------------------------------
+	$(poetry-base) extract-frames $(videos-folder)/$(call ELEM3,$(@),2).MP4 \
+		--output-dir=$(@) \
+		--skip=$(or $($(call ELEM3,$(@),2).skip),0) \
+		--tag=$(call ELEM5,$(@),2) \
+		--format=$(call ELEM4,$(call ELEM3,$(@),3),1) \
+		--fps=$(call ELEM4,$(call ELEM3,$(@),3),2) \
+		--max_width=$(call ELEM4,$(call ELEM3,$(@),3),3) \
+		--cache-dir=$(frame-cache-folder) \
+		--filter=$(call ELEM4,$(call ELEM3,$(@),3),4) \
+		--workers=8 \
+		$(extract-options)
+endef
@@ -0,0 +1,239 @@
+"""
+Asyncio runner: several projects' pipelines in one Python process.
+
+Each step is started with asyncio.create_subprocess_exec through the session executor, so
+one process can keep many containers busy instead of make launching a `poetry run python
+scripts/cli.py` per project.  Steps are grouped into tool classes, each with a bounded
+semaphore (how many may run at once across all projects) and a timeout:
+
+    sift    colmap feature_extractor
+    match   colmap *_matcher / matches_importer
+    mapper  colmap mapper
+    densify OpenMVS DensifyPointCloud
+    gsplat  gsplat train.py
+    other   everything else (model_converter, InterfaceCOLMAP, splat conversion, ...)
+
+Output is streamed to the log as it arrives (progress lines rate-limited).  On timeout or
+cancellation (Ctrl-C) the step's tool is terminated, then killed, where it runs (inside
+the container for docker executors) before its semaphore slot is released; a failing step
+cancels the rest of its own project but not the other projects.
+
+The argv of every step comes from the same step functions the synchronous pipelines use
+(via their `run=` parameter), so both runners always issue identical commands.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from loguru import logger
+
+from scripts.errors import PipelineError, QualityCheckFailed, StepFailed
+from scripts.executors import get_executor, pipeline_session
+from scripts.log_capture import parse_progress
+
+DEFAULT_LIMITS = {"sift": 2, "match": 2, "mapper": 2, "densify": 1, "gsplat": 1, "other": 4}
+DEFAULT_TIMEOUTS = {  # seconds
+    "sift": 2 * 3600,
+    "match": 4 * 3600,
+    "mapper": 8 * 3600,
+    "densify": 8 * 3600,
+    "gsplat": 12 * 3600,
+    "other": 3600,
+}
+TERMINATE_GRACE = 10  # seconds between SIGTERM and SIGKILL
+
+
+def tool_class(cmd_suffix):
+    """Semaphore/timeout class of a step `[service, tool, args...]`."""
+    service = str(cmd_suffix[0])
+    tool = os.path.basename(str(cmd_suffix[1])) if len(cmd_suffix) > 1 else ""
+    command = str(cmd_suffix[2]) if len(cmd_suffix) > 2 else ""
+    if service == "colmap":
+        if command == "feature_extractor":
+            return "sift"
+        if command.endswith("_matcher") or command == "matches_importer":
+            return "match"
+        if command == "mapper":
+            return "mapper"
+    if service == "openmvs" and tool == "DensifyPointCloud":
+        return "densify"
+    if service == "gsplat" and "train.py" in [str(c) for c in cmd_suffix]:
+        return "gsplat"
+    return "other"
+
+
+def command_of(step_func, *args, **kwargs):
+    """(cmd_suffix, step_name) that a step function (taking run=...) would run, without running it."""
+    recorded = []
+    step_func(*args, run=lambda cmd_suffix, step_name: recorded.append((cmd_suffix, step_name)), **kwargs)
+    return recorded[0]
+
+
+async def _terminate(process, executor, full_cmd):
+    """Stop a step's tool, in its container first: the host process may only be a docker client."""
+    if process.returncode is not None:
+        return
+    try:
+        if not await asyncio.to_thread(executor.terminate, full_cmd, "TERM"):
+            process.terminate()
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        # shielded: even if cancelled again, the tool is gone before the slot is released,
+        # and the docker exec runs in a thread so the other projects keep streaming
+        kill = asyncio.ensure_future(asyncio.to_thread(executor.terminate, full_cmd, "KILL"))
+        cancelled = False
+        while not kill.done():
+            try:
+                await asyncio.shield(kill)
+            except asyncio.CancelledError:
+                cancelled = True
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if cancelled:
+            raise asyncio.CancelledError
+
+
+class AsyncRunner:
+    """Runs steps as asyncio subprocesses, limited per tool class."""
+
+    def __init__(self, limits=None, timeouts=None, progress_interval=2.0):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.semaphores = {name: asyncio.BoundedSemaphore(n) for name, n in self.limits.items()}
+        self.progress_interval = progress_interval
+
+    async def _stream(self, process, step_name, tail):
+        last_logged = 0.0
+        async for raw in process.stdout:
+            # tqdm redraws with \r: keep the latest state of the line
+            line = raw.decode(errors="replace").rstrip().rsplit("\r", 1)[-1].rstrip()
+            if not line:
+                continue
+            tail.append(line)
+            if parse_progress(line) is not None:
+                now = time.time()
+                if now - last_logged < self.progress_interval:
+                    continue
+                last_logged = now
+            logger.info(f"[{step_name}] {line}")
+        return await process.wait()
+
+    async def run(self, cmd_suffix, step_name, timeout=None):
+        """Run one step; raises StepFailed when it fails, PipelineError when it times out."""
+        tool = tool_class(cmd_suffix)
+        timeout = timeout or self.timeouts[tool]
+        async with self.semaphores[tool]:
+            # the docker-exec executor may start a container here, which blocks
+            executor = get_executor()
+            full_cmd = await asyncio.to_thread(executor.command, str(cmd_suffix[0]),
+                                               [str(c) for c in cmd_suffix[1:]], step_name)
+            logger.info(f"👉 Running [{step_name}] ({tool}): {' '.join(full_cmd)}")
+            start_time = time.time()
+            process = await asyncio.create_subprocess_exec(
+                *full_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                limit=1024 * 1024)  # tqdm lines without newlines can get long
+            tail = deque(maxlen=20)
+            try:
+                returncode = await asyncio.wait_for(self._stream(process, step_name, tail), timeout)
+            except asyncio.TimeoutError:
+                await _terminate(process, executor, full_cmd)
+                raise PipelineError(f"Step '{step_name}' timed out after {timeout} sec", step_name) from None
+            except asyncio.CancelledError:
+                await _terminate(process, executor, full_cmd)
+                logger.warning(f"🛑 Cancelled [{step_name}]")
+                raise
+
+        duration = time.time() - start_time
+        if returncode != 0:
+            for line in tail:
+                logger.error(f"[{step_name}] {line}")
+            raise StepFailed(step_name, returncode)
+        logger.success(f"✅ Step succeeded: {step_name} (Elapsed time: {duration:.1f} sec)")
+        return duration
+
+    async def run_step(self, step_func, *args, **kwargs):
+        """Run a pipeline step function (e.g. run_colmap_mapper) asynchronously."""
+        return await self.run(*command_of(step_func, *args, **kwargs))
+
+
+async def colmap_project(runner, project_dir, model="0", gsplat=True, mvs=True, iterations=30000, sh_degree=3):
+    """
+    One project: features → matches → mapper, then PLY export, gsplat and OpenMVS concurrently.
+    Same folder layout as run-graph (colmap/<model>, gsplat/<model>, mvs/<model>).
+    """
+    from scripts import colmap_pipeline as colmap
+    from scripts import openmvs_pipeline as openmvs
+    from scripts.colmap_database import check_view_graph
+    from scripts.container_paths import host_to_container_path as c
+    from scripts.gsplat_pipeline import run_gsplat_train, run_ply_to_splat_converter
+
+    project_dir = os.path.normpath(str(project_dir))
+    scene = os.path.basename(project_dir)
+    images = os.path.join(project_dir, "images")
+    model_dir = os.path.join(project_dir, "colmap", model)
+    db = os.path.join(model_dir, "db.db")
+    sparse = os.path.join(model_dir, "sparse")
+    os.makedirs(sparse, exist_ok=True)
+
+    def named(step):
+        cmd_suffix, step_name = step
+        return cmd_suffix, f"{scene}: {step_name}"
+
+    await runner.run(*named(command_of(colmap.run_colmap_feature_extractor, c(images), c(db))))
+    await runner.run(*named(command_of(colmap.run_colmap_sequential_matcher, c(db))))
+    await asyncio.to_thread(check_view_graph, db)
+    await runner.run(*named(command_of(colmap.run_colmap_mapper, c(db), c(images), c(sparse))))
+    await asyncio.to_thread(colmap.flatten_sparse_model, sparse, "0")
+    if not os.path.exists(os.path.join(sparse, "points3D.bin")):
+        raise QualityCheckFailed(f"Mapper did not produce a model for {scene}", "mapper")
+
+    async def export_ply():
+        await runner.run(*named(command_of(colmap.run_colmap_model_converter, c(sparse), c(os.path.join(sparse, "0.ply")))))
+
+    async def train_gsplat():
+        gsplat_dir = os.path.join(project_dir, "gsplat", model)
+        os.makedirs(os.path.join(gsplat_dir, "point_cloud"), exist_ok=True)
+        await runner.run(*named(command_of(run_gsplat_train, scene, c(images), c(sparse), c(gsplat_dir),
+                                           iterations, sh_degree)))
+        ply = f"{c(gsplat_dir)}/point_cloud/iteration_{iterations}/point_cloud.ply"
+        await runner.run(*named(command_of(run_ply_to_splat_converter, ply, ply.replace(".ply", ".splat"))))
+
+    async def densify():
+        mvs_dir = os.path.join(project_dir, "mvs", model)
+        os.makedirs(mvs_dir, exist_ok=True)
+        mvs_file = c(os.path.join(mvs_dir, "scene.mvs"))
+        await runner.run(*named(command_of(openmvs.run_interface_colmap, c(sparse), mvs_file, c(images))))
+        await runner.run(*named(command_of(openmvs.run_densify_point_cloud, mvs_file, c(images))))
+        await runner.run(*named(command_of(openmvs.run_reconstruct_mesh, mvs_file.replace(".mvs", "_dense.mvs"))))
+
+    # a failing branch cancels its siblings (TaskGroup)
+    async with asyncio.TaskGroup() as group:
+        group.create_task(export_ply())
+        if gsplat:
+            group.create_task(train_gsplat())
+        if mvs:
+            group.create_task(densify())
+
+
+async def run_projects_async(projects, model="0", limits=None, timeouts=None, gsplat=True, mvs=True):
+    """Run every project concurrently; returns {project: exception} for the ones that failed."""
+    runner = AsyncRunner(limits, timeouts)
+    start_time = time.time()
+    results = await asyncio.gather(
+        *(colmap_project(runner, project, model, gsplat, mvs) for project in projects), return_exceptions=True)
+    failed = {project: result for project, result in zip(projects, results) if isinstance(result, BaseException)}
+    for project, error in failed.items():
+        logger.error(f"❌ {project}: {error!r}")
+    logger.info(f"⏱️ {len(projects) - len(failed)} of {len(projects)} projects finished in {time.time() - start_time:.1f} sec")
+    return failed
+
+
+def run_projects(projects, model="0", limits=None, timeouts=None, gsplat=True, mvs=True):
+    """Blocking entry point: one executor session shared by all projects."""
+    with pipeline_session():
+        return asyncio.run(run_projects_async(projects, model, limits, timeouts, gsplat, mvs))
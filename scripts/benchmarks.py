@@ -0,0 +1,277 @@
+"""
+Micro-benchmarks for pipeline hot spots.  Run through the `bench-*` CLI commands.
+"""
+
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+from scripts.exif_tagger import build_exif_blob, embed_exif, exiftool_tag_args, tag_images_batched
+
+
+def _synthetic_png(width=64, height=36):
+    """A small valid greyscale PNG, built without any imaging library."""
+    def chunk(chunk_type, data):
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    rows = b"".join(b"\0" + bytes((x * 4 + y) % 256 for x in range(width)) for y in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+
+def _write_frames(folder, frames, data):
+    folder.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(frames):
+        path = folder / f"bench_{i + 1:05d}.png"
+        path.write_bytes(data)
+        files.append(str(path))
+    return files
+
+
+def benchmark_exif_tagging(frames=2000, camera_model="FC3682", chunk_size=500, shards=4, workdir=None):
+    """
+    Compare EXIF tagging strategies on `frames` synthetic PNG frames.
+
+    - single-call : one `exiftool ... file1 file2 ...` over the whole list (previous behaviour)
+    - session     : one persistent exiftool session, chunked
+    - sharded     : `shards` persistent sessions in parallel
+    - embedded    : EXIF embedded while writing the frame (no exiftool at all)
+
+    Returns a list of (strategy, seconds) tuples.
+    """
+    root = Path(workdir or tempfile.mkdtemp(prefix="bench-exif-"))
+    png = _synthetic_png()
+    results = []
+
+    try:
+        files = _write_frames(root / "single", frames, png)
+        start = time.time()
+        subprocess.run(["exiftool", *exiftool_tag_args(camera_model), "-overwrite_original", *files],
+                       check=True, capture_output=True)
+        results.append(("single-call", time.time() - start))
+
+        files = _write_frames(root / "session", frames, png)
+        start = time.time()
+        tag_images_batched(files, camera_model, chunk_size=chunk_size, shards=1)
+        results.append(("session", time.time() - start))
+
+        files = _write_frames(root / "sharded", frames, png)
+        start = time.time()
+        tag_images_batched(files, camera_model, chunk_size=chunk_size, shards=shards)
+        results.append((f"sharded x{shards}", time.time() - start))
+
+        # Baseline cost of just writing the frames, then writing them with EXIF embedded
+        start = time.time()
+        _write_frames(root / "plain", frames, png)
+        plain = time.time() - start
+        start = time.time()
+        folder = root / "embedded"
+        folder.mkdir(parents=True, exist_ok=True)
+        for i in range(frames):
+            # built and embedded per frame, as the streaming writer does
+            (folder / f"bench_{i + 1:05d}.png").write_bytes(embed_exif(png, "png", build_exif_blob(camera_model)))
+        results.append(("embedded (extra over plain write)", max(0.0, time.time() - start - plain)))
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for name, seconds in results:
+        print(f"⏱️ {name:36s}: {seconds:8.2f} s  ({frames / max(seconds, 1e-9):10.1f} frames/s)")
+    return results
+
+
+def benchmark_vertical_mask(widths=(1600, 1280, 1024, 800, 3200), repeats=3, check_loop=True, seed=0):
+    """
+    Time mask_generator.vertical_mask against the original per-pixel loop on synthetic
+    16:9 Canny-like edge maps at each width, checking that both masks are bit-identical.
+
+    Returns a list of (width, vectorized_sec, loop_sec or None, identical or None).
+    """
+    import numpy as np
+    from scripts.mask_generator import vertical_mask, _vertical_mask_loop
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for width in widths:
+        height = width * 9 // 16
+        # sparse edges with vertical streaks so some columns hit a run and some never do
+        edges = np.where(rng.random((height, width)) < 0.15, 255, 0).astype(np.uint8)
+        streaks = rng.random(width) < 0.5
+        rows = rng.integers(0, height, size=width)
+        for x in np.flatnonzero(streaks):
+            edges[max(0, rows[x] - 8):rows[x], x] = 255
+
+        start = time.time()
+        for _ in range(repeats):
+            fast = vertical_mask(edges)
+        fast_sec = (time.time() - start) / repeats
+
+        loop_sec, identical = None, None
+        if check_loop:
+            start = time.time()
+            slow = _vertical_mask_loop(edges)
+            loop_sec = time.time() - start
+            identical = bool(np.array_equal(fast, slow))
+
+        results.append((width, fast_sec, loop_sec, identical))
+        line = f"⏱️ {width:5d}x{height:<5d} vectorized {fast_sec * 1000:8.2f} ms"
+        if check_loop:
+            line += f" | loop {loop_sec * 1000:10.1f} ms | {'✅ identical' if identical else '❌ MISMATCH'}"
+        print(line)
+    return results
+
+
+def benchmark_executors(service="colmap", steps=5, executors=("compose-run", "docker-exec", "local"), argv=("true",)):
+    """
+    Per-step overhead of each executor: run a no-op tool `steps` times in `service`.
+
+    docker-exec pays container start-up once (on the first step) and compose-run pays it
+    every step, so the mean over a pipeline-sized number of steps is what matters.
+    Returns a list of (executor, first_step_sec, mean_step_sec).
+    """
+    from scripts.executors import create_executor, measure_step_overhead
+
+    results = []
+    for name in executors:
+        durations = measure_step_overhead(create_executor(name), service, list(argv), steps=steps)
+        mean = sum(durations) / len(durations)
+        results.append((name, durations[0], mean))
+        print(f"⏱️ {name:12s}: first step {durations[0]:6.2f} s | mean over {steps} steps {mean:6.2f} s")
+
+    baseline = dict((name, mean) for name, _, mean in results).get("compose-run")
+    if baseline:
+        for name, _, mean in results:
+            print(f"   {name:12s}: {baseline - mean:+6.2f} s saved per step vs compose-run")
+    return results
+
+
+def benchmark_pair_planner(counts=(500, 1000, 2000, 4000), image_dir=None, max_pairs=20, seed=0):
+    """
+    Pairs planned by pair_planner for growing frame counts, against sequential (overlap 5) and
+    exhaustive matching.  Synthetic thumbnails follow a flight out and back over the same
+    ground, so loop closures exist; with image_dir the first N real frames are used instead.
+    Returns a list of (frames, pairs, plan_sec).
+    """
+    import numpy as np
+    from scripts.pair_planner import list_images, plan_pairs, thumbnail_descriptors
+
+    rng = np.random.default_rng(seed)
+    if image_dir:
+        names = list_images(image_dir)
+        counts = [n for n in counts if n <= len(names)] or [len(names)]
+        all_descriptors = thumbnail_descriptors(image_dir, names[:max(counts)])
+    results = []
+    for n in counts:
+        if image_dir:
+            descriptors = all_descriptors[:n]
+        else:
+            # ground seen at position x: smooth in x; the flight goes out and comes back
+            ground = np.cumsum(rng.normal(size=(n // 2 + 1, 768)), axis=0)
+            positions = np.concatenate([np.arange(n // 2), np.arange(n - n // 2)[::-1]])
+            descriptors = ground[positions] + rng.normal(scale=2.0, size=(n, 768))
+            descriptors -= descriptors.mean(axis=1, keepdims=True)
+            descriptors /= np.linalg.norm(descriptors, axis=1, keepdims=True)
+        start = time.time()
+        pairs = plan_pairs(descriptors.astype(np.float32), max_pairs=max_pairs)
+        plan_sec = time.time() - start
+        results.append((n, len(pairs), plan_sec))
+        print(f"⏱️ {n:6d} frames: {len(pairs):7d} pairs ({len(pairs) / n:5.1f}/frame) in {plan_sec:6.2f} s"
+              f" | sequential {5 * n:7d} | exhaustive {n * (n - 1) // 2:10d}")
+    return results
+
+
+# Seconds a subcommand may spend starting up (interpreter + imports) before bench-startup fails.
+CLI_STARTUP_BUDGET = 0.5
+CLI_STARTUP_BUDGETS = {
+    # commands that need a heavy library to do their job at all
+    "run-splat-post-cleaner": 5.0,     # torch
+    "run-colmap-pipeline-cli": 2.0,    # pandas (model_analyzer stats)
+    "run-colmap": 2.0,
+    "colmap-model-cleaner": 2.0,
+    "run-colmap-model-analyzer": 2.0,
+    "run-graph": 2.0,
+    "run-projects": 2.0,
+    "generate-project-reports": 2.0,   # pandas
+}
+
+
+def command_imports(command_name):
+    """The import statements in a cli command's body, i.e. what the command loads when it runs."""
+    import ast
+    import inspect
+    import textwrap
+    from scripts.cli import cli
+
+    command = cli
+    for part in command_name.split():  # "stats refresh": a command inside a group
+        command = command.commands[part]
+    source = textwrap.dedent(inspect.getsource(command.callback))
+    return [ast.unparse(node) for node in ast.walk(ast.parse(source))
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and not getattr(node, "level", 0)]
+
+
+def _importtime(statements, repeats=3):
+    """(best wall seconds, {top-level module: cumulative import seconds}) of `import scripts.cli` + statements."""
+    import sys
+    code = "; ".join(["import scripts.cli"] + statements)
+    best, modules = None, {}
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+        seconds = time.perf_counter() - start_time
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        if best is None or seconds < best:
+            best, modules = seconds, {}
+            for line in result.stderr.splitlines():
+                # "import time:  self [us] | cumulative | imported package", nesting shown by indentation
+                parts = line.split("|")
+                if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+                    name = parts[2].rstrip()
+                    if not name.startswith("  "):
+                        modules[name.strip()] = int(parts[1]) / 1e6
+    return best, modules
+
+
+def _leaf_commands(group, prefix=""):
+    """Names of the runnable commands, "group command" for the ones inside a group."""
+    names = []
+    for name, command in group.commands.items():
+        if hasattr(command, "commands"):
+            names += _leaf_commands(command, f"{prefix}{name} ")
+        else:
+            names.append(f"{prefix}{name}")
+    return names
+
+
+def benchmark_cli_startup(commands=None, budget=None, repeats=3):
+    """
+    Startup time of each cli subcommand: a fresh interpreter importing scripts.cli plus the
+    modules the command imports, measured with `python -X importtime` (best of `repeats`).
+    Returns a list of (command, seconds, budget, slowest imports, error).
+    """
+    from scripts.cli import cli
+
+    baseline, _ = _importtime([], repeats)
+    print(f"⏱️ {'import scripts.cli':32s}: {baseline:6.2f} s")
+    results = []
+    for name in commands or sorted(_leaf_commands(cli)):
+        limit = budget or CLI_STARTUP_BUDGETS.get(name, CLI_STARTUP_BUDGET)
+        try:
+            seconds, modules = _importtime(command_imports(name), repeats)
+        except RuntimeError as e:  # a dependency missing in this environment
+            results.append((name, None, limit, [], str(e)))
+            print(f"⚠️ {name:32s}: not measured ({e})")
+            continue
+        slowest = sorted(modules.items(), key=lambda item: -item[1])[:3]
+        results.append((name, seconds, limit, slowest, None))
+        top = ", ".join(f"{module} {sec:.2f}s" for module, sec in slowest)
+        print(f"{'✅' if seconds <= limit else '❌'} {name:32s}: {seconds:6.2f} s (budget {limit:.1f} s) | {top}")
+    return results
@@ -0,0 +1,67 @@
+"""
+Per-step checkpoint markers for pipelines that are not fingerprinted by StepCache
+(the OpenMVG + OpenMVS pipeline works in fixed folders under data/openmvg).
+
+Each completed step leaves <marker_dir>/<step>.json holding its arguments and return
+value.  With resume=True the pipeline skips every leading step that has a marker for the
+same arguments (reusing its return value) and restarts from the first one that does not,
+e.g. when --sfm-engine or --matches-ratio changed; from there on every step runs again
+and its marker is rewritten, so a later step never trusts outputs of an earlier rerun.
+"""
+
+import json
+import os
+import time
+
+from loguru import logger
+
+
+def _arguments(args, kwargs):
+    """The call's arguments as they read back from a marker (JSON, other values as str)."""
+    return json.loads(json.dumps({"args": list(args), "kwargs": kwargs}, default=str))
+
+
+class StepCheckpoints:
+    """Run pipeline steps in order, leaving a marker after each one that completes."""
+
+    def __init__(self, marker_dir, resume=False):
+        self.marker_dir = str(marker_dir)
+        self.resume = resume
+        self.replaying = resume  # still inside the prefix of completed steps
+        os.makedirs(self.marker_dir, exist_ok=True)
+
+    def marker(self, name):
+        return os.path.join(self.marker_dir, f"{name}.json")
+
+    def completed(self, name):
+        try:
+            with open(self.marker(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def run(self, name, func, *args, **kwargs):
+        """func(*args, **kwargs), or its recorded result when resuming past a step completed with the same arguments."""
+        arguments = _arguments(args, kwargs)
+        if self.replaying:
+            marker = self.completed(name)
+            if marker is not None and marker.get("arguments") == arguments:
+                logger.info(f"⏭️ Resuming: [{name}] completed at {marker['finished']}")
+                return marker.get("result")
+            if marker is not None:
+                logger.info(f"▶️ Resuming from [{name}]: arguments changed since its last run")
+            else:
+                logger.info(f"▶️ Resuming from [{name}]")
+            self.replaying = False
+
+        if os.path.exists(self.marker(name)):
+            os.unlink(self.marker(name))
+        start_time = time.time()
+        result = func(*args, **kwargs)
+        tmp = f"{self.marker(name)}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"step": name, "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "elapsed": round(time.time() - start_time, 1), "arguments": arguments, "result": result},
+                      f, indent=2, default=str)
+        os.replace(tmp, self.marker(name))
+        return result
@@ -1,15 +1,9 @@
+# The Makefile runs this script hundreds of times per sweep: keep module level imports to click and
+# the standard library, and import torch, cv2, pandas and the pipelines inside the commands that use
+# them (checked by bench-startup).
 import click
-from scripts.extract_frames import extract_frames_from_file, extract_frames_from_folder, process_folder_with_convert, process_folder_with_convert_workers
-from scripts import colmap_pipeline, openmvg_pipeline, convert_matches_g_to_dot, gsplat_pipeline, openmvs_pipeline
-from scripts.mask_generator import generate_combined_mask,generate_masks_in_directory
-
-from scripts.report_utils import build_folder_tree_with_files, write_qmds_from_tree
-
-import torch
 from pathlib import Path
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
 @click.group()
 def cli():
     """GBT 3D Pipeline CLI"""
@@ -26,10 +20,116 @@ def cli():
 @click.option("--tag", default="tag", help="filename tag")
 @click.option("--format", default="png", help="Output file format (png/jpg)")
 @click.option("--max_width", default="1600", help="max image width")
-def extract_frames(video_path, output_dir,fps,skip,capture,threads,quality,tag,format,max_width):
+@click.option("--tag-shards", type=int, default=1, help="Parallel exiftool sessions for EXIF tagging")
+@click.option("--stream/--no-stream", default=False, help="Decode→filter→write in one pass, each file written once")
+@click.option("--filter", default="none", type=click.Choice(["none", "color", "greyscale"]), help="Filter applied in --stream/--cache-dir mode")
+@click.option("--workers", type=int, default=4, help="Encoder/filter workers in --stream/--cache-dir mode")
+@click.option("--queue-depth", type=int, default=16, help="Frames held in memory in --stream mode")
+@click.option("--cache-dir", default=None, help="Serve frames from this frame store (e.g. projects/.frame-cache)")
+@click.option("--segments", type=int, default=1, help="Split the clip into N time segments decoded in parallel")
+@click.option("--hwaccel", default=None, help="ffmpeg -hwaccel method for --segments mode (e.g. auto, vaapi)")
+def extract_frames(video_path, output_dir,fps,skip,capture,threads,quality,tag,format,max_width,tag_shards,
+                   stream,filter,workers,queue_depth,cache_dir,segments,hwaccel):
     """Extract frames from video"""
+    from scripts.extract_frames import extract_frames_from_file
+    if cache_dir:
+        from scripts.frame_cache import extract_frames_cached
+        extract_frames_cached(video_path, output_dir, fps=fps, skip_seconds=str(skip), threads=threads,
+            quality=quality, capture_seconds=capture, format=format, tag=tag, max_width=max_width,
+            filter=filter, workers=workers, cache_dir=cache_dir)
+        return
+
+    if segments > 1 or hwaccel:
+        from scripts.extract_frames import extract_frames_segmented
+        extract_frames_segmented(video_path, output_dir, fps=fps, skip_seconds=str(skip), threads=threads,
+            quality=quality, capture_seconds=capture, format=format, tag=tag, max_width=max_width,
+            tag_shards=tag_shards, segments=segments, hwaccel=hwaccel)
+        return
+
+    if stream:
+        from scripts.extract_frames import extract_frames_streaming
+        extract_frames_streaming(video_path, output_dir, fps=fps, skip_seconds=str(skip), threads=threads,
+            capture_seconds=capture, format=format, tag=tag, max_width=max_width, filter=filter,
+            workers=workers, queue_depth=queue_depth)
+        return
+
     extract_frames_from_file(video_path, output_dir, fps=fps,skip_seconds=str(skip),
-        threads=threads,quality=quality,capture_seconds=capture,tag=tag,format=format, max_width=max_width)
+        threads=threads,quality=quality,capture_seconds=capture,tag=tag,format=format, max_width=max_width,
+        tag_shards=tag_shards)
+
+
+@cli.command()
+@click.argument("video_path", type=click.Path(exists=True))
+@click.option("--output-dir", default="data/frames", help="Output dir for extracted frames")
+@click.option("--target-count", type=int, default=None, help="Keep at most this many frames (tunes the baseline)")
+@click.option("--min-baseline", type=float, default=0.05, show_default=True,
+              help="Motion between keyframes, as a fraction of frame width")
+@click.option("--min-hash-distance", type=int, default=4, show_default=True, help="Min dHash bits vs previous keyframe")
+@click.option("--blur-quantile", type=float, default=0.3, show_default=True, help="Drop the blurriest fraction of frames")
+@click.option("--analysis-width", type=int, default=320, show_default=True, help="Width of the analysis stream")
+@click.option("--skip", type=int, default=5, help="Skip first X seconds")
+@click.option("--capture", type=int, default=None, help="Capture X seconds of video")
+@click.option("--threads", type=int, default=8, help="FFMPEG threads to use")
+@click.option("--quality", type=int, default=2, help="JPG quality 1/31")
+@click.option("--tag", default="tag", help="filename tag")
+@click.option("--format", default="png", help="Output file format (png/jpg)")
+@click.option("--max_width", default="1600", help="max image width")
+def extract_keyframes(video_path, output_dir, target_count, min_baseline, min_hash_distance, blur_quantile,
+                      analysis_width, skip, capture, threads, quality, tag, format, max_width):
+    """Extract sharp, well-spaced keyframes instead of sampling at a fixed fps"""
+    from scripts.frame_selector import extract_keyframes_from_file
+    extract_keyframes_from_file(video_path, output_dir, target_count=target_count, min_baseline=min_baseline,
+        min_hash_distance=min_hash_distance, blur_quantile=blur_quantile, analysis_width=analysis_width,
+        skip_seconds=str(skip), capture_seconds=capture, threads=threads, quality=quality, format=format,
+        tag=tag, max_width=max_width)
+
+
+@cli.command()
+@click.argument("video_path", type=click.Path(exists=True))
+@click.option("--projects-folder", default="projects", show_default=True, help="Root folder for project folders")
+@click.option("--variant", "variants", multiple=True, required=True,
+              help="Base root to extract, e.g. png_1.00_1600_none. Repeat for each variant.")
+@click.option("--skip", type=int, default=5, help="Skip first X seconds")
+@click.option("--capture", type=int, default=None, help="Capture X seconds of video")
+@click.option("--threads", type=int, default=8, help="FFMPEG threads to use")
+@click.option("--quality", type=int, default=2, help="JPG quality 1/31")
+@click.option("--max-outputs-per-pass", type=int, default=8, show_default=True,
+              help="Limit outputs per ffmpeg decode pass (0: all in one pass)")
+@click.option("--workers", default=8, help="Number of workers for color/greyscale filters")
+def extract_frames_batch(video_path, projects_folder, variants, skip, capture, threads, quality, max_outputs_per_pass, workers):
+    """Extract many format/fps/width variants from one decode pass of a video"""
+    from scripts.extract_frames import extract_frames_batch_from_file, parse_variant
+    video = Path(video_path).stem
+    todo = []
+    for variant in variants:
+        params = parse_variant(variant)
+        tag = f"{video}-{params['format']}_{params['fps']}_{params['max_width']}_{params['filter']}"
+        output_dir = Path(projects_folder) / tag / "images"
+        if output_dir.exists() and any(output_dir.iterdir()):
+            click.echo(f"⏭️ Skipping {output_dir} (already exists)")
+            continue
+        todo.append(dict(params, output_dir=str(output_dir), tag=tag))
+
+    click.echo(f"👉 Extracting {len(todo)} variants from {video_path}")
+    extract_frames_batch_from_file(video_path, todo, skip_seconds=str(skip), threads=threads, quality=quality,
+                                   capture_seconds=capture, max_outputs_per_pass=max_outputs_per_pass or None)
+
+    # Same settings as recipe-images-folder
+    from scripts.image_filters import process_folder_with_filters
+    for variant in todo:
+        if variant["filter"] == "none":
+            continue
+        process_folder_with_filters(
+            variant["output_dir"],
+            variant["output_dir"],
+            sharpen="0x1.0",
+            contrast="5x50%",
+            greyscale=variant["filter"] == "greyscale",
+            tag=variant["tag"],
+            max_workers=workers,
+            format=variant["format"]
+        )
+    click.echo(f"✅ Done. {len(todo)} image folders written under: {projects_folder}")
 
 
 @cli.command()
@@ -38,14 +138,17 @@ def extract_frames(video_path, output_dir,fps,skip,capture,threads,quality,tag,f
 @click.option("--output-format", default="ply", type=click.Choice(["ply", "obj"]), help="Output format")
 def run_colmap(frame_dir, colmap_dir, output_format):
     """Run COLMAP pipeline"""
+    from scripts import colmap_pipeline
     colmap_pipeline.run_pipeline(frame_dir, colmap_dir, output_format)
 
 @cli.command()
 @click.option('--enable-texturing/--no-enable-texturing', is_flag=True, default=False, help='Enable/disable OpenMVS TextureMesh step.')
 @click.option('--sfm-engine', type=click.Choice(['GLOBAL', 'INCREMENTAL'], case_sensitive=False), default='GLOBAL', help='SfM engine to use.')
 @click.option('--matches-ratio', type=float, default=0.6, show_default=True, help='Feature matching ratio filter (lower = more matches).')
-def run_openmvg_openmvs(enable_texturing, sfm_engine, matches_ratio):
+@click.option('--resume', is_flag=True, help='Skip steps completed by an earlier run; restart from the first one that did not.')
+def run_openmvg_openmvs(enable_texturing, sfm_engine, matches_ratio, resume):
     """Run OpenMVG + OpenMVS pipeline"""
+    from scripts import openmvg_pipeline
     print("==== Pipeline configuration ====")
     print(f" SfM engine      : {sfm_engine}")
     print(f" Matches ratio   : {matches_ratio}")
@@ -56,7 +159,8 @@ def run_openmvg_openmvs(enable_texturing, sfm_engine, matches_ratio):
     openmvg_pipeline.run_pipeline(
         enable_texturing=enable_texturing,
         sfm_engine=sfm_engine.upper(),
-        matches_ratio=matches_ratio
+        matches_ratio=matches_ratio,
+        resume=resume
     )
     
 @cli.command()
@@ -70,6 +174,7 @@ def run_openmvg_openmvs(enable_texturing, sfm_engine, matches_ratio):
 )
 def convert_matches_g(input, output):
     """Convert matches.g.txt (edge list) → DOT format for visualization."""
+    from scripts import convert_matches_g_to_dot
     click.echo(f"👉 Converting {input} → {output} ...")
     convert_matches_g_to_dot.convert_matches_g_to_dot(input, output)
     click.echo(f"✅ Done. DOT file written to: {output}")
@@ -80,6 +185,7 @@ def convert_matches_g(input, output):
 @click.option('--show-disconnected', is_flag=True, help='Print list of disconnected nodes.')
 def analyze_graph(matches_file, show_disconnected):
     """ Analyze dot file """
+    from scripts import convert_matches_g_to_dot
     convert_matches_g_to_dot.analyze_graph(matches_file, show_disconnected)
 
 
@@ -93,9 +199,12 @@ def analyze_graph(matches_file, show_disconnected):
 @click.option("--tag", default="filtered", help="tag for file name")
 @click.option("--workers", default=8, help="Number of separate workers")
 @click.option("--format", default="png", help="Input image format (png/jpg)")
-def convert_images(input_folder, output_folder, sharpen, contrast, greyscale, crop, tag,workers,format ):
-    """Run ImageMagick convert on all images in input folder."""
+@click.option("--engine", default="numpy", type=click.Choice(["numpy", "convert"]), show_default=True,
+              help="numpy: in-process filters on a process pool; convert: one ImageMagick process per image")
+def convert_images(input_folder, output_folder, sharpen, contrast, greyscale, crop, tag,workers,format,engine ):
+    """Apply auto-level/contrast/sharpen/crop/greyscale filters to all images in input folder."""
     click.echo(f"👉 Converting images in {input_folder} → {output_folder}")
+    click.echo(f"  Engine    : {engine}")
     click.echo(f"  Format    : {format}")
     click.echo(f"  Sharpen   : {sharpen}")
     click.echo(f"  Contrast  : {contrast}")
@@ -103,7 +212,12 @@ def convert_images(input_folder, output_folder, sharpen, contrast, greyscale, cr
     click.echo(f"  Crop      : {crop if crop else 'None'}")
     click.echo(f"  Tag       : {tag}")
 
-    process_folder_with_convert_workers(
+    if engine == "numpy":
+        from scripts.image_filters import process_folder_with_filters as process_folder
+    else:
+        from scripts.extract_frames import process_folder_with_convert_workers as process_folder
+
+    process_folder(
         input_folder,
         output_folder,
         sharpen=sharpen,
@@ -122,10 +236,51 @@ def convert_images(input_folder, output_folder, sharpen, contrast, greyscale, cr
 @cli.command()
 @click.option("--image-path", type=click.Path(exists=True, file_okay=False),help="Image folder")
 @click.option("--output-model-path", type=click.Path(),help="colmap output folder")
-def run_colmap_pipeline_cli(image_path, output_model_path):
+@click.option("--force", is_flag=True, help="Re-run every step even if its fingerprint is unchanged")
+@click.option("--matcher", type=click.Choice(["sequential", "exhaustive", "planned"]), default="sequential",
+              show_default=True, help="planned: temporal + retrieval + loop-closure pairs (scripts/pair_planner.py)")
+def run_colmap_pipeline_cli(image_path, output_model_path, force, matcher):
     """Run COLMAP pipeline on given image folder."""
     from scripts.colmap_pipeline import run_colmap_pipeline
-    run_colmap_pipeline(image_path, output_model_path)
+    run_colmap_pipeline(image_path, output_model_path, force=force, matcher=matcher)
+
+
+@cli.command(context_settings={"ignore_unknown_options": True})
+@click.option("--database-path", required=True, type=click.Path(dir_okay=False), help="db.db to create")
+@click.option("--image-path", required=True, type=click.Path(exists=True, file_okay=False), help="Image folder")
+@click.option("--source-image-path", type=click.Path(file_okay=False),
+              help="Frames the image folder was copied or masked from (feature cache key)")
+@click.option("--mask-dir", type=click.Path(file_okay=False),
+              help="Masks baked into the images, if any (feature cache key)")
+@click.argument("options", nargs=-1, type=click.UNPROCESSED)
+def colmap_features(database_path, image_path, source_image_path, mask_dir, options):
+    """COLMAP feature_extractor (extra OPTIONS passed through), seeded from an identical earlier extraction."""
+    from scripts.colmap_database import FeatureCache
+    from scripts.container_paths import host_to_container_path
+    FeatureCache().runner(database_path, source_dir=source_image_path, mask_dir=mask_dir)([
+        "colmap",
+        "colmap",
+        "feature_extractor",
+        "--database_path", host_to_container_path(database_path),
+        "--image_path", host_to_container_path(image_path),
+        *options,
+    ], "COLMAP FeatureExtractor")
+
+
+@cli.command()
+@click.option("--database-path", required=True, type=click.Path(exists=True, dir_okay=False), help="COLMAP db.db")
+@click.option("--min-inliers", default=15, show_default=True, help="Inliers for a pair to count as a view graph edge")
+@click.option("--decode-matches", is_flag=True, help="Also decode match blobs: matched keypoints per image")
+@click.option("--output-json", default=None, type=click.Path(dir_okay=False), help="Write the report here")
+def inspect_db(database_path, min_inliers, decode_matches, output_json):
+    """Read-only report of a COLMAP database: keypoints, matches, two-view configs, view graph."""
+    import json
+    from scripts.colmap_database import inspect_database
+    report = inspect_database(database_path, min_inliers, decode_matches)
+    text = json.dumps(report, indent=2)
+    if output_json:
+        Path(output_json).write_text(text)
+    click.echo(text)
 
 
 @cli.command()
@@ -141,6 +296,7 @@ def run_colmap_pipeline_cli(image_path, output_model_path):
               help="Maximum allowed reprojection error")
 def colmap_model_cleaner(input_model_folder, output_model_folder, min_track_len, max_reproj_error, min_tri_angle):
     """Clean a COLMAP sparse model using model_cleaner."""
+    from scripts import colmap_pipeline
     colmap_pipeline.run_colmap_point_filtering(
         input_model_host=input_model_folder,
         output_model_host=output_model_folder,
@@ -157,9 +313,11 @@ def colmap_model_cleaner(input_model_folder, output_model_folder, min_track_len,
 @click.option('--model-dir', required=True, type=click.Path(), help='Output directory for gsplat results')
 @click.option('--iterations', required=True, help='Iterations to gsplat')
 @click.option('--sh_degree', required=True, help='Spherical Harmonics degree. 0-none, 1-2 lower res, 3-4 higher res')
-def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir,iterations,sh_degree):
+@click.option('--force', is_flag=True, help='Re-train even if images, sparse model and options are unchanged')
+def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir,iterations,sh_degree,force):
     """Run Gaussian Splatting training for a specific scene with provided paths."""
-    gsplat_pipeline.run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir,iterations,sh_degree)
+    from scripts import gsplat_pipeline
+    gsplat_pipeline.run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir,iterations,sh_degree,force=force)
 
 def ensure_absolute_path(input_model_folder):
     if not input_model_folder.startswith("/"):
@@ -169,17 +327,19 @@ def ensure_absolute_path(input_model_folder):
 @cli.command()
 @click.option("--input-model-folder", type=click.Path(exists=True, file_okay=False),help="Input model folder")
 @click.option("--output-stats-folder", type=click.Path(),help="Output stats folder")
-def run_colmap_model_analyzer(input_model_folder, output_stats_folder ):
+@click.option("--engine", type=click.Choice(["numpy", "colmap"]), default="numpy", show_default=True,
+              help="numpy reads the .bin files directly; colmap runs model_analyzer in its container")
+def run_colmap_model_analyzer(input_model_folder, output_stats_folder, engine):
     """Run COLMAP analyzer on folders.  Not necessary unless format of output has changed.  Pipeline calls it, too."""
     from scripts.colmap_pipeline import run_colmap_model_analyzer
-    run_colmap_model_analyzer( ensure_absolute_path(input_model_folder), output_stats_folder, 0.0 )
+    run_colmap_model_analyzer( ensure_absolute_path(input_model_folder), output_stats_folder, 0.0, engine=engine )
 
 @cli.command()
 @click.option("--input-file", type=click.Path(exists=True, file_okay=True),help="Input .ply file")
 @click.option("--output-file", type=click.Path(),help="Output .splat file")
 def run_ply_to_splat_converter( input_file, output_file ):
     """splat converter"""
-    from gsplat_pipeline import run_ply_to_splat_converter
+    from scripts.gsplat_pipeline import run_ply_to_splat_converter
     run_ply_to_splat_converter( ensure_absolute_path(input_file), ensure_absolute_path(output_file) )
 
 
@@ -195,6 +355,7 @@ def run_ply_to_splat_converter( input_file, output_file ):
 @click.option('--max-scale-z', type=float, default=None, help='Maximum Z scale threshold')
 def run_splat_post_cleaner(input_file, output_file, zmin, zmax, min_opacity, max_scale_x, max_scale_y, max_scale_z):
     """Filter a .splat file to remove foggy/outlier Gaussians by Z range, opacity, and scale."""
+    import torch
 
     click.echo(f"Loading splat file: {input_file}")
     state = torch.load(input_file,weights_only=False)
@@ -247,6 +408,101 @@ def run_openmvs_pipeline(image_folder, sparse_model_folder, mvs_output_folder):
     mvs_pipeline(image_folder, sparse_model_folder, mvs_output_folder)
 
 
+@cli.command()
+@click.option("--project-dir", required=True, type=click.Path(file_okay=False),
+              help="Project folder, e.g. projects/DJI_0150-png_1.00_1600_none")
+@click.option("--model", default="0", show_default=True, help="COLMAP model id (colmap/<model>)")
+@click.option("--video", "video_path", default=None, type=click.Path(exists=True), help="Extract images from this video first")
+@click.option("--fps", type=float, default=1.0, help="Frames per second to extract (with --video)")
+@click.option("--skip", type=int, default=5, help="Skip first X seconds (with --video)")
+@click.option("--format", default="png", help="Image format (with --video)")
+@click.option("--max_width", default="1600", help="max image width (with --video)")
+@click.option("--mask-filter", default=None, help="Generate masks with this filter before feature extraction")
+@click.option("--gsplat/--no-gsplat", default=True, help="Train a gaussian splat from the sparse model")
+@click.option("--mvs/--no-mvs", default=True, help="Run OpenMVS from the sparse model")
+@click.option("--cpus", type=int, default=None, help="CPU budget (default: all cores)")
+@click.option("--mem-gb", type=float, default=None, help="Memory budget in GB (default: total RAM)")
+@click.option("--matcher", type=click.Choice(["sequential", "exhaustive", "planned"]), default="sequential",
+              show_default=True, help="planned: temporal + retrieval + loop-closure pairs (scripts/pair_planner.py)")
+@click.option("--dry-run", is_flag=True, help="Print the task waves and exit")
+def run_graph(project_dir, model, video_path, fps, skip, format, max_width, mask_filter, gsplat, mvs, cpus, mem_gb,
+              matcher, dry_run):
+    """Run a project's pipeline as a task graph, with independent stages running concurrently."""
+    from scripts.resource_monitor import profile_steps
+    from scripts.scheduler import Scheduler, build_colmap_graph
+    extract_options = dict(fps=fps, skip_seconds=str(skip), format=format, max_width=max_width)
+    graph = build_colmap_graph(project_dir, model=model, video_path=video_path, extract_options=extract_options,
+                               mask_filter=mask_filter, gsplat=gsplat, mvs=mvs, matcher=matcher)
+    for i, wave in enumerate(graph.levels(), start=1):
+        click.echo(f"  wave {i}: {', '.join(wave)}")
+    if dry_run:
+        return
+    resources = {k: v for k, v in dict(cpu=cpus, mem_gb=mem_gb).items() if v is not None}
+    stats_folder = Path(project_dir) / "colmap" / model / "stats"
+    with profile_steps(stats_folder / f"resources-{model}.jsonl"):
+        Scheduler(graph, resources).run()
+
+
+@cli.command()
+@click.option("--makefile", default="Makefile", show_default=True, type=click.Path(exists=True), help="Makefile with the *-roots matrix")
+@click.option("--video", "videos", multiple=True, help="Only these video-roots (repeatable)")
+@click.option("--format", "formats", multiple=True, help="Only these format-roots (repeatable)")
+@click.option("--fps", "fpss", multiple=True, help="Only these fps-roots (repeatable)")
+@click.option("--width", "widths", multiple=True, help="Only these width-roots (repeatable)")
+@click.option("--filter", "filters", multiple=True, help="Only these filter-roots (repeatable)")
+@click.option("--model", "models", multiple=True, help="Only these model-roots (repeatable)")
+@click.option("--cpus", type=int, default=None, help="CPU budget (default: all cores)")
+@click.option("--mem-gb", type=float, default=None, help="Memory budget in GB (default: total RAM)")
+@click.option("--checkpoint", default="projects/.sweep/checkpoint.json", show_default=True, help="Progress file for resuming")
+@click.option("--retry-failed/--skip-failed", default=True, help="Retry jobs that failed in an earlier run")
+@click.option("--limit", type=int, default=None, help="Only run the N cheapest remaining jobs")
+@click.option("--make-arg", "make_args", multiple=True, help="Extra argument for make, e.g. extract-mode=cache")
+@click.option("--dry-run", is_flag=True, help="Print the plan (cheapest first) and exit")
+def sweep(makefile, videos, formats, fpss, widths, filters, models, cpus, mem_gb, checkpoint, retry_failed, limit,
+          make_args, dry_run):
+    """Run the Makefile parameter matrix cheapest-first within a CPU/RAM budget, resumably."""
+    from scripts.sweep import Checkpoint, expand_matrix, parse_makefile_variables, run_sweep
+    only = {"video-roots": videos, "format-roots": formats, "fps-roots": fpss, "width-roots": widths,
+            "filter-roots": filters, "model-roots": models}
+    jobs = expand_matrix(parse_makefile_variables(makefile), only=only)
+    if dry_run:
+        done = Checkpoint(checkpoint).done
+        todo = sorted((job for job in jobs if job["id"] not in done), key=lambda job: job["cost"])
+        for job in todo[:limit] if limit else todo:
+            click.echo(f"{job['cost']:12.0f}  {job['cpu']:3d} cpu {job['mem_gb']:6.1f} GB  {job['target']}")
+        click.echo(f"👉 {len(todo)} of {len(jobs)} jobs remaining")
+        return
+    run_sweep(jobs, checkpoint, cpus=cpus, mem_gb=mem_gb, make_args=make_args, retry_failed=retry_failed, limit=limit)
+
+
+def _parse_tool_values(values, convert):
+    """("sift=2", "mapper=4") → {"sift": 2, "mapper": 4}"""
+    from scripts.async_runner import DEFAULT_LIMITS
+    parsed = {}
+    for value in values:
+        tool, _, number = value.partition("=")
+        if tool not in DEFAULT_LIMITS or not number:
+            raise click.BadParameter(f"'{value}': expected <tool>=<n> with tool one of {', '.join(DEFAULT_LIMITS)}")
+        parsed[tool] = convert(number)
+    return parsed
+
+
+@cli.command()
+@click.argument("project_dirs", nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option("--model", default="0", show_default=True, help="COLMAP model id (colmap/<model>)")
+@click.option("--limit", "limits", multiple=True, help="Concurrent steps per tool class, e.g. sift=2 (repeatable)")
+@click.option("--timeout", "timeouts", multiple=True, help="Timeout in seconds per tool class, e.g. mapper=7200 (repeatable)")
+@click.option("--gsplat/--no-gsplat", default=True, help="Train a gaussian splat from the sparse model")
+@click.option("--mvs/--no-mvs", default=True, help="Run OpenMVS from the sparse model")
+def run_projects(project_dirs, model, limits, timeouts, gsplat, mvs):
+    """Run several projects' pipelines concurrently in this one process (asyncio)."""
+    from scripts.async_runner import run_projects
+    failed = run_projects(list(project_dirs), model=model, limits=_parse_tool_values(limits, int),
+                          timeouts=_parse_tool_values(timeouts, float), gsplat=gsplat, mvs=mvs)
+    if failed:
+        raise click.ClickException(f"{len(failed)} of {len(project_dirs)} projects failed")
+
+
 @cli.command()
 @click.option("--input-file", required=True, type=click.Path(exists=True), help="Input mesh file (.ply)")
 @click.option("--output-file", required=True, type=click.Path(), help="Output cleaned mesh file")
@@ -311,6 +567,7 @@ def generate_masksxxxx(images_dir, output_mask_dir):
               help="Output folder for data.")
 def generate_project_reports(projects_root, report_qmds, report_data ):
     """Scan projects folder and generate QMD reports."""
+    from scripts.report_utils import build_folder_tree_with_files, write_qmds_from_tree
     click.echo(f"🔍 Scanning projects in: {projects_root}")
     tree = build_folder_tree_with_files(projects_root)
     click.echo(f"📂 Found {len(tree)} projects.")
@@ -330,16 +587,161 @@ def generate_project_reports(projects_root, report_qmds, report_data ):
               help="Number of threads/workers to use.")
 @click.option("--workers", default=8, show_default=True,
               help="Number of threads/workers to use.")
-def generate_masks(images_dir, output_mask_dir, output_masked_image_dir, filter, workers):
+@click.option("--backend", default="process", type=click.Choice(["process", "thread"]), show_default=True,
+              help="Worker pool type.")
+@click.option("--chunksize", default=None, type=int, help="Images per work item (default: auto).")
+@click.option("--dedup/--no-dedup", default=True, show_default=True,
+              help="Hardlink constant masks and unchanged images instead of re-encoding them.")
+def generate_masks(images_dir, output_mask_dir, output_masked_image_dir, filter, workers, backend, chunksize, dedup):
     """Generate combined edge + vertical masks for COLMAP and optionally masked images."""
+    from scripts.mask_generator import generate_masks_in_directory
     generate_masks_in_directory(
         Path(images_dir),
         Path(output_mask_dir),
         Path(output_masked_image_dir) if output_masked_image_dir else None,
         workers,
-        filter
+        filter,
+        backend=backend,
+        chunksize=chunksize,
+        dedup=dedup
     )
 
+@cli.command()
+@click.option("--frames", default=2000, show_default=True, help="Number of synthetic frames to tag")
+@click.option("--chunk-size", default=500, show_default=True, help="Files per exiftool -execute")
+@click.option("--shards", default=4, show_default=True, help="Parallel exiftool sessions for the sharded run")
+def bench_exif(frames, chunk_size, shards):
+    """Benchmark EXIF tagging: single exiftool call vs persistent sessions vs write-time embedding."""
+    from scripts.benchmarks import benchmark_exif_tagging
+    benchmark_exif_tagging(frames=frames, chunk_size=chunk_size, shards=shards)
+
+
+@cli.command()
+@click.option("--input-folder", required=True, type=click.Path(exists=True, file_okay=False), help="Folder of sample frames")
+@click.option("--format", default="png", help="Input image format (png/jpg)")
+@click.option("--samples", default=10, show_default=True, help="Number of frames to compare")
+@click.option("--greyscale/--no-greyscale", default=False, help="Compare the greyscale recipe")
+def bench_filters(input_folder, format, samples, greyscale):
+    """Compare the numpy filter engine against ImageMagick convert: speed and pixel difference."""
+    from scripts.image_filters import compare_with_imagemagick, IMAGEMAGICK_TOLERANCE
+
+    files = sorted(Path(input_folder).glob(f"*.{format}"))[:samples]
+    if not files:
+        click.echo(f"No {format} images found in {input_folder}")
+        return
+
+    for f in files:
+        mean_diff, max_diff, convert_sec, numpy_sec = compare_with_imagemagick(str(f), greyscale=greyscale)
+        ok = mean_diff <= IMAGEMAGICK_TOLERANCE["mean"] and max_diff <= IMAGEMAGICK_TOLERANCE["max"]
+        click.echo(f"{'✅' if ok else '❌'} {f.name}: mean diff {mean_diff:.2f}, max diff {max_diff}, "
+                   f"convert {convert_sec:.3f}s, numpy {numpy_sec:.3f}s")
+
+
+@cli.command()
+@click.option("--width", "widths", multiple=True, type=int, default=(1600, 1280, 1024, 800, 3200), show_default=True,
+              help="Frame widths to benchmark (16:9)")
+@click.option("--repeats", default=3, show_default=True, help="Repeats for the vectorized timing")
+@click.option("--check-loop/--no-check-loop", default=True, help="Also run the original loop and compare masks")
+def bench_masks(widths, repeats, check_loop):
+    """Benchmark the vectorized horizon/ground scan and verify it matches the original loop."""
+    from scripts.benchmarks import benchmark_vertical_mask
+    results = benchmark_vertical_mask(widths=widths, repeats=repeats, check_loop=check_loop)
+    if any(identical is False for *_, identical in results):
+        raise click.ClickException("Vectorized mask differs from the reference loop")
+
+
+@cli.command()
+@click.option("--service", default="colmap", show_default=True, help="docker compose service to run the no-op step in")
+@click.option("--steps", default=5, show_default=True, help="Steps per executor (a COLMAP run is ~5 steps)")
+@click.option("--executor", "executors", multiple=True, default=("compose-run", "docker-exec", "local"), show_default=True,
+              type=click.Choice(["compose-run", "docker-exec", "local"]), help="Executors to compare")
+def bench_executors(service, steps, executors):
+    """Measure per-step container overhead of each pipeline executor."""
+    from scripts.benchmarks import benchmark_executors
+    benchmark_executors(service=service, steps=steps, executors=executors)
+
+
+@cli.command(context_settings={"ignore_unknown_options": True})
+@click.option("--service", required=True, help="docker compose service the step runs in")
+@click.option("--queue-dir", default=None, help="Queue folder (default: $GBT_QUEUE_DIR or projects/.queue)")
+@click.option("--retries", default=1, show_default=True, help="Re-run a failed step this many times")
+@click.option("--step-name", default="", help="Name shown in the queue and worker logs")
+@click.argument("argv", nargs=-1, required=True, type=click.UNPROCESSED)
+def queue_submit(service, queue_dir, retries, step_name, argv):
+    """Queue one step for a queue-worker and wait for it (used by GBT_EXECUTOR=queue)."""
+    import sys
+    from scripts.work_queue import submit_and_wait
+    sys.exit(submit_and_wait(service, list(argv), step_name, queue_dir=queue_dir, retries=retries))
+
+
+@cli.command()
+@click.option("--queue-dir", default=None, help="Queue folder (default: $GBT_QUEUE_DIR or projects/.queue)")
+@click.option("--executor", default=None, type=click.Choice(["docker-exec", "compose-run", "local"]),
+              help="How this worker runs steps (default: $GBT_WORKER_EXECUTOR or docker-exec)")
+@click.option("--worker-id", default=None, help="Name recorded for the steps this worker runs (default: host-pid)")
+@click.option("--service", "services", multiple=True, help="Only take steps for these services, e.g. gsplat on a GPU box")
+@click.option("--poll", default=1.0, show_default=True, help="Seconds between checks of an empty queue")
+@click.option("--max-jobs", type=int, default=None, help="Exit after this many steps")
+def queue_worker(queue_dir, executor, worker_id, services, poll, max_jobs):
+    """Run queued pipeline steps from the shared queue folder; start one per machine (or several)."""
+    from scripts.work_queue import run_worker
+    run_worker(queue_dir, executor, worker_id, services, poll, max_jobs)
+
+
+@cli.command()
+@click.option("--frames", "counts", multiple=True, type=int, default=(500, 1000, 2000, 4000), show_default=True,
+              help="Frame counts to plan pairs for")
+@click.option("--image-dir", default=None, type=click.Path(exists=True, file_okay=False),
+              help="Use the first N frames of this folder instead of synthetic thumbnails")
+@click.option("--max-pairs", default=20, show_default=True, help="Pairs per image cap")
+def bench_pairs(counts, image_dir, max_pairs):
+    """Benchmark the match-pair planner: pairs must grow linearly with the frame count."""
+    from scripts.benchmarks import benchmark_pair_planner
+    benchmark_pair_planner(counts=counts, image_dir=image_dir, max_pairs=max_pairs)
+
+
+@cli.command()
+@click.option("--command", "commands", multiple=True, help="Subcommands to measure (default: all)")
+@click.option("--budget", type=float, default=None, help="Budget in seconds for every command (default: per-command budgets)")
+@click.option("--repeats", default=3, show_default=True, help="Best of N fresh interpreters")
+def bench_startup(commands, budget, repeats):
+    """Measure each subcommand's startup (python -X importtime) and fail when one is over budget."""
+    from scripts.benchmarks import benchmark_cli_startup
+    results = benchmark_cli_startup(commands=commands, budget=budget, repeats=repeats)
+    over = [name for name, seconds, limit, _, _ in results if seconds is not None and seconds > limit]
+    if over:
+        raise click.ClickException(f"Startup over budget: {', '.join(over)}")
+
+
+@cli.group()
+def stats():
+    """Statistics of all sparse models, kept in one Parquet table."""
+
+
+@stats.command("refresh")
+@click.option("--projects-dir", default="projects", show_default=True, type=click.Path(exists=True, file_okay=False))
+@click.option("--stats-file", default=None, help="Parquet table to update (default: <projects-dir>/stats.parquet)")
+@click.option("--check", type=click.Choice(["mtime", "hash"]), default="mtime", show_default=True,
+              help="How a model is judged stale: size+mtime or a hash of its .bin files")
+@click.option("--workers", type=int, default=None, help="Parallel analyses (default: one per CPU)")
+@click.option("--force", is_flag=True, help="Re-analyze every model")
+def stats_refresh(projects_dir, stats_file, check, workers, force):
+    """Analyze new or changed sparse models in parallel and update the stats table."""
+    from scripts.stats_store import refresh_stats
+    stats_file = stats_file or str(Path(projects_dir) / "stats.parquet")
+    refresh_stats(projects_dir, stats_file, check=check, workers=workers, force=force)
+
+
+def main():
+    """Entry point: pipeline errors become exit codes (see scripts/errors.py) instead of tracebacks."""
+    from scripts.errors import PipelineError
+    try:
+        cli()
+    except PipelineError as e:
+        click.echo(f"❌ {e}", err=True)
+        raise SystemExit(e.exit_code)
+
+
 if __name__ == "__main__":
-    cli()
+    main()
 
@@ -0,0 +1,341 @@
+"""
+COLMAP database (db.db) helpers: a feature cache that seeds new databases from earlier ones.
+
+feature_extractor is the most expensive step repeated across reruns, although its result
+depends only on the images, the masks and the extraction options.  FeatureCache keys a
+database by
+
+    (content hash of the source frames, content hash of the masks, how the masks are used,
+     extraction options, colmap tool version)
+
+where the source frames are the image folder itself, or the frames it was derived from
+(`source_dir`: a model folder holding hardlinked or masked copies of a project's frames),
+and the masks are used by feature_extractor (--ImageReader.mask_path), baked into the
+images (mode=direct) or absent.  Keying on the source rather than the copies means the
+memoized frame digests are reused instead of rehashing images a recipe rewrote.
+
+Limitation: models only share a key when they extract the same frames with the same
+masking and options.  In the default matrix (Makefile colmap-model-0..3) no two models do:
+0/1 and 2/3 differ in masking, 0/2 and 1/3 in extraction options.  The cache pays off
+when a model is rerun (after `make clean`, a matcher or mapper change, another checkout)
+or when another project or target extracts the same frames the same way.
+
+The cache remembers, per key, one database that was extracted that way
+(<cache_dir>/<key>.json).  A later extraction with the same key copies that database
+(sqlite backup API, consistent even while the source is in use) and drops its matches and
+two-view geometries, leaving cameras, images, keypoints and descriptors; only matching and
+mapping then run again.
+
+inspect_database() reads a database without opening it for writing and reports what
+matching produced (keypoints, inliers, two-view configurations, view graph components);
+check_view_graph() turns that into an early abort before the mapper.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+from loguru import logger
+
+from scripts.container_paths import container_to_host_path
+from scripts.utils import run_subprocess
+
+DEFAULT_CACHE_DIR = os.path.join("projects", ".feature-cache")
+# tables derived from the features by matching; everything else is kept when seeding
+MATCH_TABLES = ("matches", "two_view_geometries")
+# what COLMAP's ImageReader picks up from an image folder
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+# options that change how fast features are extracted, not which ones
+IGNORED_OPTIONS = ("--database_path", "--image_path", "--ImageReader.mask_path", "--SiftExtraction.num_threads")
+
+
+def connect_readonly(db_path):
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def database_images(db_path):
+    """{image name: number of keypoints} of a COLMAP database."""
+    with connect_readonly(db_path) as db:
+        return dict(db.execute(
+            "SELECT images.name, COALESCE(keypoints.rows, 0) FROM images "
+            "LEFT JOIN keypoints ON keypoints.image_id = images.image_id"))
+
+
+def _delete_matches(db):
+    tables = {name for (name,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in MATCH_TABLES:
+        if table in tables:
+            db.execute(f"DELETE FROM {table}")
+    db.commit()
+
+
+def seed_database(source_db, target_db):
+    """Copy source_db to target_db without its matches: a database ready for the matcher."""
+    tmp = f"{target_db}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    with connect_readonly(source_db) as source, sqlite3.connect(tmp) as target:
+        source.backup(target)
+        _delete_matches(target)
+        target.execute("VACUUM")
+    os.replace(tmp, target_db)
+
+
+def clear_matches(db_path):
+    """Drop the matches and two-view geometries of a database, keeping its features."""
+    with sqlite3.connect(db_path) as db:
+        _delete_matches(db)
+
+
+def matcher_runner(run=run_subprocess):
+    """
+    A run_subprocess-compatible callable for a matcher step: clears the matches of its
+    --database_path first, so a new matcher (or the staged copy of an already matched
+    database) starts from the features alone instead of adding to the previous matches.
+    """
+    def match(cmd_suffix, step_name):
+        db_path = container_to_host_path(_options(cmd_suffix, "--database_path"))
+        if os.path.exists(db_path):
+            clear_matches(db_path)
+        run(cmd_suffix, step_name)
+
+    return match
+
+
+def _options(argv, name):
+    """Value of `--name value` in argv, or None."""
+    argv = [str(a) for a in argv]
+    return argv[argv.index(name) + 1] if name in argv[:-1] else None
+
+
+def extraction_options(argv):
+    """The feature_extractor options that decide its result, as sorted (option, value) pairs."""
+    argv = [str(a) for a in argv]
+    options = []
+    for i, item in enumerate(argv):
+        if item.startswith("--") and item not in IGNORED_OPTIONS:
+            options.append((item, argv[i + 1] if i + 1 < len(argv) else ""))
+    return sorted(options)
+
+
+class FeatureCache:
+    """Index of databases by feature extraction key; seeds new databases from them."""
+
+    def __init__(self, cache_dir=None):
+        from scripts.step_cache import StepCache
+
+        self.cache_dir = str(cache_dir or os.environ.get("GBT_FEATURE_CACHE", DEFAULT_CACHE_DIR))
+        # content digests memoized by size and mtime, like the step stamps
+        self.digests = StepCache(os.path.join(self.cache_dir, ".digests"))
+
+    def key(self, image_dir, cmd_suffix, mask_dir=None, source_dir=None):
+        """Extraction key: source frames (image_dir unless source_dir is given), masks and their use, options, tool."""
+        has_masks = bool(mask_dir) and os.path.isdir(mask_dir) and any(
+            name.lower().endswith(IMAGE_EXTENSIONS) for name in os.listdir(mask_dir))
+        if _options(cmd_suffix, "--ImageReader.mask_path"):
+            masking = "extractor"
+        else:
+            masking = "direct" if has_masks and source_dir else "none"
+        data = {
+            "frames": self.digests.digest(source_dir or image_dir),
+            "masks": self.digests.digest(mask_dir) if has_masks else None,
+            "masking": masking,
+            "options": extraction_options(cmd_suffix[2:]),
+            "tool": self.digests.tool_version(str(cmd_suffix[0])),
+        }
+        self.digests.save_memo()
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, key, image_dir):
+        """A database extracted with this key that still holds every image, or None."""
+        try:
+            with open(self.entry_path(key)) as f:
+                entry = json.load(f)
+            images = database_images(entry["database"])
+        except (OSError, ValueError, KeyError, sqlite3.Error):
+            return None
+        names = {name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS)}
+        # the database may have been re-extracted or deleted since it was registered
+        if set(images) != names or not all(images.values()):
+            logger.info(f"🗑️ Feature cache entry {key[:12]} no longer matches {entry['database']}")
+            return None
+        return entry["database"]
+
+    def register(self, key, db_path):
+        # one key per database: a re-extraction with other options replaces the old entry
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json") and name != f"{key}.json":
+                try:
+                    with open(os.path.join(self.cache_dir, name)) as f:
+                        if json.load(f).get("database") == os.path.abspath(db_path):
+                            os.unlink(os.path.join(self.cache_dir, name))
+                except (OSError, ValueError):
+                    pass
+        tmp = f"{self.entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"database": os.path.abspath(db_path), "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+        os.replace(tmp, self.entry_path(key))
+
+    def runner(self, db_path, run=run_subprocess, source_dir=None, mask_dir=None):
+        """
+        A run_subprocess-compatible callable for a feature_extractor step whose database ends
+        up at db_path (host path).  The step's argv may write to a staging copy (CachedStep);
+        seeding writes there too.  source_dir and mask_dir (host paths) are given when the
+        --image_path folder was derived from source_dir's frames, masked with mask_dir.
+        """
+        def extract(cmd_suffix, step_name):
+            target = container_to_host_path(_options(cmd_suffix, "--database_path"))
+            image_dir = container_to_host_path(_options(cmd_suffix, "--image_path"))
+            mask_path = _options(cmd_suffix, "--ImageReader.mask_path")
+            masks = container_to_host_path(mask_path) if mask_path else mask_dir
+            key = self.key(image_dir, cmd_suffix, masks, source_dir)
+
+            source = self.lookup(key, image_dir)
+            if source and os.path.abspath(source) != os.path.abspath(target):
+                start_time = time.time()
+                seed_database(source, target)
+                logger.success(f"♻️ [{step_name}] seeded from {source} (feature cache {key[:12]}) "
+                               f"in {time.time() - start_time:.1f} sec")
+                self.register(key, db_path)
+                return
+            run(cmd_suffix, step_name)
+            self.register(key, db_path)
+
+        return extract
+
+
+# --------------------------------------------------------------------------------------
+# Read-only inspection: what matching produced, before the mapper spends hours on it
+# --------------------------------------------------------------------------------------
+
+MAX_IMAGE_ID = 2147483647  # pair_id = image_id1 * MAX_IMAGE_ID + image_id2, image_id1 < image_id2
+TWO_VIEW_CONFIGS = {
+    0: "undefined", 1: "degenerate", 2: "calibrated", 3: "uncalibrated", 4: "planar",
+    5: "panoramic", 6: "planar_or_panoramic", 7: "watermark", 8: "multiple",
+}
+
+
+def pair_ids_to_image_ids(pair_ids):
+    pair_ids = np.asarray(pair_ids, dtype=np.int64)
+    image_id2 = pair_ids % MAX_IMAGE_ID
+    return (pair_ids - image_id2) // MAX_IMAGE_ID, image_id2
+
+
+def _components(image_ids, id1, id2):
+    """Connected components of the view graph as a list of image id arrays, largest first."""
+    index = {int(image_id): i for i, image_id in enumerate(image_ids)}
+    parent = np.arange(len(image_ids))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(id1.tolist(), id2.tolist()):
+        ra, rb = find(index[a]), find(index[b])
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([find(i) for i in range(len(image_ids))], dtype=np.int64)
+    groups = [image_ids[roots == root] for root in np.unique(roots)]
+    return sorted(groups, key=len, reverse=True)
+
+
+def inspect_database(db_path, min_inliers=15, decode_matches=False):
+    """
+    One pass over a COLMAP database, read-only: keypoints per image, raw and inlier matches
+    per pair, two-view geometry configurations and the view graph (pairs with at least
+    min_inliers inliers, the mapper's default min_num_matches) with its connected components.
+
+    Counts come from the `rows` columns, so the blobs are not read; with decode_matches the
+    inlier match blobs are decoded too (np.frombuffer), giving the number of distinct
+    keypoints per image that have an inlier match.
+    """
+    start_time = time.time()
+    with connect_readonly(db_path) as db:
+        images = db.execute(
+            "SELECT images.image_id, images.name, COALESCE(keypoints.rows, 0) FROM images "
+            "LEFT JOIN keypoints ON keypoints.image_id = images.image_id ORDER BY images.image_id").fetchall()
+        raw = np.array(db.execute("SELECT pair_id, rows FROM matches").fetchall(), dtype=np.int64).reshape(-1, 2)
+        geometries = np.array(db.execute("SELECT pair_id, rows, config FROM two_view_geometries").fetchall(),
+                              dtype=np.int64).reshape(-1, 3)
+
+        # one flag per keypoint: set when the keypoint has an inlier match in any pair
+        matched = {image_id: np.zeros(count, dtype=bool) for image_id, _, count in images} if decode_matches else {}
+        if decode_matches:
+            # streamed: one blob at a time, never the whole table in memory
+            for pair_id, rows, data in db.execute("SELECT pair_id, rows, data FROM two_view_geometries WHERE rows > 0"):
+                pairs = np.frombuffer(data, dtype=np.uint32).reshape(rows, 2)
+                id1, id2 = pair_ids_to_image_ids([pair_id])
+                matched[int(id1[0])][pairs[:, 0]] = True
+                matched[int(id2[0])][pairs[:, 1]] = True
+
+    image_ids = np.array([row[0] for row in images], dtype=np.int64)
+    keypoints = np.array([row[2] for row in images], dtype=np.int64)
+    id1, id2 = pair_ids_to_image_ids(geometries[:, 0])
+    inliers, configs = geometries[:, 1], geometries[:, 2]
+    edges = inliers >= min_inliers
+    degree = np.zeros(len(image_ids), dtype=np.int64)
+    row_of = np.searchsorted(image_ids, np.concatenate([id1[edges], id2[edges]]))
+    np.add.at(degree, row_of, 1)
+    components = _components(image_ids, id1[edges], id2[edges]) if len(image_ids) else []
+    names = {row[0]: row[1] for row in images}
+
+    report = {
+        "database": str(db_path),
+        "images": len(image_ids),
+        "keypoints": {
+            "total": int(keypoints.sum()),
+            "min": int(keypoints.min()) if len(keypoints) else 0,
+            "median": float(np.median(keypoints)) if len(keypoints) else 0.0,
+            "without": [names[i] for i in image_ids[keypoints == 0].tolist()],
+        },
+        "matched_pairs": len(raw),
+        "raw_matches_median": float(np.median(raw[:, 1])) if len(raw) else 0.0,
+        "verified_pairs": int((inliers > 0).sum()),
+        "inliers_median": float(np.median(inliers[inliers > 0])) if (inliers > 0).any() else 0.0,
+        "configs": {TWO_VIEW_CONFIGS.get(int(c), str(c)): int(n) for c, n in zip(*np.unique(configs, return_counts=True))},
+        "view_graph": {
+            "min_inliers": min_inliers,
+            "edges": int(edges.sum()),
+            "components": len(components),
+            "largest_component": len(components[0]) if components else 0,
+            "isolated": [names[i] for i in image_ids[degree == 0].tolist()],
+            "degree_median": float(np.median(degree)) if len(degree) else 0.0,
+        },
+        "inspected_in": round(time.time() - start_time, 2),
+    }
+    if decode_matches:
+        coverage = np.array([matched[i].sum() for i in image_ids.tolist()], dtype=np.int64)
+        report["matched_keypoints_median"] = float(np.median(coverage)) if len(coverage) else 0.0
+        report["matched_keypoints_fraction"] = float(coverage.sum() / max(keypoints.sum(), 1))
+    return report
+
+
+def check_view_graph(db_path, min_inliers=15, min_images=3, warn_fraction=0.5):
+    """
+    Inspect the database after matching and stop before the mapper when it cannot build a
+    model (largest view graph component under min_images); warn when the graph is split.
+    Returns the report.
+    """
+    from scripts.errors import QualityCheckFailed
+
+    report = inspect_database(db_path, min_inliers)
+    graph = report["view_graph"]
+    logger.info(f"🔍 {report['images']} images, {report['verified_pairs']} verified pairs, "
+                f"{graph['edges']} with ≥{min_inliers} inliers, {graph['components']} component(s), "
+                f"largest {graph['largest_component']}, {len(graph['isolated'])} isolated "
+                f"({report['inspected_in']} sec)")
+    if graph["largest_component"] < min_images:
+        raise QualityCheckFailed(f"View graph too weak for the mapper: largest connected component has "
+                                 f"{graph['largest_component']} of {report['images']} images", "matches")
+    if graph["largest_component"] < warn_fraction * report["images"]:
+        logger.warning(f"⚠️ View graph split: largest component holds only {graph['largest_component']} of "
+                       f"{report['images']} images; the model will be partial")
+    return report
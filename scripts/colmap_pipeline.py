@@ -8,17 +8,22 @@ import subprocess
 from pathlib import Path
 
 
-from scripts.utils import run_subprocess, DOCKER_COMPOSE_PREFIX
+from scripts.utils import run_subprocess
+from scripts.container_paths import container_to_host_path, host_to_container_path
+from scripts.executors import get_executor, in_pipeline_session
+from scripts.step_cache import StepCache
+from scripts.resource_monitor import load_resource_summaries, profile_steps
 from loguru import logger
 from datetime import datetime
 
-def run_colmap_feature_extractor(image_path, db_path):
-    run_subprocess([
+def run_colmap_feature_extractor(image_path, db_path, mask_path=None, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "feature_extractor",
         "--database_path", db_path,
         "--image_path", image_path,
+        *(["--ImageReader.mask_path", mask_path] if mask_path else []),
         "--ImageReader.single_camera", "1",
         "--ImageReader.camera_model", "PINHOLE",          # assume pinhole, can be changed if needed
         "--SiftExtraction.use_gpu", "0",                   # CPU for stability
@@ -28,8 +33,8 @@ def run_colmap_feature_extractor(image_path, db_path):
         "--SiftExtraction.max_image_size", "3200",         # important: limit to ~3000-3500px max
     ], "COLMAP FeatureExtractor")
 
-def run_colmap_exhaustive_matcher(db_path):
-    run_subprocess([
+def run_colmap_exhaustive_matcher(db_path, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "exhaustive_matcher",
@@ -38,8 +43,8 @@ def run_colmap_exhaustive_matcher(db_path):
         "--SiftMatching.num_threads", "8"  # safe limit
     ], "COLMAP ExhaustiveMatcher")
 
-def run_colmap_sequential_matcher(db_path):
-    run_subprocess([
+def run_colmap_sequential_matcher(db_path, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "sequential_matcher",
@@ -49,8 +54,8 @@ def run_colmap_sequential_matcher(db_path):
         "--SequentialMatching.overlap", "5",  # Match to 5 neighbors forward and backward
     ], "COLMAP SequentialMatcher")
 
-def run_colmap_sequential_matcher2(db_path):
-    run_subprocess([
+def run_colmap_sequential_matcher2(db_path, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "sequential_matcher",
@@ -62,8 +67,33 @@ def run_colmap_sequential_matcher2(db_path):
         "--SequentialMatching.loop_detection", "0",    # Optional: disable loop detection for linear flight
     ], "COLMAP SequentialMatcher")
 
-def run_colmap_mapper(db_path, image_path, output_path):
-    run_subprocess([
+def run_colmap_matches_importer(db_path, match_list_path, run=run_subprocess):
+    run([
+        "colmap",
+        "colmap",
+        "matches_importer",
+        "--database_path", db_path,
+        "--match_list_path", match_list_path,  # image pairs, see scripts/pair_planner.py
+        "--match_type", "pairs",
+        "--SiftMatching.use_gpu", "0",
+        "--SiftMatching.num_threads", "8",
+    ], "COLMAP MatchesImporter (Planned Pairs)")
+
+MATCHERS = ("sequential", "exhaustive", "planned")
+
+def run_colmap_matcher(matcher, db_path, match_list_path=None, run=run_subprocess):
+    """Run one of MATCHERS; "planned" needs the pair list written by pair_planner.write_pairs."""
+    if matcher == "sequential":
+        run_colmap_sequential_matcher(db_path, run=run)
+    elif matcher == "exhaustive":
+        run_colmap_exhaustive_matcher(db_path, run=run)
+    elif matcher == "planned":
+        run_colmap_matches_importer(db_path, match_list_path, run=run)
+    else:
+        raise ValueError(f"Unknown matcher: {matcher} (expected one of {', '.join(MATCHERS)})")
+
+def run_colmap_mapper(db_path, image_path, output_path, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "mapper",
@@ -73,8 +103,8 @@ def run_colmap_mapper(db_path, image_path, output_path):
         "--Mapper.num_threads", "8"  # safe limit
     ], "COLMAP Mapper (Sparse Reconstruction)")
 
-def run_colmap_model_converter(input_model_path, output_ply_path):
-    run_subprocess([
+def run_colmap_model_converter(input_model_path, output_ply_path, run=run_subprocess):
+    run([
         "colmap",
         "colmap",
         "model_converter",
@@ -83,10 +113,68 @@ def run_colmap_model_converter(input_model_path, output_ply_path):
         "--output_type", "PLY"
     ], "COLMAP ModelConverter (Export PLY)")
 
-def run_colmap_model_analyzer(model_folder_in_container, stats_file, elapsed_time):
+MODEL_ANALYZER_PATTERNS = {
+    "Cameras": r"\]\s+Cameras:\s+(\d+)",
+    "Images": r"\]\s+Images:\s+(\d+)",
+    "Registered Images": r"\]\s+Registered images:\s+(\d+)",
+    "Points3D": r"\]\s+Points:\s+(\d+)",
+    "Observations": r"\]\s+Observations:\s+(\d+)",
+    "Mean Track Length": r"\]\s+Mean track length:\s+([\d\.]+)",
+    "Mean Observations per Image": r"\]\s+Mean observations per image:\s+([\d\.]+)",
+    "Mean Reprojection Error": r"\]\s+Mean reprojection error:\s+([\d\.]+)"
+}
+
+
+def parse_model_analyzer_output(output):
+    """Metrics printed by `colmap model_analyzer` ("?" for the ones missing)."""
+    metrics = {}
+    for key, pattern in MODEL_ANALYZER_PATTERNS.items():
+        metrics[key] = "?"
+        for line in output.splitlines():
+            match = re.search(pattern, line)
+            if match:
+                metrics[key] = float(match.group(1)) if '.' in match.group(1) else int(match.group(1))
+                break
+    return metrics
+
+
+def scenario_parameters(scenario_name):
+    """<video>-<format>_<fps>_<maxdim>_<filter> → the extraction parameters."""
+    video, config = scenario_name.split("-", 1)
+    format_, fps, max_dim, filter_ = config.split("_")
+    return {
+        "Video": video,
+        "Format": format_,
+        "Filter": filter_,
+        "FPS": float(fps),
+        "MaxDim": int(max_dim),
+    }
+
+
+def add_derived_metrics(df):
+    """Ratio columns of a stats DataFrame (one row per model)."""
+    try:
+        df["pts_per_img"] = df["Points3D"] / df["Images"]
+        df["obs_per_pt"] = df["Observations"] / df["Points3D"]
+        df["obs_per_img"] = df["Observations"] / df["Images"]
+        df["quality"] = df["Points3D"] / df["Mean Reprojection Error"]
+        df["points_per_registered_img"] = df["Points3D"] / df["Registered Images"]
+        df["obs_per_registered_img"] = df["Observations"] / df["Registered Images"]
+        df["obs_per_cam"] = df["Observations"] / df["Cameras"]
+        df["pts_per_cam"] = df["Points3D"] / df["Cameras"]
+    except ZeroDivisionError as e:
+        logger.warning(f"⚠️ Division by zero in derived metrics: {e}")
+    return df
+
+
+def run_colmap_model_analyzer(model_folder_in_container, stats_file, elapsed_time, engine="numpy"):
     """
-    Run COLMAP model_analyzer inside container and save output as JSON in colmap/stats/model_analyzer.json.
+    Analyze a sparse model and save the metrics as JSON in colmap/stats/model_analyzer.json.
     `model_folder_in_container` should be like /projects/project_name/colmap/sparse/0
+
+    engine="numpy" reads the .bin files directly (scripts/colmap_model.py, no container, adds
+    per-image observation and triangulation angle metrics); engine="colmap" runs
+    `colmap model_analyzer` in the colmap container and parses its output.
     """
     model_path = Path(model_folder_in_container)
     
@@ -101,84 +189,62 @@ def run_colmap_model_analyzer(model_folder_in_container, stats_file, elapsed_tim
     logger.info(f"Scenario name: {scenario_name}")
     logger.info(f"Model id: {model_id}")
 
-    cmd = DOCKER_COMPOSE_PREFIX + [
-        "run", "--rm",
-        "--user", f"{os.getuid()}:{os.getgid()}",
-        "colmap", "colmap", "model_analyzer",
-        "--path", model_folder_in_container
-    ]
-
-    logger.info(f"📊 Running COLMAP model_analyzer for: {scenario_name}")
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    logger.info(f"📊 Running model analyzer ({engine}) for: {scenario_name}")
+    if engine == "numpy":
+        from scripts.colmap_model import model_statistics
+        metrics = model_statistics(container_to_host_path(model_folder_in_container))
+        output = json.dumps(metrics, indent=2)
+    elif engine == "colmap":
+        cmd = get_executor().command("colmap", [
+            "colmap", "model_analyzer",
+            "--path", model_folder_in_container
+        ])
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"❌ model_analyzer failed for {scenario_name}: {e.output}")
+            raise
         output = result.stderr
+        metrics = parse_model_analyzer_output(output)
+    else:
+        raise ValueError(f"Unknown model analyzer engine: {engine}")
 
-        video, config = scenario_name.split("-", 1)
-        format_, fps, max_dim, filter_ = config.split("_")
-
-        stats = {
-            "Scenario": scenario_name,
-            "Model ID": model_id,
-            "Video": video,
-            "Format": format_,
-            "Filter": filter_,
-            "FPS": float(fps),
-            "MaxDim": int(max_dim),
-            "Timestamp": datetime.now().isoformat(),
-            "Elapsed": elapsed_time,
-        }
-
-        patterns = {
-            "Cameras": r"\]\s+Cameras:\s+(\d+)",
-            "Images": r"\]\s+Images:\s+(\d+)",
-            "Registered Images": r"\]\s+Registered images:\s+(\d+)",
-            "Points3D": r"\]\s+Points:\s+(\d+)",
-            "Observations": r"\]\s+Observations:\s+(\d+)",
-            "Mean Track Length": r"\]\s+Mean track length:\s+([\d\.]+)",
-            "Mean Observations per Image": r"\]\s+Mean observations per image:\s+([\d\.]+)",
-            "Mean Reprojection Error": r"\]\s+Mean reprojection error:\s+([\d\.]+)"
-        }
-
-        for key, pattern in patterns.items():
-            stats[key] = "?"
-            for line in output.splitlines():
-                match = re.search(pattern, line)
-                if match:
-                    stats[key] = float(match.group(1)) if '.' in match.group(1) else int(match.group(1))
-                    break
-
-        df = pd.DataFrame([stats])
+    stats = {
+        "Scenario": scenario_name,
+        "Model ID": model_id,
+        **scenario_parameters(scenario_name),
+        "Timestamp": datetime.now().isoformat(),
+        "Elapsed": elapsed_time,
+        "Engine": engine,
+        **metrics,
+    }
 
-        try:
-            df["pts_per_img"] = df["Points3D"] / df["Images"]
-            df["obs_per_pt"] = df["Observations"] / df["Points3D"]
-            df["obs_per_img"] = df["Observations"] / df["Images"]
-            df["quality"] = df["Points3D"] / df["Mean Reprojection Error"]
-            df["points_per_registered_img"] = df["Points3D"] / df["Registered Images"]
-            df["obs_per_registered_img"] = df["Observations"] / df["Registered Images"]
-            df["obs_per_cam"] = df["Observations"] / df["Cameras"]
-            df["pts_per_cam"] = df["Points3D"] / df["Cameras"]
-        except ZeroDivisionError as e:
-            logger.warning(f"⚠️ Division by zero in derived metrics: {e}")
+    # totals over the steps profiled into resources-*.jsonl (see resource_monitor)
+    usage = load_resource_summaries(resources_file_for(stats_file)).values()
+    if usage:
+        stats["CPU Time"] = round(sum(u["cpu_s"] for u in usage), 1)
+        stats["Peak Memory MB"] = max(u.get("peak_mem_mb", 0.0) for u in usage)
+        stats["Memory Source"] = ", ".join(sorted({u.get("mem_source", "?") for u in usage}))
+        stats["Read MB"] = round(sum(u["read_mb"] for u in usage), 1)
+        stats["Write MB"] = round(sum(u["write_mb"] for u in usage), 1)
 
-        df_out = df.to_dict(orient="records")[0]
-        stats_file.write_text(json.dumps(df_out, indent=2))
+    df = add_derived_metrics(pd.DataFrame([stats]))
 
-        txt_filename = stats_file.with_suffix(".txt")
-        txt_filename.write_text(output)
+    df_out = df.to_dict(orient="records")[0]
+    stats_file.write_text(json.dumps(df_out, indent=2))
 
-        logger.success(f"✅ ModelAnalyzer stats saved → {stats_file}")
-        return stats
+    txt_filename = stats_file.with_suffix(".txt")
+    txt_filename.write_text(output)
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"❌ model_analyzer failed for {scenario_name}: {e.output}")
-        raise
+    logger.success(f"✅ ModelAnalyzer stats saved → {stats_file}")
+    return stats
 
 
-def host_to_container_path(host_path):
-    if not os.path.abspath(host_path).startswith(os.path.abspath("projects")):
-        raise ValueError(f"Path {host_path} is outside of projects/ folder!")
-    return "/projects/" + os.path.relpath(host_path, "projects")
+def resources_file_for(stats_file):
+    """stats/model_analyzer-<name>.json → stats/resources-<name>.jsonl"""
+    stats_file = Path(stats_file)
+    return stats_file.with_name(stats_file.stem.replace("model_analyzer-", "resources-") + ".jsonl")
+
 
 from pathlib import Path
 import shutil
@@ -217,8 +283,14 @@ def flatten_sparse_model(sparse_root: str | Path, model_id: str = "0"):
         logger.error(f"❌ Failed to remove {model_path}: {e}")
 
 
-def run_colmap_pipeline(image_path, colmap_output_folder):
-    """Create and run the COLMAP pipeline using Path objects."""
+@in_pipeline_session
+def run_colmap_pipeline(image_path, colmap_output_folder, force=False, matcher="sequential"):
+    """
+    Create and run the COLMAP pipeline using Path objects.  Unchanged steps are skipped unless force,
+    so rerunning after a failure resumes at the failed step (the .stamps are its checkpoints).
+    `matcher` is one of MATCHERS; "planned" matches the pairs from scripts/pair_planner.py.
+    Raises StepFailed when a step fails.
+    """
     
     start_time = time.time()  # ⏱️ Start timer
     
@@ -254,21 +326,46 @@ def run_colmap_pipeline(image_path, colmap_output_folder):
     logger.info(f"📂 ply_output_path_host         : {ply_output_path_host}")
     logger.info(f"📦 ply_output_path_in_container : {ply_output_path_in_container}")
 
-    if 1:
-        # 4️⃣ Run pipeline steps with CONTAINER paths
-        run_colmap_feature_extractor(image_path_in_container, db_path_in_container)
-        run_colmap_sequential_matcher(db_path_in_container)
-        run_colmap_mapper(db_path_in_container, image_path_in_container, sparse_folder_in_container)
-
-        # 4.5️⃣ Flatten sparse/0 → sparse/
-        flatten_sparse_model(sparse_folder, model_id="0")
+    # 📈 CPU/memory/IO samples of every step go next to the model_analyzer stats
+    with profile_steps(resources_file_for(stats_file)):
+        # 4️⃣ Run pipeline steps with CONTAINER paths, skipping steps whose fingerprint is unchanged
+        steps = StepCache(colmap_output_folder / ".stamps", to_container=host_to_container_path, force=force)
+
+        # ♻️ an identical extraction (same images and options) in another model seeds db.db instead
+        from scripts.colmap_database import FeatureCache
+        features = steps.step("features", inputs=[image_path], outputs=[db_path_host],
+                              runner=FeatureCache().runner(db_path_host))
+        run_colmap_feature_extractor(image_path_in_container, db_path_in_container, run=features)
+
+        pairs_host = colmap_output_folder / "pairs.txt"
+        if matcher == "planned":
+            # 🧩 cheap (thumbnails only): replanned every run, matching reruns only if the pairs changed
+            from scripts.pair_planner import write_pairs
+            write_pairs(image_path, pairs_host)
+        # the staged db.db is a copy of the current one: its old matches are cleared before matching
+        from scripts.colmap_database import matcher_runner
+        matches = steps.step("matches", inputs=[pairs_host] if matcher == "planned" else [], outputs=[db_path_host],
+                             mutates=[db_path_host], upstream=[features.fingerprint], runner=matcher_runner())
+        run_colmap_matcher(matcher, db_path_in_container, host_to_container_path(str(pairs_host)), run=matches)
+
+        # 🔍 abort here, not hours into the mapper, when the view graph cannot hold a model
+        from scripts.colmap_database import check_view_graph
+        report = check_view_graph(db_path_host)
+        (stats_folder / f"database-{colmap_output_folder.name}.json").write_text(json.dumps(report, indent=2))
+
+        # 4.5️⃣ Flatten sparse/0 → sparse/ (inside the staging folder, before it is committed)
+        mapper = steps.step("mapper", inputs=[image_path], output_dirs=[sparse_folder], upstream=[matches.fingerprint],
+                            after=lambda staged: flatten_sparse_model(staged[str(sparse_folder)], model_id="0"))
+        run_colmap_mapper(db_path_in_container, image_path_in_container, sparse_folder_in_container, run=mapper)
+
+        # 5️⃣ Check if model was produced
+        points3D_bin_host = model_0_folder_host / "points3D.bin"
+        if points3D_bin_host.exists():
+            logger.info(f"✅ Mapper produced model — exporting PLY to {ply_output_path_host}")
+            converter = steps.step("ply", outputs=[ply_output_path_host], upstream=[mapper.fingerprint])
+            run_colmap_model_converter(model_0_folder_in_container, ply_output_path_in_container, run=converter)
 
-    # 5️⃣ Check if model was produced
-    points3D_bin_host = model_0_folder_host / "points3D.bin"
     if points3D_bin_host.exists():
-        logger.info(f"✅ Mapper produced model — exporting PLY to {ply_output_path_host}")
-        run_colmap_model_converter(model_0_folder_in_container, ply_output_path_in_container)
-
         elapsed_time = time.time() - start_time
         run_colmap_model_analyzer(model_0_folder_in_container, str(stats_file), elapsed_time)
         # 6️⃣ Count points (optional)
@@ -280,6 +377,7 @@ def run_colmap_pipeline(image_path, colmap_output_folder):
 
 from pathlib import Path
 
+@in_pipeline_session
 def run_colmap_point_filtering(input_model_host, output_model_host, min_track_len=2, max_reproj_error=4.0, min_tri_angle=1.5):
     """Run COLMAP point_filtering inside a Docker container with project-relative paths."""
 
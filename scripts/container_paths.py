@@ -0,0 +1,21 @@
+"""
+Host ↔ container paths: projects/ on the host is mounted at /projects/ in every service.
+
+Kept free of heavy imports, so CLI commands that only build a command line start fast.
+"""
+
+import os
+
+
+def host_to_container_path(host_path):
+    if not os.path.abspath(host_path).startswith(os.path.abspath("projects")):
+        raise ValueError(f"Path {host_path} is outside of projects/ folder!")
+    return "/projects/" + os.path.relpath(host_path, "projects")
+
+
+def container_to_host_path(container_path):
+    """/projects/... → projects/... (the inverse of host_to_container_path)."""
+    container_path = str(container_path)
+    if not container_path.startswith("/projects/"):
+        raise ValueError(f"Path {container_path} is outside of /projects/ folder!")
+    return os.path.join("projects", container_path[len("/projects/"):])
@@ -0,0 +1,35 @@
+"""
+Exceptions raised by pipeline helpers instead of exiting the interpreter.
+
+A failing step or quality check now ends only the pipeline it belongs to: the scheduler,
+the sweep and the asyncio runner catch these per task and carry on with the rest.  Only
+the CLI boundary (scripts/cli.py) turns them into a process exit code.
+"""
+
+
+class PipelineError(Exception):
+    """Base class; `exit_code` is what the CLI exits with."""
+
+    exit_code = 1
+
+    def __init__(self, message, step=None):
+        super().__init__(message)
+        self.step = step
+
+
+class StepFailed(PipelineError):
+    """An external tool exited non-zero (or could not be started)."""
+
+    exit_code = 2
+
+    def __init__(self, step, returncode=None, log_path=None):
+        detail = f"exit code {returncode}" if returncode is not None else "could not be started"
+        super().__init__(f"Step '{step}' failed ({detail})" + (f", output in {log_path}" if log_path else ""), step)
+        self.returncode = returncode
+        self.log_path = log_path
+
+
+class QualityCheckFailed(PipelineError):
+    """A step ran but its result is too poor to continue (too few matches, poses, points, ...)."""
+
+    exit_code = 3
@@ -0,0 +1,252 @@
+"""
+Executors decide how a pipeline step `[service, tool, args...]` is turned into a host command.
+
+- compose-run : `docker compose run --rm <service> ...` per step (a new container every step)
+- docker-exec : one long-lived container per service, steps dispatched with `docker exec`
+- local       : run the tool directly on the host (tools installed locally, or testing without Docker)
+- queue       : hand the step to a queue worker, possibly on another machine sharing projects/
+
+The executor is picked with GBT_EXECUTOR (default docker-exec) and shared by every
+run_subprocess call inside a `pipeline_session()`, so a COLMAP pipeline run starts the
+colmap container once instead of once per step.
+"""
+
+import functools
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from loguru import logger
+
+# Always point explicitly to the docker-compose.yml
+DOCKER_COMPOSE_PREFIX = [
+    "docker", "compose", "-f", "./docker/docker-compose.yml"
+]
+
+
+# labels of the long-lived docker-exec containers: which executor, and which host process owns them
+CONTAINER_LABEL = "gbt.executor=docker-exec"
+OWNER_LABEL = "gbt.owner"
+
+# docker-exec steps run in their own session (setsid), so the session leader's pid is also the
+# process group of the tool and everything it forks; it is written to a pidfile in the container
+STEP_PIDFILE = "/tmp/gbt-step-{}.pid"
+STEP_WRAPPER = 'echo $$ > {pidfile}; "$@"; status=$?; rm -f {pidfile}; exit $status'
+STEP_KILL = 'pid=$(cat {pidfile} 2>/dev/null) && kill -s {signal} -- "-$pid"; [ {signal} = KILL ] && rm -f {pidfile}; true'
+
+
+def _user():
+    return f"{os.getuid()}:{os.getgid()}"
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reap_stale_containers():
+    """Remove docker-exec containers left by sessions of this host whose process is gone (killed, crashed)."""
+    try:
+        listing = subprocess.run(["docker", "ps", "-a", "--filter", f"label={CONTAINER_LABEL}",
+                                  "--format", f'{{{{.Names}}}} {{{{.Label "{OWNER_LABEL}"}}}}'],
+                                 capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    stale = []
+    for line in listing.splitlines():
+        name, _, owner = line.partition(" ")
+        host, _, pid = owner.rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            continue  # another machine's container, or not ours to judge
+        try:
+            os.kill(int(pid), 0)
+            continue  # its session is still running
+        except ProcessLookupError:
+            stale.append(name)
+        except PermissionError:
+            continue
+    if stale:
+        subprocess.run(["docker", "rm", "-f"] + stale, capture_output=True)
+        logger.info(f"🧹 Removed {len(stale)} container(s) left by earlier sessions: {', '.join(stale)}")
+    return stale
+
+
+class ComposeRunExecutor:
+    """A fresh `docker compose run --rm` container for every step (the original behaviour)."""
+
+    name = "compose-run"
+
+    def command(self, service, argv, step_name=""):
+        # named, so the step's container (and its cgroup) can be found for resource profiling
+        name = f"gbt-{service}-{uuid.uuid4().hex[:8]}"
+        return DOCKER_COMPOSE_PREFIX + ["run", "--rm", "--name", name, "--user", _user(), service] + list(argv)
+
+    def terminate(self, full_cmd, signal="TERM"):
+        """Signal the step's container: killing the `docker compose run` client does not stop it.  Returns True."""
+        subprocess.run(["docker", "kill", "--signal", signal, full_cmd[full_cmd.index("--name") + 1]],
+                       capture_output=True)
+        return True
+
+    def close(self):
+        pass
+
+
+class DockerExecExecutor:
+    """
+    One detached container per service, started on first use and kept for the session.
+
+    Containers are started with `docker compose run -d` so they get the same volumes,
+    environment and working directory as compose-run; steps then go through `docker exec`.
+    Killing a `docker exec` client leaves the tool running in the container, so every step
+    runs under setsid with a pidfile, and terminate() signals its process group in there.
+    Containers are labelled with their owner, and the ones of dead sessions are removed
+    when a new executor starts.
+    """
+
+    name = "docker-exec"
+
+    def __init__(self):
+        self.containers = {}
+        self.startup = {}
+        self.lock = threading.Lock()
+        reap_stale_containers()
+
+    def container(self, service):
+        with self.lock:
+            return self._start(service)
+
+    def _start(self, service):
+        if service not in self.containers:
+            name = f"gbt-{service}-{uuid.uuid4().hex[:8]}"
+            start_time = time.time()
+            subprocess.run(DOCKER_COMPOSE_PREFIX + [
+                "run", "-d", "--rm", "--name", name, "--user", _user(),
+                "--label", CONTAINER_LABEL, "--label", f"{OWNER_LABEL}={_owner()}", service,
+                "sleep", "infinity"
+            ], check=True, capture_output=True)
+            self.startup[service] = time.time() - start_time
+            self.containers[service] = name
+            logger.info(f"🐳 Started {service} container {name} in {self.startup[service]:.1f} sec")
+        return self.containers[service]
+
+    def command(self, service, argv, step_name=""):
+        pidfile = STEP_PIDFILE.format(uuid.uuid4().hex[:12])
+        return ["docker", "exec", "--user", _user(), self.container(service),
+                "setsid", "-w", "sh", "-c", STEP_WRAPPER.format(pidfile=pidfile), "gbt-step"] + list(argv)
+
+    def terminate(self, full_cmd, signal="TERM"):
+        """Signal the step's process group inside its container (from the pidfile in the command).  Returns True."""
+        container = full_cmd[full_cmd.index("setsid") - 1]
+        pidfile = re.search(r"/tmp/gbt-step-\w+\.pid", full_cmd[full_cmd.index("setsid") + 4]).group(0)
+        subprocess.run(["docker", "exec", "--user", _user(), container,
+                        "sh", "-c", STEP_KILL.format(pidfile=pidfile, signal=signal)], capture_output=True)
+        return True
+
+    def close(self):
+        for service, name in self.containers.items():
+            subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+            logger.info(f"🐳 Removed {service} container {name}")
+        self.containers = {}
+
+
+class LocalExecutor:
+    """Run the tool on the host; the service name is dropped."""
+
+    name = "local"
+
+    def command(self, service, argv, step_name=""):
+        return list(argv)
+
+    def terminate(self, full_cmd, signal="TERM"):
+        return False  # the tool is the caller's own child process
+
+    def close(self):
+        pass
+
+
+class QueueExecutor:
+    """
+    Hand every step to a `queue-worker` through the shared queue folder (see work_queue).
+
+    The host command is a small client that queues the step, streams its output and exits
+    with its exit code; GBT_QUEUE_DIR and GBT_QUEUE_RETRIES are passed on to it, and the step
+    name is shown in the queue, its history and the worker log.
+    """
+
+    name = "queue"
+
+    def command(self, service, argv, step_name=""):
+        cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+        return [sys.executable, cli, "queue-submit", "--service", service, "--step-name", step_name,
+                "--retries", os.environ.get("GBT_QUEUE_RETRIES", "1"), "--"] + list(argv)
+
+    def terminate(self, full_cmd, signal="TERM"):
+        return False  # the client cancels its job when signalled; the worker stops the tool
+
+    def close(self):
+        pass
+
+
+EXECUTORS = {
+    ComposeRunExecutor.name: ComposeRunExecutor,
+    DockerExecExecutor.name: DockerExecExecutor,
+    LocalExecutor.name: LocalExecutor,
+    QueueExecutor.name: QueueExecutor,
+}
+
+_current = None
+
+
+def create_executor(name=None):
+    name = name or os.environ.get("GBT_EXECUTOR", DockerExecExecutor.name)
+    if name not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{name}' (expected one of: {', '.join(EXECUTORS)})")
+    return EXECUTORS[name]()
+
+
+def get_executor():
+    """The executor of the active pipeline_session, or a compose-run executor outside of one."""
+    return _current or ComposeRunExecutor()
+
+
+@contextmanager
+def pipeline_session(name=None):
+    """Share one executor (and so its containers) across all steps run inside the block."""
+    global _current
+    if _current is not None:
+        # nested pipelines reuse the outer session
+        yield _current
+        return
+    _current = create_executor(name)
+    try:
+        yield _current
+    finally:
+        _current.close()
+        _current = None
+
+
+def in_pipeline_session(func):
+    """Decorator: run a pipeline entry point inside a pipeline_session."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pipeline_session():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def measure_step_overhead(executor, service, argv, steps=5):
+    """Wall time of each of `steps` runs of a trivial argv through executor (container start-up included)."""
+    durations = []
+    try:
+        for _ in range(steps):
+            start_time = time.time()
+            subprocess.run(executor.command(service, argv), check=True, capture_output=True)
+            durations.append(time.time() - start_time)
+    finally:
+        executor.close()
+    return durations
@@ -0,0 +1,284 @@
+"""
+EXIF tagging engine for extracted frames.
+
+exiftool is slow to start, so tagging goes through one long-running
+`exiftool -stay_open True -@ -` process per shard, fed in chunks.  For frames that
+are encoded in Python the tags can be embedded at write time instead (APP1 for JPG,
+eXIf chunk for PNG), so the file is written exactly once.
+"""
+
+import os
+import struct
+import subprocess
+import threading
+import zlib
+
+DJI_FOCAL_LENGTHS = {
+    "DJI FC3682": {
+        "FocalLength": 4.5,  # in mm
+        "FocalLengthIn35mmFormat": 24
+    },
+    # You can add more models here in future.
+}
+
+
+def normalize_camera_model(camera_model):
+    """Return (make, model, focal_data) for a camera model like 'FC3682' or 'DJI FC3682'."""
+    if not camera_model.startswith("DJI "):
+        camera_model = "DJI " + camera_model
+
+    focal_data = DJI_FOCAL_LENGTHS.get(camera_model)
+
+    if ' ' in camera_model:
+        make, model = camera_model.split(' ', 1)
+    else:
+        # Fallback if no space (just in case)
+        make = "Unknown"
+        model = camera_model
+    return make, model, focal_data
+
+
+def exiftool_tag_args(camera_model):
+    """exiftool arguments that write Make, Model and focal length tags for camera_model."""
+    make, model, focal_data = normalize_camera_model(camera_model)
+    if not focal_data:
+        print(f"Warning: No known focal length for model {make} {model}. Will skip FocalLength tags.")
+        focal_tags = []
+    else:
+        focal_tags = [
+            f"-FocalLength={focal_data['FocalLength']}",
+            f"-FocalLengthIn35mmFormat={focal_data['FocalLengthIn35mmFormat']}"
+        ]
+    return [f"-Model={model}", f"-Make={make}", *focal_tags]
+
+
+class ExifToolSession:
+    """A persistent `exiftool -stay_open` process.  Use as a context manager."""
+
+    READY = "{ready}"
+    # printed by -echo3 after each command; ${status} is exiftool's exit status for it
+    STATUS = "{status "
+
+    def __init__(self, executable="exiftool"):
+        self.executable = executable
+        self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            bufsize=1
+        )
+
+    def execute(self, *args):
+        """Run one exiftool command in the session and return its output; raises RuntimeError when it fails."""
+        if self.process is None:
+            raise RuntimeError("exiftool session is not running")
+        # one argument per line, then -execute to run the queued command
+        self.process.stdin.write("\n".join(["-charset", "filename=utf8", *map(str, args),
+                                            "-echo3", self.STATUS + "${status}}", "-execute"]) + "\n")
+        self.process.stdin.flush()
+
+        lines, status = [], None
+        for line in self.process.stdout:
+            if line.rstrip() == self.READY:
+                break
+            if line.startswith(self.STATUS):
+                value = line.strip()[len(self.STATUS):-1]
+                status = int(value) if value.isdigit() else None  # older exiftool prints ${status} as is
+                continue
+            lines.append(line)
+        else:
+            raise RuntimeError(f"exiftool exited unexpectedly (code {self.process.wait()})")
+
+        # stderr is merged into stdout: "Error: ..." lines, and "N files weren't updated due to errors"
+        errors = [line.strip() for line in lines if line.startswith("Error") or "weren't updated due to errors" in line]
+        if status or errors:
+            raise RuntimeError(f"exiftool failed (status {status}): " + "; ".join(errors[:5]))
+        return "".join(lines)
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write("-stay_open\nFalse\n")
+            self.process.stdin.flush()
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.process = None
+
+
+def get_camera_model(video_path, session=None):
+    """Extract 'Model' from a video, reusing an open exiftool session when given."""
+    if session is None:
+        with ExifToolSession() as session:
+            return get_camera_model(video_path, session)
+    model = session.execute("-Model", "-s3", video_path).strip()
+    return model or None
+
+
+def tag_images_batched(file_list, camera_model, chunk_size=500, shards=1):
+    """
+    Tag files with camera EXIF tags using persistent exiftool sessions.
+
+    Files are split round-robin into `shards`, each served by its own exiftool process,
+    and sent in chunks of `chunk_size` so no command line ever approaches ARG_MAX.
+    """
+    file_list = [str(p) for p in file_list]
+    if not file_list:
+        return
+
+    tag_args = exiftool_tag_args(camera_model)
+    shards = max(1, min(shards, len(file_list)))
+    errors = []
+
+    def run_shard(shard_files):
+        try:
+            with ExifToolSession() as session:
+                for i in range(0, len(shard_files), chunk_size):
+                    session.execute(*tag_args, "-overwrite_original", *shard_files[i:i + chunk_size])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_shard, args=(file_list[i::shards],)) for i in range(shards)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+
+
+# --- Write-time embedding --------------------------------------------------
+
+_TIFF_ASCII, _TIFF_SHORT, _TIFF_LONG, _TIFF_RATIONAL = 2, 3, 4, 5
+
+
+def _tiff_ifd(entries, ifd_offset, next_ifd=0):
+    """Pack one little-endian IFD placed at ifd_offset. Returns (ifd_bytes, data_bytes)."""
+    entries = sorted(entries)
+    data_offset = ifd_offset + 2 + 12 * len(entries) + 4
+    ifd = struct.pack("<H", len(entries))
+    data = b""
+    for tag, type_, count, payload in entries:
+        if len(payload) <= 4:
+            value = payload.ljust(4, b"\0")
+        else:
+            value = struct.pack("<I", data_offset + len(data))
+            data += payload + (b"\0" if len(payload) % 2 else b"")
+        ifd += struct.pack("<HHI", tag, type_, count) + value
+    ifd += struct.pack("<I", next_ifd)
+    return ifd, data
+
+
+def build_exif_blob(camera_model):
+    """Raw TIFF/EXIF block with Make, Model and (when known) focal length tags."""
+    make, model, focal_data = normalize_camera_model(camera_model)
+
+    def ascii_(text):
+        raw = text.encode("ascii", errors="replace") + b"\0"
+        return (_TIFF_ASCII, len(raw), raw)
+
+    exif_entries = []
+    if focal_data:
+        numerator = int(round(focal_data["FocalLength"] * 100))
+        exif_entries = [
+            (0x920A, _TIFF_RATIONAL, 1, struct.pack("<II", numerator, 100)),
+            (0xA405, _TIFF_SHORT, 1, struct.pack("<H", focal_data["FocalLengthIn35mmFormat"])),
+        ]
+
+    ifd0_entries = [(0x010F, *ascii_(make)), (0x0110, *ascii_(model))]
+    if exif_entries:
+        ifd0_entries.append((0x8769, _TIFF_LONG, 1, b"\0\0\0\0"))  # patched below
+
+    header = b"II*\0" + struct.pack("<I", 8)
+    ifd0, ifd0_data = _tiff_ifd(ifd0_entries, 8)
+    if not exif_entries:
+        return header + ifd0 + ifd0_data
+
+    exif_offset = 8 + len(ifd0) + len(ifd0_data)
+    ifd0_entries[-1] = (0x8769, _TIFF_LONG, 1, struct.pack("<I", exif_offset))
+    ifd0, ifd0_data = _tiff_ifd(ifd0_entries, 8)
+    exif_ifd, exif_data = _tiff_ifd(exif_entries, exif_offset)
+    return header + ifd0 + ifd0_data + exif_ifd + exif_data
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def embed_exif(encoded, format, exif_blob):
+    """Insert an EXIF block into encoded PNG/JPG bytes (as returned by cv2.imencode)."""
+    encoded = bytes(encoded)
+    if format == "png":
+        # 8 byte signature + IHDR chunk (4 len + 4 type + 13 data + 4 crc)
+        split = 8 + 25
+        return encoded[:split] + _png_chunk(b"eXIf", exif_blob) + encoded[split:]
+    if format in ("jpg", "jpeg"):
+        payload = b"Exif\0\0" + exif_blob
+        app1 = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+        split = 2
+        # keep a leading JFIF APP0 segment first, as exiftool does
+        if encoded[2:4] == b"\xff\xe0":
+            split = 4 + struct.unpack(">H", encoded[4:6])[0]
+        return encoded[:split] + app1 + encoded[split:]
+    raise ValueError(f"Unsupported format for EXIF embedding: {format}")
+
+
+def extract_exif(encoded, format):
+    """Return the raw EXIF block from PNG/JPG bytes, or None when there is none."""
+    encoded = bytes(encoded)
+    if format == "png":
+        pos = 8
+        while pos + 8 <= len(encoded):
+            length, chunk_type = struct.unpack(">I4s", encoded[pos:pos + 8])
+            if chunk_type == b"eXIf":
+                return encoded[pos + 8:pos + 8 + length]
+            if chunk_type == b"IDAT":
+                return None
+            pos += 12 + length
+        return None
+    if format in ("jpg", "jpeg"):
+        pos = 2
+        while pos + 4 <= len(encoded) and encoded[pos] == 0xFF:
+            marker = encoded[pos + 1]
+            if marker == 0xDA:  # start of scan
+                return None
+            length = struct.unpack(">H", encoded[pos + 2:pos + 4])[0]
+            segment = encoded[pos + 4:pos + 2 + length]
+            if marker == 0xE1 and segment.startswith(b"Exif\0\0"):
+                return segment[6:]
+            pos += 2 + length
+        return None
+    raise ValueError(f"Unsupported format for EXIF extraction: {format}")
+
+
+def write_image_with_exif(path, image, format, exif_blob=None, quality=95):
+    """Encode an image with OpenCV and write it once, with EXIF embedded when given."""
+    import cv2
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if format in ("jpg", "jpeg") else []
+    ok, encoded = cv2.imencode(f".{format}", image, params)
+    if not ok:
+        raise RuntimeError(f"Failed to encode {path}")
+    data = embed_exif(encoded, format, exif_blob) if exif_blob else encoded.tobytes()
+    # write beside the target and rename, so a hardlinked target (e.g. from the frame cache)
+    # is replaced rather than overwritten in place
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
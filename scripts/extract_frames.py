@@ -1,83 +1,53 @@
 
 import os
+import json
 import subprocess
 from pathlib import Path
 import glob
+import shutil
 import concurrent.futures
 import time
 
 
-DJI_FOCAL_LENGTHS = {
-    "DJI FC3682": {
-        "FocalLength": 4.5,  # in mm
-        "FocalLengthIn35mmFormat": 24
-    },
-    # You can add more models here in future.
-}
+from scripts.exif_tagger import DJI_FOCAL_LENGTHS, get_camera_model, tag_images_batched
 
-def get_camera_model_from_mp4(video_path):
+
+def get_camera_model_from_mp4(video_path, session=None):
     """Extract 'Model' from MP4 using exiftool"""
     try:
-        result = subprocess.run(
-            ["exiftool", "-Model", "-s3", video_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        model = result.stdout.strip()
+        model = get_camera_model(video_path, session)
         if not model:
             print(f"Warning: No Model tag found in {video_path}")
             return "Unknown"
         print(f"Camera Model: {model}")
         return model
-    except subprocess.CalledProcessError as e:
+    except (OSError, RuntimeError) as e:
         print(f"Error extracting Model from {video_path}: {e}")
         return "Unknown"
 
-def add_camera_model_to_images(file_list, camera_model):
+def add_camera_model_to_images(file_list, camera_model, chunk_size=500, shards=1):
     """Write EXIF tags (Model, CameraModelName, FocalLength) to specific files only."""
     if not file_list:
         print("No images to tag.")
         return
 
-    # Normalize camera_model to "DJI FCxxxx" format if needed
-    if not camera_model.startswith("DJI "):
-        camera_model = "DJI " + camera_model
+    print(f"Tagging {len(file_list)} images with Model={camera_model} ({shards} exiftool session(s))")
+    tag_images_batched(file_list, camera_model, chunk_size=chunk_size, shards=shards)
 
-    # Lookup focal length data
-    focal_data = DJI_FOCAL_LENGTHS.get(camera_model)
-    if not focal_data:
-        print(f"Warning: No known focal length for model {camera_model}. Will skip FocalLength tags.")
-        focal_tags = []
-    else:
-        focal_tags = [
-            f"-FocalLength={focal_data['FocalLength']}",
-            f"-FocalLengthIn35mmFormat={focal_data['FocalLengthIn35mmFormat']}"
-        ]
 
-    if ' ' in camera_model:
-        make, model = camera_model.split(' ', 1)
-    else:
-        # Fallback if no space (just in case)
-        make = "Unknown"
-        model = camera_model
-    
-    # Build exiftool command
-    cmd = [
-        "exiftool",
-        f"-Model={model}",
-        f"-Make={make}",
-        *focal_tags,
-        "-overwrite_original",
-        *file_list
-    ]
-    print(f"Tagging {len(file_list)} images with Model={camera_model}")
-    subprocess.run(cmd, check=True)
+
+def scale_filter(max_width):
+    """ffmpeg scale filter capping the long side of a frame at max_width."""
+    return f"scale='if(gt(iw,ih),min({max_width},iw),-2)':'if(gt(ih,iw),min({max_width},ih),-2)'"
 
 
+def frame_filter_chain(fps, max_width):
+    """ffmpeg filter chain used for every extraction: sample at fps, then cap the long side at max_width."""
+    return f"fps={fps},format=yuv420p,{scale_filter(max_width)}"
+
 
 def extract_frames_from_file(video_path, output_dir, fps=1.0, skip_seconds = 5, threads=8, quality=2, capture_seconds=None, 
-                             format="jpg",tag="tag",max_width=1600):
+                             format="jpg",tag="tag",max_width=1600,tag_shards=1):
     os.makedirs(output_dir, exist_ok=True)
     """ extract frames from file """
     
@@ -108,7 +78,7 @@ def extract_frames_from_file(video_path, output_dir, fps=1.0, skip_seconds = 5,
     else:
         pass
 
-    cmd.extend(["-vf", f"fps={fps},format=yuv420p,scale='if(gt(iw,ih),min({max_width},iw),-2)':'if(gt(ih,iw),min({max_width},ih),-2)'" ])
+    cmd.extend(["-vf", frame_filter_chain(fps, max_width) ])
                       
     cmd.append( output_template )
     
@@ -123,7 +93,300 @@ def extract_frames_from_file(video_path, output_dir, fps=1.0, skip_seconds = 5,
 
     # Step 4: Get camera model and tag only the new files
     camera_model = get_camera_model_from_mp4(video_path)
-    add_camera_model_to_images([str(p) for p in new_files], camera_model)
+    add_camera_model_to_images([str(p) for p in new_files], camera_model, shards=tag_shards)
+
+
+def segment_ranges(frame_count, segments):
+    """Split output frame numbers [0, frame_count) into `segments` contiguous (start, end) ranges."""
+    segments = max(1, min(segments, frame_count))
+    bounds = [frame_count * i // segments for i in range(segments + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(segments)]
+
+
+def extract_frames_segmented(video_path, output_dir, fps=1.0, skip_seconds=5, threads=8, quality=2, capture_seconds=None,
+                             format="jpg", tag="tag", max_width=1600, tag_shards=1, segments=4, hwaccel=None):
+    """
+    Extract the same frames as extract_frames_from_file with `segments` ffmpeg processes in parallel.
+
+    Segments are cut on the output fps grid: the segment holding frames [a, b) seeks to
+    skip + a/fps (accurate seek: decode from the previous keyframe, drop up to the target),
+    writes exactly b - a frames and numbers them from a + 1, so the merged sequence has no
+    duplicate or missing timestamps at the boundaries.  The last segment runs to the end of
+    the clip.  The thread budget is split across segments.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+
+    duration = max(0.0, probe_video(video_path)["duration"] - float(skip_seconds))
+    if capture_seconds:
+        duration = min(duration, float(capture_seconds))
+    fps_value = float(fps)
+    frame_count = max(1, int(duration * fps_value))
+    ranges = segment_ranges(frame_count, segments)
+    segment_threads = max(1, threads // len(ranges))
+
+    def segment_cmd(index, first, last):
+        offset = first / fps_value
+        cmd = ["ffmpeg", "-v", "error", "-threads", str(segment_threads)]
+        if hwaccel:
+            cmd.extend(["-hwaccel", hwaccel])
+        if capture_seconds:
+            cmd.extend(["-t", str(float(capture_seconds) - offset)])
+        cmd.extend(["-ss", f"{float(skip_seconds) + offset:.6f}", "-i", video_path])
+        if format == "jpg":
+            cmd.extend(["-q:v", str(quality)])
+        cmd.extend(["-vf", frame_filter_chain(fps, max_width)])
+        if index < len(ranges) - 1:
+            cmd.extend(["-frames:v", str(last - first)])
+        cmd.extend(["-start_number", str(first + 1), os.path.join(output_dir, f"{tag}_%05d.{format}")])
+        return cmd
+
+    commands = [segment_cmd(i, first, last) for i, (first, last) in enumerate(ranges)]
+    for cmd in commands:
+        print(f"Running: {' '.join(cmd)}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        for _ in executor.map(lambda cmd: subprocess.run(cmd, check=True), commands):
+            pass
+
+    # The merged sequence must be 1..N without gaps
+    new_files = sorted(Path(output_dir).glob(f"{tag}_*.{format}"))
+    numbers = sorted(int(p.stem.rsplit("_", 1)[1]) for p in new_files)
+    gaps = sorted(set(range(1, numbers[-1] + 1)) - set(numbers)) if numbers else []
+    if gaps:
+        raise RuntimeError(f"Segmented extraction left {len(gaps)} missing frame(s) in {output_dir}, first: {gaps[0]}")
+
+    camera_model = get_camera_model_from_mp4(video_path)
+    add_camera_model_to_images([str(p) for p in new_files], camera_model, shards=tag_shards)
+
+    elapsed_time = time.time() - start_time
+    print(f"⏱️ Extracted {len(new_files)} frames in {len(ranges)} segments: {elapsed_time:.2f} seconds "
+          f"({len(new_files) / max(elapsed_time, 1e-9):.1f} frames/sec)")
+
+
+def probe_video(video_path):
+    """Return frame_rate (fps) and duration (seconds) of the first video stream using ffprobe."""
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=avg_frame_rate:format=duration",
+        "-of", "json",
+        video_path
+    ], capture_output=True, text=True, check=True)
+    info = json.loads(result.stdout)
+    num, den = info["streams"][0]["avg_frame_rate"].split("/")
+    return {
+        "frame_rate": float(num) / float(den) if float(den) else 0.0,
+        "duration": float(info["format"]["duration"]),
+    }
+
+
+def probe_frame_shape(video_path, fps, max_width, skip_seconds=0, vf=None):
+    """Decode a single frame through the extraction filter chain (or vf) and return its (h, w, 3) shape."""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-ss", str(skip_seconds),
+        "-i", video_path,
+        "-frames:v", "1",
+        "-vf", vf or frame_filter_chain(fps, max_width),
+        "-pix_fmt", "bgr24", "-f", "image2pipe", "-vcodec", "bmp", "-"
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    # BMP header: width/height are little-endian int32 at offsets 18/22 (height negative = top-down)
+    width = int.from_bytes(result.stdout[18:22], "little", signed=True)
+    height = abs(int.from_bytes(result.stdout[22:26], "little", signed=True))
+    return (height, width, 3)
+
+
+def _read_exact(stream, buffer):
+    """Fill buffer from stream; returns bytes read (short only at EOF)."""
+    total = 0
+    size = len(buffer)
+    while total < size:
+        n = stream.readinto(buffer[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def extract_frames_streaming(video_path, output_dir, fps=1.0, skip_seconds=5, threads=8, quality=95, capture_seconds=None,
+                             format="png", tag="tag", max_width=1600, filter="none", workers=4, queue_depth=16):
+    """
+    Extract, filter and EXIF-tag frames in one pass, writing every output file exactly once.
+
+    ffmpeg writes raw BGR frames to stdout; each frame is read straight into a slot of a shared
+    memory pool and a worker process filters, encodes and writes it with EXIF embedded.  Only
+    `queue_depth` frames are ever in memory: when all slots are busy, reading (and so ffmpeg) waits.
+    """
+    import queue
+    from concurrent.futures import ProcessPoolExecutor
+    from scripts.exif_tagger import build_exif_blob
+    from scripts.image_filters import FILTER_PRESETS, SharedFramePool, init_shared_worker, filter_shared_slot
+
+    if filter not in FILTER_PRESETS:
+        raise ValueError(f"Unknown filter type '{filter}'")
+    filter_options = FILTER_PRESETS[filter]
+
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+
+    shape = probe_frame_shape(video_path, fps, max_width, skip_seconds)
+    exif_blob = build_exif_blob(get_camera_model_from_mp4(video_path))
+
+    cmd = [
+        "ffmpeg",
+        "-v", "error",
+        "-threads", str(threads),
+        ]
+    if capture_seconds:
+        cmd.extend(["-t", str(capture_seconds)])
+    cmd.extend([
+        "-ss", str(skip_seconds),
+        "-i", video_path,
+        "-vf", frame_filter_chain(fps, max_width),
+        "-pix_fmt", "bgr24", "-f", "rawvideo", "-"
+    ])
+
+    print(f"Running: {' '.join(cmd)}")
+    print(f"Streaming {shape[1]}x{shape[0]} frames → {output_dir} (filter={filter}, {workers} workers, queue depth {queue_depth})")
+
+    pool = SharedFramePool(queue_depth, shape)
+    free_slots = queue.Queue()
+    for slot in range(queue_depth):
+        free_slots.put(slot)
+
+    futures = []
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_shared_worker,
+                                 initargs=(pool.name, queue_depth, shape)) as executor:
+            frame_number = 0
+            while True:
+                slot = free_slots.get()
+                n = _read_exact(process.stdout, pool.buffer(slot))
+                if n < pool.frame_bytes:
+                    if n:
+                        print(f"Warning: discarding truncated final frame ({n} of {pool.frame_bytes} bytes)")
+                    break
+                frame_number += 1
+                output_path = os.path.join(output_dir, f"{tag}_{frame_number:05d}.{format}")
+                future = executor.submit(filter_shared_slot, slot, output_path, format, filter_options, exif_blob, quality)
+                future.add_done_callback(lambda f, slot=slot: free_slots.put(slot))
+                futures.append(future)
+
+            for future in futures:
+                future.result()
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        pool.close()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+    elapsed_time = time.time() - start_time
+    print(f"⏱️ Streamed {len(futures)} frames in {elapsed_time:.2f} seconds ({len(futures) / max(elapsed_time, 1e-9):.1f} frames/sec)")
+
+
+def parse_variant(variant):
+    """ Parse a base root like 'png_1.00_1600_none' (filter optional) into its parts """
+    parts = variant.split("_")
+    if len(parts) not in (3, 4):
+        raise ValueError(f"Variant '{variant}' is not in expected format: format_fps_width[_filter]")
+    format, fps, max_width = parts[:3]
+    filter = parts[3] if len(parts) == 4 else "none"
+    return dict(format=format, fps=fps, max_width=max_width, filter=filter)
+
+
+def group_variants(variants):
+    """
+    Variants that differ only by filter decode and scale to the same frames: group them by
+    (format, fps, max_width), unfiltered variant first.  Returns a list of groups.
+    """
+    groups = {}
+    for variant in variants:
+        groups.setdefault((variant["format"], variant["fps"], variant["max_width"]), []).append(variant)
+    return [sorted(group, key=lambda v: v.get("filter", "none") != "none") for group in groups.values()]
+
+
+def copy_variant_frames(source, target):
+    """Copy the frames of one variant into another variant's folder, renamed to its tag."""
+    os.makedirs(target["output_dir"], exist_ok=True)
+    prefix = f"{source['tag']}_"
+    for path in sorted(Path(source["output_dir"]).glob(f"{prefix}*.{source['format']}")):
+        # a real copy, not a hardlink: the filters rewrite the target frames in place
+        shutil.copy2(path, Path(target["output_dir"]) / f"{target['tag']}_{path.name[len(prefix):]}")
+
+
+DEFAULT_MAX_OUTPUTS_PER_PASS = 8
+
+
+def extract_frames_batch_from_file(video_path, variants, skip_seconds=5, threads=8, quality=2, capture_seconds=None,
+                                   max_outputs_per_pass=DEFAULT_MAX_OUTPUTS_PER_PASS):
+    """
+    Extract several (format, fps, max_width) variants of a video from a single decode pass.
+
+    `variants` is a list of dicts with keys output_dir, tag, format, fps and max_width (and
+    optionally filter).  Variants differing only by filter are extracted once and copied, so
+    the filters are applied to copies of the same frames.  The decoded stream is fanned out
+    with ffmpeg's split filter so every variant sees exactly the frames the single-variant
+    extract_frames_from_file would have produced.  Outputs are grouped into passes of at most
+    `max_outputs_per_pass` to bound filter-graph memory (None = one pass).
+    """
+    if not variants:
+        print("No variants to extract.")
+        return
+
+    groups = group_variants(variants)
+    extracted = [group[0] for group in groups]
+    step = max_outputs_per_pass or len(extracted)
+    batches = [extracted[i:i + step] for i in range(0, len(extracted), step)]
+
+    start_time = time.time()
+
+    for batch in batches:
+        cmd = [
+            "ffmpeg",
+            "-threads", str(threads),
+            ]
+        if capture_seconds:
+            cmd.extend(["-t", str(capture_seconds)])
+
+        cmd.extend([
+            "-ss", str(skip_seconds),
+            "-i", video_path ])
+
+        # [0:v] split=N [s0][s1]... ; [s0] fps,scale [o0] ; ...
+        labels = [f"s{i}" for i in range(len(batch))]
+        graph = [f"[0:v]split={len(batch)}" + "".join(f"[{label}]" for label in labels)]
+        for i, variant in enumerate(batch):
+            graph.append(f"[s{i}]{frame_filter_chain(variant['fps'], variant['max_width'])}[o{i}]")
+        cmd.extend(["-filter_complex", ";".join(graph)])
+
+        for i, variant in enumerate(batch):
+            os.makedirs(variant["output_dir"], exist_ok=True)
+            cmd.extend(["-map", f"[o{i}]"])
+            if variant["format"] == "jpg":
+                cmd.extend(["-q:v", str(quality)])
+            cmd.append(os.path.join(variant["output_dir"], f"{variant['tag']}_%05d.{variant['format']}"))
+
+        print(f"Running: {' '.join(cmd)}")
+        subprocess.run(cmd, check=True)
+
+    # Tag every extracted variant from a single camera-model lookup, then copy to the filter variants
+    camera_model = get_camera_model_from_mp4(video_path)
+    for variant in extracted:
+        new_files = Path(variant["output_dir"]).glob(f"{variant['tag']}_*.{variant['format']}")
+        add_camera_model_to_images([str(p) for p in new_files], camera_model)
+    for source, *others in groups:
+        for variant in others:
+            copy_variant_frames(source, variant)
+
+    elapsed_time = time.time() - start_time
+    print(f"⏱️ Extracted {len(variants)} variants ({len(extracted)} decoded) in {len(batches)} decode pass(es): "
+          f"{elapsed_time:.2f} seconds")
+
 
 def extract_frames_from_folder(video_dir, output_dir, fps):
     video_dir = Path(video_dir)
@@ -0,0 +1,296 @@
+"""
+Content-addressed store for extracted frames.
+
+Frames are keyed by (video checksum, timestamp, format, width, filter):
+
+    <cache_dir>/<video sha256>/<format>_<width>_<filter>[_q<quality>]/t<milliseconds>.<format>
+
+Frame n of an extraction with `-ss skip` and `fps=F` sits at skip + n/F, so every
+fps that shares a timestamp grid (1.00 within 2.00, 0.50 within 1.00, ...) shares frames.
+Project image folders are populated from the store with hardlinks (see utils.link_or_copy)
+and ffmpeg only decodes the timestamps that are not in the store yet.  Filtered variants
+are derived from the cached unfiltered frames with the in-process filter engine.
+
+Everything in a project folder is replaced (never modified in place) by the pipeline's
+writers, so a hardlink never lets a later step change a cached frame.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from scripts.extract_frames import add_camera_model_to_images, frame_filter_chain, get_camera_model_from_mp4, probe_video
+from scripts.utils import link_or_copy
+
+DEFAULT_CACHE_DIR = "projects/.frame-cache"
+# missing frames closer than this (seconds) are decoded in one pass instead of seeking again
+MAX_DECODE_GAP = 5.0
+# a decoded frame must sit this close (seconds) to its slot on the skip + n/fps grid
+TIMESTAMP_TOLERANCE = 0.002
+SHOWINFO_PTS_TIME = re.compile(r"\] n:\s*\d+ pts:\s*-?\d+\s+pts_time:(-?[\d.]+)")
+
+
+def _load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def video_checksum(video_path, cache_dir=DEFAULT_CACHE_DIR, block_size=16 * 1024 * 1024):
+    """sha256 of a video, memoized in <cache_dir>/videos.json by path, size and mtime."""
+    os.makedirs(cache_dir, exist_ok=True)
+    memo_path = os.path.join(cache_dir, "videos.json")
+    memo = _load_json(memo_path, {})
+
+    stat = os.stat(video_path)
+    key = os.path.abspath(video_path)
+    entry = memo.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return entry["sha256"]
+
+    start_time = time.time()
+    digest = hashlib.sha256()
+    with open(video_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    print(f"⏱️ Hashed {video_path} in {time.time() - start_time:.2f} seconds")
+
+    memo = _load_json(memo_path, {})
+    memo[key] = dict(size=stat.st_size, mtime=stat.st_mtime, sha256=digest.hexdigest())
+    _write_json(memo_path, memo)
+    return digest.hexdigest()
+
+
+def frame_timestamp_ms(skip_seconds, fps, n):
+    """Timestamp (integer ms into the video) of output frame n for -ss skip and fps=F."""
+    return int(round((float(skip_seconds) + n / float(fps)) * 1000))
+
+
+def _runs(numbers):
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    runs = []
+    for n in numbers:
+        if runs and n == runs[-1][1] + 1:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return [tuple(r) for r in runs]
+
+
+class FrameCache:
+    """One video's frames in the store."""
+
+    def __init__(self, video_path, cache_dir=DEFAULT_CACHE_DIR):
+        self.video_path = str(video_path)
+        self.checksum = video_checksum(self.video_path, cache_dir)
+        self.root = Path(cache_dir) / self.checksum
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.json"
+
+    def variant_dir(self, format, max_width, filter="none", quality=2):
+        name = f"{format}_{max_width}_{filter}"
+        if format == "jpg":
+            name += f"_q{quality}"
+        path = self.root / name
+        path.mkdir(exist_ok=True)
+        return path
+
+    def frame_path(self, variant_dir, ms, format):
+        return Path(variant_dir) / f"t{ms:09d}.{format}"
+
+    # The number of frames an extent (skip, fps, capture) yields is only known exactly
+    # after ffmpeg has produced it once, so it is recorded here.
+    def _extent_key(self, skip_seconds, fps, capture_seconds):
+        return f"{float(skip_seconds):g}|{float(fps):g}|{capture_seconds or ''}"
+
+    def extent_count(self, skip_seconds, fps, capture_seconds):
+        index = _load_json(self.index_path, {})
+        return index.get("extents", {}).get(self._extent_key(skip_seconds, fps, capture_seconds))
+
+    def record_extent(self, skip_seconds, fps, capture_seconds, count):
+        index = _load_json(self.index_path, {})
+        index.setdefault("extents", {})[self._extent_key(skip_seconds, fps, capture_seconds)] = count
+        index["video"] = self.video_path
+        _write_json(self.index_path, index)
+
+    def estimate_count(self, skip_seconds, fps, capture_seconds):
+        """Upper bound on the frames an extent can yield (the fps filter may emit one extra)."""
+        duration = max(0.0, probe_video(self.video_path)["duration"] - float(skip_seconds))
+        if capture_seconds:
+            duration = min(duration, float(capture_seconds))
+        return int(math.ceil(duration * float(fps))) + 1
+
+    def extract_missing(self, variant_dir, missing, skip_seconds, fps, capture_seconds, threads, quality, format,
+                        max_width):
+        """
+        Decode only frame numbers `missing` (sorted) of the extent into variant_dir.
+
+        Missing runs closer than MAX_DECODE_GAP seconds are decoded by one ffmpeg call that
+        seeks to the group's first frame, so sparse gaps cost a seek each instead of decoding
+        everything up to the end of the extent.  Timestamps are kept (-copyts) and the fps
+        grid is anchored at skip_seconds, so every decoded frame is filed by the timestamp
+        ffmpeg reports for it (showinfo), not by its position in the output; a frame off the
+        grid or a count mismatch fails the extraction before anything is committed.
+        Returns the frame numbers actually produced; missing frames past the end of the
+        video are simply not produced.
+        """
+        wanted = set(missing)
+        groups = []
+        for a, b in _runs(missing):
+            if groups and (a - groups[-1][-1][1]) / float(fps) <= MAX_DECODE_GAP:
+                groups[-1].append((a, b))
+            else:
+                groups.append([(a, b)])
+
+        camera_model = get_camera_model_from_mp4(self.video_path)
+        produced = []
+        for runs in groups:
+            staged = self._decode_runs(variant_dir, runs, skip_seconds, fps, capture_seconds, threads, quality,
+                                       format, max_width)
+            try:
+                add_camera_model_to_images([str(path) for path, _ in staged], camera_model)
+                for path, n in staged:
+                    if n in wanted:
+                        os.replace(path, self.frame_path(variant_dir, frame_timestamp_ms(skip_seconds, fps, n), format))
+                        produced.append(n)
+            finally:
+                if staged:
+                    shutil.rmtree(staged[0][0].parent, ignore_errors=True)
+        return sorted(set(produced))
+
+    def _decode_runs(self, variant_dir, runs, skip_seconds, fps, capture_seconds, threads, quality, format,
+                     max_width):
+        """[(staged file, frame number)] for the frames of `runs` [(first, last)], checked against their timestamps."""
+        fps, skip = float(fps), float(skip_seconds)
+        n0, n1 = runs[0][0], runs[-1][1]
+        seek = skip + n0 / fps
+        # timestamps are shifted so skip_seconds is 0 and the fps grid is n / fps, as in a full
+        # extraction; half a frame interval around each run selects its frames
+        select = "+".join(f"between(t\\,{(a - 0.5) / fps:.6f}\\,{(b + 0.5) / fps:.6f})" for a, b in runs)
+
+        # read just past the last slot; the select keeps only the requested slots, so no extra frame
+        duration = (n1 - n0 + 1) / fps
+        if capture_seconds:
+            duration = min(duration, max(0.0, float(capture_seconds) - n0 / fps))
+        cmd = ["ffmpeg", "-hide_banner", "-nostats", "-v", "info", "-threads", str(threads), "-t", f"{duration:.6f}"]
+        cmd.extend(["-copyts", "-start_at_zero", "-ss", f"{seek:.6f}", "-i", self.video_path])
+        if format == "jpg":
+            cmd.extend(["-q:v", str(quality)])
+
+        fps_part, rest = frame_filter_chain(fps, max_width).split(",", 1)
+        vf = f"setpts=PTS-{skip:.6f}/TB,{fps_part}:start_time=0,select='{select}',{rest},showinfo"
+        cmd.extend(["-vf", vf, "-vsync", "passthrough"])
+
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=variant_dir))
+        try:
+            cmd.append(str(staging / f"frame_%06d.{format}"))
+            print(f"Running: {' '.join(cmd)}")
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed on frames {n0}-{n1} of {self.video_path}: "
+                                   + "\n".join(result.stderr.strip().splitlines()[-5:]))
+
+            staged = sorted(staging.glob(f"frame_*.{format}"))
+            times = [float(t) for t in SHOWINFO_PTS_TIME.findall(result.stderr)]
+            if len(times) != len(staged):
+                raise RuntimeError(f"ffmpeg reported {len(times)} frames but wrote {len(staged)} "
+                                   f"for frames {n0}-{n1} of {self.video_path}")
+            frames = []
+            for path, t in zip(staged, times):
+                n = round(t * fps)
+                if abs(t - n / fps) > TIMESTAMP_TOLERANCE or not any(a <= n <= b for a, b in runs):
+                    raise RuntimeError(f"ffmpeg produced a frame at {t:.6f} s, not one of frames {n0}-{n1} "
+                                       f"(skip {skip:g} s, fps {fps:g}) of {self.video_path}")
+                frames.append((path, n))
+            return frames
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def derive_filtered(self, base_dir, filtered_dir, timestamps, format, filter, workers=8):
+        """Build filtered frames from cached unfiltered ones with the in-process filter engine."""
+        from concurrent.futures import ProcessPoolExecutor
+        from scripts.image_filters import FILTER_PRESETS, filter_image_file
+
+        options = FILTER_PRESETS[filter]
+        todo = [ms for ms in timestamps if not self.frame_path(filtered_dir, ms, format).exists()]
+        if not todo:
+            return 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(filter_image_file, str(self.frame_path(base_dir, ms, format)),
+                                str(self.frame_path(filtered_dir, ms, format)), format, **options)
+                for ms in todo
+            ]
+            for future in futures:
+                future.result()
+        return len(todo)
+
+
+def extract_frames_cached(video_path, output_dir, fps=1.0, skip_seconds=5, threads=8, quality=2, capture_seconds=None,
+                          format="png", tag="tag", max_width=1600, filter="none", workers=8,
+                          cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Same output as extract_frames_from_file (plus the filter of the variant), served from the frame store.
+
+    Only timestamps that are not cached for (format, max_width) are decoded; the project folder is
+    then filled with hardlinks named <tag>_00001.<format> ...
+    """
+    start_time = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+
+    cache = FrameCache(video_path, cache_dir)
+    base_dir = cache.variant_dir(format, max_width, "none", quality)
+
+    count = cache.extent_count(skip_seconds, fps, capture_seconds)
+    candidates = count if count is not None else cache.estimate_count(skip_seconds, fps, capture_seconds)
+    timestamps = [frame_timestamp_ms(skip_seconds, fps, n) for n in range(candidates)]
+    missing = [n for n, ms in enumerate(timestamps) if not cache.frame_path(base_dir, ms, format).exists()]
+
+    decoded = 0
+    if missing:
+        print(f"🧊 {candidates - len(missing)} of {candidates} frames cached, decoding {len(missing)}")
+        produced = cache.extract_missing(base_dir, missing, skip_seconds, fps, capture_seconds, threads, quality,
+                                         format, max_width)
+        decoded = len(produced)
+        not_produced = sorted(set(missing) - set(produced))
+        if count is None and not_produced:
+            # the video ended before the last candidate frame
+            candidates = not_produced[0]
+    else:
+        print(f"🧊 All {candidates} frames cached")
+
+    if count is None:
+        cache.record_extent(skip_seconds, fps, capture_seconds, candidates)
+    timestamps = timestamps[:candidates]
+
+    frame_dir = base_dir
+    if filter != "none":
+        frame_dir = cache.variant_dir(format, max_width, filter, quality)
+        filtered = cache.derive_filtered(base_dir, frame_dir, timestamps, format, filter, workers)
+        print(f"Filtered {filtered} frames ({filter})")
+
+    methods = {}
+    for n, ms in enumerate(timestamps):
+        method = link_or_copy(cache.frame_path(frame_dir, ms, format), os.path.join(output_dir, f"{tag}_{n + 1:05d}.{format}"))
+        methods[method] = methods.get(method, 0) + 1
+
+    elapsed_time = time.time() - start_time
+    linked = ", ".join(f"{k}: {v}" for k, v in sorted(methods.items()))
+    print(f"⏱️ {len(timestamps)} frames → {output_dir} ({decoded} decoded; {linked}) in {elapsed_time:.2f} seconds")
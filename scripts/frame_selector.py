@@ -0,0 +1,217 @@
+"""
+Content-aware keyframe selection.
+
+Instead of sampling at a fixed fps, a downscaled greyscale copy of the video is scanned
+once and three cheap signals are computed per frame:
+
+- sharpness : variance of the Laplacian (low = motion blur)
+- motion    : median Farneback optical-flow magnitude, as a fraction of frame width
+- dHash     : 64-bit difference hash; Hamming distance to the last kept frame
+
+Frames are kept when enough motion (baseline) has accumulated since the previous
+keyframe, picking the sharpest frame in a short window, and skipping near-duplicates.
+The baseline is tuned by bisection when a target frame count is requested.
+"""
+
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from scripts.extract_frames import (
+    probe_frame_shape, probe_video, _read_exact, scale_filter,
+    get_camera_model_from_mp4, add_camera_model_to_images,
+)
+
+
+def dhash(gray):
+    """64-bit difference hash of a greyscale frame."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def analyze_video(video_path, skip_seconds=0, capture_seconds=None, analysis_width=320, threads=8):
+    """
+    Compute per-frame sharpness, motion and dHash on a downscaled greyscale stream.
+
+    Returns a dict of NumPy arrays indexed by frame number n (counted from the seek point,
+    the same numbering ffmpeg's select filter uses for the same -ss/-t).
+    """
+    vf = f"scale={analysis_width}:-2"
+    h, w, _ = probe_frame_shape(video_path, None, None, skip_seconds, vf=vf)
+    frame_rate = probe_video(video_path)["frame_rate"]
+
+    cmd = ["ffmpeg", "-v", "error", "-threads", str(threads)]
+    if capture_seconds:
+        cmd.extend(["-t", str(capture_seconds)])
+    cmd.extend([
+        "-ss", str(skip_seconds),
+        "-i", video_path,
+        "-vf", vf,
+        "-pix_fmt", "gray", "-f", "rawvideo", "-"
+    ])
+    print(f"Running: {' '.join(cmd)}")
+
+    sharpness, motion, hashes = [], [], []
+    frame = bytearray(w * h)
+    prev = None
+    start_time = time.time()
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        while _read_exact(process.stdout, memoryview(frame)) == len(frame):
+            gray = np.frombuffer(frame, dtype=np.uint8).reshape(h, w).copy()
+            sharpness.append(cv2.Laplacian(gray, cv2.CV_64F).var())
+            if prev is None:
+                motion.append(0.0)
+            else:
+                flow = cv2.calcOpticalFlowFarneback(prev, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+                motion.append(float(np.median(np.linalg.norm(flow, axis=2))) / w)
+            hashes.append(dhash(gray))
+            prev = gray
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+    print(f"⏱️ Analyzed {len(sharpness)} frames in {time.time() - start_time:.2f} seconds")
+    return {
+        "sharpness": np.array(sharpness),
+        "motion": np.array(motion),
+        "hash": np.array(hashes, dtype=np.uint64),
+        "time": np.arange(len(sharpness)) / frame_rate,
+    }
+
+
+def _hamming(a, b):
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def select_keyframes(signals, min_baseline=0.05, min_hash_distance=4, blur_quantile=0.3, window=0.25):
+    """
+    Greedy keyframe selection.
+
+    A new keyframe becomes due once the accumulated motion since the last one reaches
+    `min_baseline` (fraction of frame width).  Among the frames up to `window * min_baseline`
+    further on, the sharpest one that is not in the blurriest `blur_quantile` and differs
+    from the last keyframe by at least `min_hash_distance` hash bits is kept.
+    """
+    sharpness = signals["sharpness"]
+    n_frames = len(sharpness)
+    if n_frames == 0:
+        return []
+
+    threshold = np.quantile(sharpness, blur_quantile)
+    travel = np.cumsum(signals["motion"])
+    hashes = signals["hash"]
+
+    def best_in(lo, limit, last):
+        hi = int(np.searchsorted(travel, limit, side="right"))
+        hi = min(max(hi, lo + 1), n_frames)
+        candidates = [i for i in range(lo, hi) if sharpness[i] >= threshold]
+        if last is not None:
+            candidates = [i for i in candidates if _hamming(hashes[i], hashes[last]) >= min_hash_distance]
+        if not candidates:
+            return None, hi
+        return max(candidates, key=lambda i: sharpness[i]), hi
+
+    keep = []
+    first, _ = best_in(0, travel[0] + window * min_baseline, None)
+    keep.append(first if first is not None else 0)
+    last = keep[-1]
+
+    n = last + 1
+    while n < n_frames:
+        due = int(np.searchsorted(travel, travel[last] + min_baseline, side="left"))
+        if due >= n_frames:
+            break
+        due = max(due, n)
+        chosen, hi = best_in(due, travel[due] + window * min_baseline, last)
+        if chosen is None:
+            n = hi
+            continue
+        keep.append(chosen)
+        last = chosen
+        n = chosen + 1
+    return keep
+
+
+def select_keyframes_for_count(signals, target_count, iterations=20, **kwargs):
+    """Bisect min_baseline so that at most target_count keyframes are selected."""
+    total_travel = float(np.sum(signals["motion"])) or 1.0
+    lo, hi = 0.0, total_travel
+    best = select_keyframes(signals, min_baseline=hi, **kwargs)
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        keep = select_keyframes(signals, min_baseline=mid, **kwargs)
+        if len(keep) > target_count:
+            lo = mid
+        else:
+            hi, best = mid, keep
+            if len(keep) == target_count:
+                break
+    return best
+
+
+def extract_selected_frames(video_path, output_dir, frame_indices, skip_seconds=0, capture_seconds=None, threads=8,
+                            quality=2, format="png", tag="tag", max_width=1600):
+    """Extract only the given frame numbers at full resolution, numbered 1..N, and tag them."""
+    os.makedirs(output_dir, exist_ok=True)
+    select = "+".join(f"eq(n\\,{i})" for i in frame_indices)
+
+    cmd = ["ffmpeg", "-threads", str(threads)]
+    if capture_seconds:
+        cmd.extend(["-t", str(capture_seconds)])
+    cmd.extend([
+        "-ss", str(skip_seconds),
+        "-i", video_path,
+        "-vf", f"select='{select}',format=yuv420p,{scale_filter(max_width)}",
+        "-vsync", "vfr",
+    ])
+    if format == "jpg":
+        cmd.extend(["-q:v", str(quality)])
+    cmd.append(os.path.join(output_dir, f"{tag}_%05d.{format}"))
+
+    print(f"Extracting {len(frame_indices)} keyframes → {output_dir}")
+    subprocess.run(cmd, check=True)
+
+    new_files = sorted(Path(output_dir).glob(f"{tag}_*.{format}"))
+    add_camera_model_to_images([str(p) for p in new_files], get_camera_model_from_mp4(video_path))
+
+
+def extract_keyframes_from_file(video_path, output_dir, target_count=None, min_baseline=0.05, min_hash_distance=4,
+                                blur_quantile=0.3, analysis_width=320, skip_seconds=0, capture_seconds=None,
+                                threads=8, quality=2, format="png", tag="tag", max_width=1600):
+    """Analyze a video, select keyframes and extract them; writes keyframes.json next to output_dir."""
+    signals = analyze_video(video_path, skip_seconds, capture_seconds, analysis_width, threads)
+    options = dict(min_hash_distance=min_hash_distance, blur_quantile=blur_quantile)
+    if target_count:
+        keep = select_keyframes_for_count(signals, target_count, **options)
+    else:
+        keep = select_keyframes(signals, min_baseline=min_baseline, **options)
+
+    print(f"Selected {len(keep)} of {len(signals['sharpness'])} frames")
+    extract_selected_frames(video_path, output_dir, keep, skip_seconds, capture_seconds, threads, quality,
+                            format, tag, max_width)
+
+    manifest = Path(output_dir).parent / "keyframes.json"
+    manifest.write_text(json.dumps({
+        "video": str(video_path),
+        "skip_seconds": float(skip_seconds),
+        "frames": [
+            {
+                "file": f"{tag}_{i + 1:05d}.{format}",
+                "frame": int(n),
+                "time": float(signals["time"][n]),
+                "sharpness": float(signals["sharpness"][n]),
+            }
+            for i, n in enumerate(keep)
+        ],
+    }, indent=2))
+    return keep
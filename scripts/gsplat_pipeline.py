@@ -1,6 +1,8 @@
 import os
-import sys
 from scripts.utils import run_subprocess
+from scripts.errors import PipelineError
+from scripts.executors import in_pipeline_session
+from scripts.step_cache import StepCache
 from loguru import logger
 from pathlib import Path
 
@@ -15,7 +17,7 @@ def host_to_container_path(host_path: str) -> str:
     rel_path = os.path.relpath(abs_host, abs_data_root)
     return os.path.join("/projects", rel_path)
 
-def run_ply_to_splat_converter( input_file, output_file ):
+def run_ply_to_splat_converter( input_file, output_file, run=run_subprocess ):
     """  """
     logger.info(f"📸 Input PLY file    : {input_file}")
     logger.info(f"📈 Output SPLAT file : {output_file}")
@@ -28,12 +30,28 @@ def run_ply_to_splat_converter( input_file, output_file ):
     ]
 
 #    cmd = ["gsplat","ls","/opt/point_cloud_tools"]
-    run_subprocess(cmd, f"gsplat converter")
+    run(cmd, f"gsplat converter")
 
 
 
-def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir, iterations=30000, sh_degree=3):
-    """ gaussian splatting training pipeline """
+def run_gsplat_train(scene, frames_container, sparse_container, output_container, iterations=30000, sh_degree=3,
+                     run=run_subprocess):
+    """ gsplat train.py on container paths """
+    cmd = [
+        "gsplat",
+        "python", "train.py",
+        "--source_path", sparse_container,     # ✅ this is the COLMAP project root
+        "--model_path", output_container,       # ✅ full path to sparse/0
+        "--images", frames_container,
+        "--iterations", iterations,
+        "--sh_degree", sh_degree
+    ]
+    run(cmd, f"gsplat [{scene}]")
+
+
+@in_pipeline_session
+def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir, iterations=30000, sh_degree=3, force=False):
+    """ gaussian splatting training pipeline; training is skipped when images, sparse model and options are unchanged """
     
     logger.info(f"🟢 Running gsplat for {scene}")
     logger.info(f"📸 Host Images      : {images_dir}")
@@ -43,11 +61,11 @@ def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir, iterations=300
     # Validate and create host-side output directory
     try:
         os.makedirs(model_dir, exist_ok=True)
-        os.makedirs( model_dir + "/point_cloud" )
+        os.makedirs( model_dir + "/point_cloud", exist_ok=True )
         logger.success(f"📁 Ensured output directory: {model_dir}")
-    except Exception as e:
+    except OSError as e:
         logger.error(f"❌ Failed to create output directory {model_dir}: {e}")
-        sys.exit(1)
+        raise PipelineError(f"Cannot create {model_dir}: {e}", "gsplat") from e
 
     # Convert to container paths
     frames_container = host_to_container_path(images_dir)
@@ -71,19 +89,14 @@ def run_gsplat_pipeline(scene, images_dir, sparse_dir, model_dir, iterations=300
 # save_iterations="7000 30000"      # default 7000 30000
 # data_device=cpu
 
-    cmd = [
-        "gsplat",
-        "python", "train.py",
-        "--source_path", sparse_container,     # ✅ this is the COLMAP project root
-        "--model_path", output_container,       # ✅ full path to sparse/0
-        "--images", frames_container,
-        "--iterations", iterations,
-        "--sh_degree", sh_degree
-    ]
-
-    run_subprocess(cmd, f"gsplat [{scene}]")
+    model_name = os.path.basename(os.path.normpath(model_dir))
+    steps = StepCache(Path(model_dir).parent / ".stamps", to_container=host_to_container_path, force=force)
+    train = steps.step(f"train-{model_name}", inputs=[images_dir, sparse_dir], output_dirs=[model_dir])
+    run_gsplat_train(scene, frames_container, sparse_container, output_container, iterations, sh_degree, run=train)
 
     point_cloud_file = Path(output_container) / f"point_cloud/iteration_{iterations}/point_cloud.ply"
     splat_file = point_cloud_file.with_suffix( ".splat" )
-    
-    run_ply_to_splat_converter( str(point_cloud_file), str(splat_file) )
+    splat_file_host = Path(model_dir) / f"point_cloud/iteration_{iterations}/point_cloud.splat"
+
+    convert = steps.step(f"splat-{model_name}", outputs=[splat_file_host], upstream=[train.fingerprint])
+    run_ply_to_splat_converter( str(point_cloud_file), str(splat_file), run=convert )
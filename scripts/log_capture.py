@@ -0,0 +1,158 @@
+"""
+Non-blocking capture of a pipeline step's output.
+
+A reader thread drains the child's stdout as fast as it is produced: every line goes to a
+per-step gzip log (logs/steps/<time>-<step>.log.gz) and into a bounded ring buffer (the
+tail shown when a step fails).  Lines for the console/pipeline.log are handed to a
+forwarder thread through a bounded queue; if the forwarder falls behind, lines are counted
+as dropped instead of blocking the reader, so logging never throttles the child.
+
+The forwarder rate-limits progress noise (COLMAP "Processed file [i/N]", tqdm bars, ...)
+to one line per `progress_interval` seconds and records parsed progress as structured
+events in logs/steps/<time>-<step>.events.jsonl.
+"""
+
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+STEP_LOG_DIR = os.path.join("logs", "steps")
+
+# (kind, regex) -> events with i/n (image i of N) or iteration k (of n)
+PROGRESS_PATTERNS = [
+    ("image", re.compile(r"Processed file \[(?P<i>\d+)/(?P<n>\d+)\]")),
+    ("image", re.compile(r"Matching image \[(?P<i>\d+)/(?P<n>\d+)\]")),
+    ("block", re.compile(r"Matching block \[(?P<i>\d+)/(?P<n>\d+)")),
+    ("image", re.compile(r"Registering image #(?P<image_id>\d+) \((?P<i>\d+)\)")),
+    ("depthmap", re.compile(r"(?:Estimated|Fused|Filtered) depth-maps (?P<i>\d+) \((?P<percent>[\d.]+)%")),
+    ("iteration", re.compile(r"(?P<percent>\d+)%\|[^|]*\|\s*(?P<i>\d+)/(?P<n>\d+)")),  # tqdm
+]
+# Lines that are pure progress/noise even when they carry no numbers we track
+NOISE_PATTERNS = [
+    re.compile(r"^\s*\d+%\|"),
+    re.compile(r"^\s*[\[=>\s\]]+\s*\d+%?\s*$"),
+]
+
+
+def parse_progress(line):
+    """Return a structured progress event for a known progress line, else None."""
+    for kind, pattern in PROGRESS_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            event = {"kind": kind}
+            for key, value in match.groupdict().items():
+                if value is not None:
+                    event[key] = float(value) if "." in value else int(value)
+            return event
+    return None
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("_")[:80] or "step"
+
+
+class StepLogCapture:
+    """Drain a text stream in the background; use `start()` then `join()` after the child exits."""
+
+    def __init__(self, stream, step_name, tail_lines=200, queue_size=10000, progress_interval=2.0, log_dir=STEP_LOG_DIR):
+        self.stream = stream
+        self.step_name = step_name
+        self.tail = deque(maxlen=tail_lines)
+        self.lines = queue.Queue(maxsize=queue_size)
+        self.progress_interval = progress_interval
+        self.dropped = 0
+        self.line_count = 0
+        self.last_progress = None
+        self.error = None  # what stopped the reader, re-raised by join()
+        self.forward_error = None  # what stopped the forwarder, re-raised by join()
+
+        os.makedirs(log_dir, exist_ok=True)
+        base = os.path.join(log_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(step_name)}")
+        self.log_path = f"{base}.log.gz"
+        self.events_path = f"{base}.events.jsonl"
+
+        self.reader = threading.Thread(target=self._read, name=f"log-reader[{step_name}]", daemon=True)
+        self.forwarder = threading.Thread(target=self._forward, name=f"log-forwarder[{step_name}]", daemon=True)
+
+    def start(self):
+        self.reader.start()
+        self.forwarder.start()
+        return self
+
+    def _read(self):
+        try:
+            with gzip.open(self.log_path, "wt", compresslevel=3) as log:
+                for line in self.stream:
+                    line = line.rstrip()
+                    if not line:
+                        continue
+                    self.line_count += 1
+                    log.write(line + "\n")
+                    self.tail.append(line)
+                    try:
+                        self.lines.put_nowait(line)
+                    except queue.Full:
+                        self.dropped += 1
+        except BaseException as e:
+            self.error = e
+        finally:
+            # always release the forwarder, or join() waits forever; a dead forwarder
+            # no longer drains the queue, so do not wait for room that never comes
+            while True:
+                try:
+                    self.lines.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if not self.forwarder.is_alive():
+                        break
+
+    def _forward(self):
+        try:
+            self._forward_lines()
+        except BaseException as e:
+            self.forward_error = e
+
+    def _forward_lines(self):
+        last_logged = 0.0
+        suppressed = 0
+        with open(self.events_path, "w") as events:
+            while True:
+                line = self.lines.get()
+                if line is None:
+                    break
+                event = parse_progress(line)
+                if event is not None:
+                    event.update(step=self.step_name, time=round(time.time(), 3))
+                    events.write(json.dumps(event) + "\n")
+                    self.last_progress = line
+                if event is not None or any(p.search(line) for p in NOISE_PATTERNS):
+                    now = time.time()
+                    if now - last_logged < self.progress_interval:
+                        suppressed += 1
+                        continue
+                    last_logged = now
+                    if suppressed:
+                        line = f"{line}  (+{suppressed} progress lines)"
+                        suppressed = 0
+                logger.info(f"[{self.step_name}] {line}")
+        if suppressed and self.last_progress:
+            logger.info(f"[{self.step_name}] {self.last_progress}")
+
+    def join(self):
+        """Wait for both threads; raises what stopped the reader or the forwarder, if anything did."""
+        self.reader.join()
+        self.forwarder.join()
+        if self.dropped:
+            logger.warning(f"⚠️ [{self.step_name}] {self.dropped} lines not shown on the console (all in {self.log_path})")
+        if self.error is not None:
+            raise self.error
+        if self.forward_error is not None:
+            raise self.forward_error
+        return self
@@ -6,56 +6,232 @@ import cv2
 import numpy as np
 from pathlib import Path
 
-import cv2
-import numpy as np
+import os
+import shutil
+import time
+import threading
 import click
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from scripts.utils import link_or_copy
 
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-def generate_combined_mask(input_image_path, output_mask_path, output_masked_image_path=None):
-    img_bgr = cv2.imread(str(input_image_path))
-    img = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
 
-    # Edge detection
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
-    edges_dilated = cv2.dilate(edges, np.ones((3,3), np.uint8), iterations=1)
-
-    # Upward vertical scan to mask ground/horizon
+def _vertical_mask_loop(edges, min_edge_run=5):
+    """Reference per-pixel implementation of vertical_mask (kept for regression checks)."""
     h, w = edges.shape
-    vertical_mask = np.zeros_like(edges_dilated, dtype=np.uint8)
-    min_edge_run = 5
+    vertical_mask = np.zeros_like(edges, dtype=np.uint8)
 
     for x in range(w):
         count = 0
         for y in range(h-1, -1, -1):
-            if edges_dilated[y, x] > 0:
+            if edges[y, x] > 0:
                 count += 1
                 if count >= min_edge_run:
                     vertical_mask[:y+1, x] = 255
                     break
             else:
                 count = 0
+    return vertical_mask
+
+
+def vertical_mask(edges, min_edge_run=5, csum=None, out=None):
+    """
+    Mask everything above the first run of >= min_edge_run edge pixels, scanning each column bottom-up.
+
+    A run ending at row y (scanning upward) means edges[y:y+min_edge_run, x] are all set, so the
+    first hit from the bottom is the largest such y.  Window sums over a cumulative sum find all
+    full windows at once; bit-identical to _vertical_mask_loop.  `csum` ((h+1, w) int32) and
+    `out` ((h, w) uint8) may be passed in to reuse buffers between frames.
+    """
+    h, w = edges.shape
+    mask = out if out is not None else np.empty((h, w), dtype=np.uint8)
+    mask.fill(0)
+    if h < min_edge_run:
+        return mask
+
+    if csum is None:
+        csum = np.empty((h + 1, w), dtype=np.int32)
+    csum[0] = 0
+    np.cumsum(edges > 0, axis=0, dtype=np.int32, out=csum[1:])
+    full = (csum[min_edge_run:] - csum[:-min_edge_run]) == min_edge_run  # full[y]: rows y..y+k-1 all edges
+
+    found = full.any(axis=0)
+    top = (h - min_edge_run) - np.argmax(full[::-1], axis=0)
+    mask[(np.arange(h)[:, None] <= top) & found] = 255
+    return mask
+
+
+# Per-thread scratch buffers, keyed by frame shape, reused across frames by pool workers
+# (thread-local so that --backend thread workers never share them)
+_local = threading.local()
+_DILATE_KERNEL = np.ones((3, 3), np.uint8)
+
+
+def _frame_buffers(h, w):
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    key = (h, w)
+    if key not in buffers:
+        buffers[key] = {
+            "gray": np.empty((h, w), np.uint8),
+            "edges": np.empty((h, w), np.uint8),
+            "dilated": np.empty((h, w), np.uint8),
+            "ground": np.empty((h, w), np.uint8),
+            "final": np.empty((h, w), np.uint8),
+            "csum": np.empty((h + 1, w), np.int32),
+        }
+    return buffers[key]
+
+
+def _replace_file(path, data=None, source=None):
+    """
+    Write bytes (or a copy of source) beside path and rename over it.  Outputs may be hardlinks
+    to a shared constant mask or to the source frames from an earlier run; writing in place
+    would change those too.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if source is not None:
+        shutil.copyfile(source, tmp)
+    else:
+        with open(tmp, "wb") as f:
+            f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_png(path, image):
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise RuntimeError(f"Failed to encode {path}")
+    _replace_file(path, encoded.tobytes())
+
+
+def generate_combined_mask(input_image_path, output_mask_path, output_masked_image_path=None, dedup=False):
+    img_bgr = cv2.imread(str(input_image_path))
+    h, w = img_bgr.shape[:2]
+    buf = _frame_buffers(h, w)
+
+    # Edge detection
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY, dst=buf["gray"])
+    edges = cv2.Canny(gray, 50, 150, edges=buf["edges"])
+    edges_dilated = cv2.dilate(edges, _DILATE_KERNEL, dst=buf["dilated"], iterations=1)
+
+    # Upward vertical scan to mask ground/horizon
+    ground_mask = vertical_mask(edges_dilated, min_edge_run=5, csum=buf["csum"], out=buf["ground"])
 
     # Combine masks
-    final_mask = cv2.bitwise_and(edges_dilated, vertical_mask)
+    final_mask = cv2.bitwise_and(edges_dilated, ground_mask, dst=buf["final"])
 
     # Write mask
     output_mask_path.parent.mkdir(parents=True, exist_ok=True)
-    cv2.imwrite(str(output_mask_path), final_mask)
+    constant = dedup and final_mask.min() == final_mask.max()
+    if constant:
+        value = int(final_mask[0, 0])
+        link_or_copy(constant_mask_file(output_mask_path.parent, value, h, w), output_mask_path)
+    else:
+        _write_png(output_mask_path, final_mask)
 
-    # Apply mask to original image if output_masked_image_path provided
+    # Apply mask to the already decoded image if output_masked_image_path provided
     if output_masked_image_path is not None:
-        # Ensure mask is 3-channel for color image masking
-        mask_3ch = cv2.merge([final_mask, final_mask, final_mask])
-        masked_img = cv2.bitwise_and(img, mask_3ch)
-        
         output_masked_image_path.parent.mkdir(parents=True, exist_ok=True)
-        masked_img_bgr = cv2.cvtColor(masked_img, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(str(output_masked_image_path), masked_img_bgr)
+        if constant and value == 255:
+            # nothing masked out: the masked image is the source itself
+            link_or_copy(input_image_path, output_masked_image_path)
+        else:
+            masked_img = cv2.bitwise_and(img_bgr, img_bgr, mask=final_mask)
+            _write_png(output_masked_image_path, masked_img)
 
-def generate_masks_in_directory(images_dir, output_mask_dir, output_masked_image_dir=None, workers=8, filter="default"):
+
+def image_size(img_path):
+    """(h, w) of an image, read from the PNG header when possible instead of decoding it."""
+    with open(img_path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        return int.from_bytes(header[20:24], "big"), int.from_bytes(header[16:20], "big")
+    img = cv2.imread(str(img_path), cv2.IMREAD_UNCHANGED)
+    return img.shape[:2]
+
+
+# Encoded all-white masks per (h, w), per process
+_white_masks = {}
+
+CONSTANT_MASK_FOLDER = ".constant"
+
+
+def constant_mask_file(output_mask_dir, value, h, w):
+    """
+    Shared file holding a constant (value) mask of size w x h, written once per folder and size.
+    Per-image masks are hardlinked to it.  Lives in a hidden sub-folder COLMAP never looks at.
+    """
+    path = Path(output_mask_dir) / CONSTANT_MASK_FOLDER / f"{value}_{w}x{h}.png"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ok, encoded = cv2.imencode(".png", np.full((h, w), value, dtype=np.uint8))
+        # several workers may race here; write privately then rename atomically
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(encoded.tobytes())
+        os.replace(tmp, path)
+    return path
+
+
+def write_full_mask(img_path, mask_path, masked_image_path=None, dedup=False):
+    """
+    filter=none: all-255 mask (keep everything); the masked image is the untouched source.
+    With dedup, the mask is a hardlink to one shared mask per resolution and the masked image
+    a hardlink/reflink of the source, so nothing is decoded, encoded or copied.
+    """
+    h, w = image_size(img_path)
+    if dedup:
+        link_or_copy(constant_mask_file(mask_path.parent, 255, h, w), mask_path)
+    else:
+        if (h, w) not in _white_masks:
+            ok, encoded = cv2.imencode(".png", np.full((h, w), 255, dtype=np.uint8))
+            _white_masks[(h, w)] = encoded.tobytes()
+        _replace_file(mask_path, _white_masks[(h, w)])
+
+    if masked_image_path:
+        if dedup:
+            link_or_copy(img_path, masked_image_path)
+        else:
+            _replace_file(masked_image_path, source=img_path)
+
+
+def process_mask_image(img_path, output_mask_dir, output_masked_image_dir=None, filter="default", dedup=False):
+    """Generate the mask (and optional masked image) for one image. Returns the mask name."""
+    mask_path = output_mask_dir / (img_path.stem + ".png")
+    masked_image_path = (output_masked_image_dir / (img_path.name)) if output_masked_image_dir else None
+
+    if filter.lower() == "none":
+        write_full_mask(img_path, mask_path, masked_image_path, dedup=dedup)
+
+    elif filter.lower() == "default":
+        # your existing edge + vertical mask strategy
+        generate_combined_mask(img_path, mask_path, masked_image_path, dedup=dedup)
+
+    else:
+        raise ValueError(f"Unknown filter type '{filter}'")
+
+    return mask_path.name
+
+
+def _process_mask_task(args):
+    try:
+        return process_mask_image(*args), None
+    except Exception as e:
+        return args[0].stem + ".png", f"{type(e).__name__}: {e}"
+
+
+def generate_masks_in_directory(images_dir, output_mask_dir, output_masked_image_dir=None, workers=8, filter="default",
+                                backend="process", chunksize=None, dedup=True):
+    """
+    Generate masks for every PNG in images_dir.
+
+    backend="process" runs a process pool fed in chunks (the NumPy/Python work is not held
+    back by the GIL); backend="thread" keeps the previous thread pool.  Throughput is reported
+    in images/sec so workers can be sized per host.  With dedup, constant masks are written
+    once per resolution and unchanged images are hardlinked/reflinked instead of re-encoded.
+    """
     output_mask_dir.mkdir(parents=True, exist_ok=True)
     if output_masked_image_dir:
         output_masked_image_dir.mkdir(parents=True, exist_ok=True)
@@ -65,42 +241,32 @@ def generate_masks_in_directory(images_dir, output_mask_dir, output_masked_image
         click.echo("No PNG images found.")
         return
 
-    click.echo(f"Generating masks for {len(png_files)} images using {workers} threads and filter '{filter}'...")
+    click.echo(f"Generating masks for {len(png_files)} images using {workers} {backend} workers and filter '{filter}'...")
 
-    def process_image(img_path):
-        mask_path = output_mask_dir / (img_path.stem + ".png")
-        masked_image_path = (output_masked_image_dir / (img_path.name)) if output_masked_image_dir else None
+    start_time = time.time()
+    tasks = [(img_path, output_mask_dir, output_masked_image_dir, filter, dedup) for img_path in png_files]
+    chunksize = chunksize or max(1, len(tasks) // (workers * 4))
 
-        if filter.lower() == "none":
-            # create a fully white mask (keep everything)
-            img_bgr = cv2.imread(str(img_path))
-            h, w = img_bgr.shape[:2]
-            full_mask = np.full((h, w), 255, dtype=np.uint8)
-            cv2.imwrite(str(mask_path), full_mask)
+    if backend == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+    elif backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown backend '{backend}'")
 
-            if masked_image_path:
-                cv2.imwrite(str(masked_image_path), img_bgr)
-
-        elif filter.lower() == "default":
-            # your existing edge + vertical mask strategy
-            generate_combined_mask(img_path, mask_path, masked_image_path)
-
-        else:
-            raise ValueError(f"Unknown filter type '{filter}'")
-
-        return mask_path.name
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {executor.submit(process_image, img_path): img_path for img_path in png_files}
-
-        for future in as_completed(futures):
-            img_name = futures[future].name
-            try:
-                mask_name = future.result()
+    errors = 0
+    with executor:
+        for (img_path, *_), (mask_name, error) in zip(tasks, executor.map(_process_mask_task, tasks, chunksize=chunksize)):
+            if error:
+                errors += 1
+                click.echo(f"❌ Error processing {img_path.name}: {error}")
+            else:
                 click.echo(f"✅ {mask_name} created.")
-            except Exception as e:
-                click.echo(f"❌ Error processing {img_name}: {e}")
 
+    elapsed = time.time() - start_time
+    done = len(tasks) - errors
+    click.echo(f"⏱️ {done} images in {elapsed:.2f} s → {done / max(elapsed, 1e-9):.1f} images/sec "
+               f"({workers} {backend} workers, chunksize {chunksize})")
     click.echo(f"🎉 All masks written to: {output_mask_dir}")
     if output_masked_image_dir:
         click.echo(f"🖼 Masked images written to: {output_masked_image_dir}")
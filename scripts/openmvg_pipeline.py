@@ -1,7 +1,6 @@
 # openmvg_pipeline.py
 
 import os
-import sys
 import json
 
 from loguru import logger
@@ -31,77 +30,93 @@ from scripts.wrappers import (
     export_mesh_ply,
     export_textured_mesh_ply,
 )
+from scripts.checkpoints import StepCheckpoints
+from scripts.errors import QualityCheckFailed
+from scripts.executors import in_pipeline_session
+
+CHECKPOINT_DIR = "data/openmvg/.checkpoints"
+
+
+def select_matches(matches_ratio):
+    """Compute matches for each geometric model and pick the best match file."""
+    match_files = []
+    geometry_files = dict(FUNDAMENTAL="matches.f.txt",ESSENTIAL="matches.e.txt",HOMOGRAPHY="matches.h.txt")
+#    for geometric_model in ['FUNDAMENTAL','ESSENTIAL','HOMOGRAPHY']:
+    for geometric_model in ['ESSENTIAL']:
+        geometry_file = geometry_files.get(geometric_model,"INVALID")
+        run_compute_matches( matches_ratio,geometric_model,geometry_file)
+        #run_export_matches_visualization(match_type, match_file)
+        match_path = f"data/openmvg/matches/{geometry_file}"
+        match_files.append( match_path )
+        plot_match_histogram(
+            f"{match_path}",
+            f"data/visuals/match_histogram_{geometry_file.replace('.txt','.png')}"
+        )
+
+    return check_and_select_best_matches(
+        match_files,
+        min_valid_matches=10,
+        min_matches_per_pair=10
+    )
+
+
+def check_dense_points(min_points):
+    num_dense_points = export_dense_ply()
+    logger.info(f"scene_dense.ply contains {num_dense_points} points")
+    if num_dense_points < min_points:
+        logger.error(f"❌ Aborting pipeline — too few dense points ({num_dense_points}) for ReconstructMesh.")
+        raise QualityCheckFailed(f"Too few dense points ({num_dense_points} < {min_points})", "dense-points")
+    return num_dense_points
+
 
 # Main pipeline function
-def run_pipeline(enable_texturing=True, sfm_engine="INCREMENTAL", matches_ratio=0.6, min_poses=3):
-    """Run OpenMVG + OpenMVS pipeline"""
-
-    logger.info("🚀 Starting OpenMVG + OpenMVS pipeline ...")
-
-    if 1:
-        # === OPENMVG ===
-
-        run_sfm_init_image_listing()
-        run_compute_features()
-        
-        match_files = []
-        geometry_files = dict(FUNDAMENTAL="matches.f.txt",ESSENTIAL="matches.e.txt",HOMOGRAPHY="matches.h.txt")
-#        for geometric_model in ['FUNDAMENTAL','ESSENTIAL','HOMOGRAPHY']:
-        for geometric_model in ['ESSENTIAL']:
-            geometry_file = geometry_files.get(geometric_model,"INVALID")
-            run_compute_matches( matches_ratio,geometric_model,geometry_file)
-            #run_export_matches_visualization(match_type, match_file)
-            match_path = f"data/openmvg/matches/{geometry_file}"
-            match_files.append( match_path )
-            plot_match_histogram(
-                f"{match_path}",
-                f"data/visuals/match_histogram_{geometry_file.replace('.txt','.png')}"
-            )
-
-        selected_match_file = check_and_select_best_matches(
-            match_files,
-            min_valid_matches=10,
-            min_matches_per_pair=10
-        )
+@in_pipeline_session
+def run_pipeline(enable_texturing=True, sfm_engine="INCREMENTAL", matches_ratio=0.6, min_poses=3, resume=False):
+    """
+    Run OpenMVG + OpenMVS pipeline.  Every completed step leaves a marker in CHECKPOINT_DIR;
+    with resume=True the run restarts from the first step without one.
+    """
+
+    logger.info("🚀 Starting OpenMVG + OpenMVS pipeline ..." + (" (resuming)" if resume else ""))
+    steps = StepCheckpoints(CHECKPOINT_DIR, resume=resume)
 
-     
-        # Run SfM
-        run_sfm(sfm_engine, selected_match_file)
+    # === OPENMVG ===
+    steps.run("image-listing", run_sfm_init_image_listing)
+    steps.run("features", run_compute_features)
+    selected_match_file = steps.run("matches", select_matches, matches_ratio)
+
+    # Run SfM
+    steps.run("sfm", run_sfm, sfm_engine, selected_match_file)
 
     # Export sparse ply
-    export_sparse_ply(sfm_engine)
+    steps.run("export-sparse", export_sparse_ply, sfm_engine)
 
     # Convert sfm_data.bin → sfm_data.json
-    run_convert_sfm_data_format(sfm_engine)
+    steps.run("sfm-json", run_convert_sfm_data_format, sfm_engine)
 
-    verify_minimum_poses( min_poses,sfm_engine )
+    steps.run("verify-poses", verify_minimum_poses, min_poses, sfm_engine)
 
     # Validate sfm_data.json paths
-    validate_sfm_data_paths(sfm_engine)
+    steps.run("validate-paths", validate_sfm_data_paths, sfm_engine)
 
     # Convert OpenMVG → OpenMVS
-    run_openmvg_to_openmvs(sfm_engine)
+    steps.run("openmvg-to-openmvs", run_openmvg_to_openmvs, sfm_engine)
 
     # === OPENMVS ===
 
-    run_link_images()
+    steps.run("link-images", run_link_images)
 
-    run_densify_pointcloud()
-
-    num_dense_points = export_dense_ply()
-    logger.info(f"scene_dense.ply contains {num_dense_points} points")
+    steps.run("densify", run_densify_pointcloud)
 
     MIN_POINTS_FOR_MESH = 1000
-    if num_dense_points < MIN_POINTS_FOR_MESH:
-        logger.error(f"❌ Aborting pipeline — too few dense points ({num_dense_points}) for ReconstructMesh.")
-        sys.exit(1)
+    steps.run("dense-points", check_dense_points, MIN_POINTS_FOR_MESH)
 
-    run_reconstruct_mesh()
+    steps.run("reconstruct-mesh", run_reconstruct_mesh)
 
     #export_mesh_ply()
 
     if enable_texturing:
-        run_texture_mesh()
+        steps.run("texture-mesh", run_texture_mesh)
         #export_textured_mesh_ply()
 
     logger.info("✅ OpenMVG + OpenMVS pipeline complete.")
@@ -2,6 +2,7 @@ import os
 import time
 from pathlib import Path
 from scripts.utils import run_subprocess
+from scripts.executors import in_pipeline_session
 from loguru import logger
 from scripts.pymeshlab_utils import clean_dense_mesh
 
@@ -12,14 +13,14 @@ def host_to_container_path(host_path):
     return "/projects/" + os.path.relpath(host_path, "projects")
 
 
-def run_interface_colmap(input_folder, output_mvs_file, image_folder):
+def run_interface_colmap(input_folder, output_mvs_file, image_folder, run=run_subprocess):
 
     logger.info("🔧 Running InterfaceCOLMAP with the following arguments:")
     logger.info(f"  📂 Input COLMAP folder (-i): {input_folder}")
     logger.info(f"  📄 Output MVS file     (-o): {output_mvs_file}")
     logger.info(f"  🗂️ image foldery   (--image-folder): {image_folder}")
 
-    run_subprocess([
+    run([
         "openmvs",
         "bin/InterfaceCOLMAP",
         "-i", input_folder,
@@ -28,8 +29,8 @@ def run_interface_colmap(input_folder, output_mvs_file, image_folder):
         "--image-folder", image_folder  # workspace root (needed for images)
     ], "OpenMVS: InterfaceCOLMAP")
 
-def run_densify_point_cloud(mvs_file, image_folder):
-    run_subprocess([
+def run_densify_point_cloud(mvs_file, image_folder, run=run_subprocess):
+    run([
         "openmvs",
         "bin/DensifyPointCloud",
         mvs_file,
@@ -38,8 +39,8 @@ def run_densify_point_cloud(mvs_file, image_folder):
         "--cuda-device","-1"
     ], "OpenMVS: DensifyPointCloud")
 
-def run_reconstruct_mesh(mvs_file):
-    run_subprocess([
+def run_reconstruct_mesh(mvs_file, run=run_subprocess):
+    run([
         "openmvs",
         "bin/ReconstructMesh",
         mvs_file,
@@ -48,8 +49,8 @@ def run_reconstruct_mesh(mvs_file):
         "--cuda-device","-1"
     ], "OpenMVS: ReconstructMesh")
 
-def run_refine_mesh(mvs_file):
-    run_subprocess([
+def run_refine_mesh(mvs_file, run=run_subprocess):
+    run([
         "openmvs",
         "bin/RefineMesh",
         mvs_file,
@@ -58,8 +59,8 @@ def run_refine_mesh(mvs_file):
         "--cuda-device","-1"
     ], "OpenMVS: RefineMesh")
 
-def run_texture_mesh(mvs_file, image_folder):
-    run_subprocess([
+def run_texture_mesh(mvs_file, image_folder, run=run_subprocess):
+    run([
         "openmvs",
         "bin/TextureMesh",
         mvs_file,
@@ -81,6 +82,7 @@ def convert_mesh_to_glb(input_mesh_path, output_glb_path):
 
 
 
+@in_pipeline_session
 def mvs_pipeline(image_folder, sparse_model_folder, mvs_output_folder):
     """
     Run full OpenMVS pipeline.
@@ -0,0 +1,138 @@
+"""
+Match-pair planner for COLMAP's matches_importer.
+
+The sequential matcher pairs every frame with a fixed window of neighbours and the
+exhaustive matcher pairs everything (O(n²)).  The planner builds an explicit pair list
+from three cheap sources, in priority order:
+
+- temporal : each frame with the next `overlap` frames (name order = capture order)
+- loops    : frames far apart in time (≥ `loop_gap`) whose thumbnails look alike,
+             i.e. the drone came back over the same place
+- retrieval: the most similar thumbnails outside the temporal window
+
+Thumbnails are tiny greyscale copies (decoded at 1/8 size), blurred, zero-mean and
+unit-norm, so similarity is a dot product; the top candidates are found block by block.
+Every image takes part in at most `max_pairs` pairs, so the number of pairs (and matching
+time) grows linearly with the number of frames.
+
+The list is written as "<image1> <image2>" lines, for
+`colmap matches_importer --match_type pairs`.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from loguru import logger
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+THUMBNAIL_SIZE = (32, 24)  # width, height
+
+
+def list_images(image_dir):
+    """Image names in capture order (frame names are zero-padded)."""
+    return sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def thumbnail_descriptor(image_path):
+    """Global descriptor of an image: blurred 32×24 greyscale thumbnail, zero-mean, unit-norm."""
+    image = cv2.imread(str(image_path), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        raise ValueError(f"Could not read {image_path}")
+    small = cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    small = cv2.GaussianBlur(small, (3, 3), 0).flatten()
+    small -= small.mean()
+    return small / (np.linalg.norm(small) + 1e-6)
+
+
+def thumbnail_descriptors(image_dir, names, workers=8):
+    """(n, d) matrix of thumbnail descriptors (cv2 releases the GIL while decoding)."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return np.stack(list(pool.map(lambda name: thumbnail_descriptor(os.path.join(image_dir, name)), names)))
+
+
+def similar_images(descriptors, top, block=1024):
+    """(indices, similarities), each (n, top): most similar other images per image, best first."""
+    n = len(descriptors)
+    top = min(top, n - 1)
+    indices = np.empty((n, top), dtype=np.int64)
+    similarities = np.empty((n, top), dtype=np.float32)
+    for start in range(0, n, block):
+        scores = descriptors[start:start + block] @ descriptors.T
+        rows = np.arange(len(scores))
+        scores[rows, start + rows] = -np.inf  # not itself
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        indices[start:start + block] = np.take_along_axis(best, order, axis=1)
+        similarities[start:start + block] = np.take_along_axis(best_scores, order, axis=1)
+    return indices, similarities
+
+
+def plan_pairs(descriptors, overlap=5, retrieval=5, loops=3, loop_gap=30, min_similarity=0.6, max_pairs=20):
+    """
+    Pairs (i, j), i < j, of image indices: temporal neighbours, then loop-closure candidates,
+    then retrieval candidates, skipping pairs that would give an image more than max_pairs.
+    """
+    n = len(descriptors)
+    pairs, count = {}, np.zeros(n, dtype=np.int64)
+
+    def add(i, j, source):
+        i, j = min(i, j), max(i, j)
+        if i == j or (i, j) in pairs or count[i] >= max_pairs or count[j] >= max_pairs:
+            return False
+        pairs[(i, j)] = source
+        count[i] += 1
+        count[j] += 1
+        return True
+
+    for distance in range(1, overlap + 1):  # nearest first, so they survive the cap
+        for i in range(n - distance):
+            add(i, i + distance, "temporal")
+
+    if n > overlap + 1 and (retrieval or loops):
+        candidates, similarities = similar_images(descriptors, top=overlap * 2 + retrieval + loops * 4)
+        gaps = np.abs(candidates - np.arange(n)[:, None])
+        for i in range(n):
+            # the candidates of image i, best first: far ones (loops), then outside the temporal window
+            found = 0
+            for j, gap, similarity in zip(candidates[i], gaps[i], similarities[i]):
+                if found >= loops or similarity < min_similarity:
+                    break
+                if gap >= loop_gap:
+                    found += add(i, int(j), "loop")
+            found = 0
+            for j, gap, similarity in zip(candidates[i], gaps[i], similarities[i]):
+                if found >= retrieval or similarity < min_similarity:
+                    break
+                if gap > overlap:
+                    found += add(i, int(j), "retrieval")
+    return pairs
+
+
+def write_pairs(image_dir, pairs_file, overlap=5, retrieval=5, loops=3, loop_gap=30, min_similarity=0.6,
+                max_pairs=20, workers=8):
+    """Plan the pairs for an image folder and write them for matches_importer; returns the pair count."""
+    start_time = time.time()
+    names = list_images(image_dir)
+    if len(names) < 2:
+        raise ValueError(f"Need at least two images in {image_dir}")
+    descriptors = thumbnail_descriptors(image_dir, names, workers)
+    pairs = plan_pairs(descriptors, overlap, retrieval, loops, loop_gap, min_similarity, max_pairs)
+
+    lines = [f"{names[i]} {names[j]}\n" for i, j in sorted(pairs)]
+    pairs_file = Path(pairs_file)
+    pairs_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = pairs_file.with_suffix(".tmp")
+    tmp.write_text("".join(lines))
+    os.replace(tmp, pairs_file)
+
+    sources = {source: list(pairs.values()).count(source) for source in ("temporal", "loop", "retrieval")}
+    exhaustive = len(names) * (len(names) - 1) // 2
+    logger.info(f"🧩 {len(pairs)} pairs for {len(names)} images ({len(pairs) / exhaustive:.1%} of exhaustive): "
+                + ", ".join(f"{k} {v}" for k, v in sources.items())
+                + f" → {pairs_file} in {time.time() - start_time:.1f} sec")
+    return len(pairs)
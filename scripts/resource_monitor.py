@@ -0,0 +1,289 @@
+"""
+Per-step resource profiling.
+
+While a step runs, a sampler thread records CPU time, memory, read/write bytes and thread
+count.  Where the step runs in a container (compose-run or docker-exec), the container's
+cgroup is read, since the process on the host is only the docker client; otherwise the
+host process tree of the child is walked through /proc.
+
+What "memory" means depends on the source, and the summary says which (`mem_source`):
+
+- proc   : summed RSS of the child's process tree
+- cgroup : anonymous memory (memory.stat `anon`, no page cache) of the container, above
+           what it held when the step started; a docker-exec container is shared by the
+           steps of a session, so this is the step's growth, not its absolute footprint
+
+Inside a `profile_steps(<stats folder>/resources-<model>.jsonl)` block every
+run_subprocess call appends its samples to that file, one JSON object per line:
+
+    {"step": ..., "t": 12.0, "cpu_s": ..., "cpu_pct": ..., "mem_mb": ..., "read_mb": ..., "write_mb": ..., "threads": ...}
+    {"step": ..., "summary": true, "mem_source": ..., "wall_s": ..., "cpu_s": ..., "peak_mem_mb": ..., ...}
+
+so the report can show where time and memory go for each (fps, width, model) configuration.
+"""
+
+import contextvars
+import glob
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+_MB = 1024 * 1024
+
+# per context, so pipelines running concurrently in threads or tasks each write their own file;
+# thread pools running steps must submit through contextvars.copy_context().run
+_profile_file = contextvars.ContextVar("profile_file", default=None)
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile_steps(path):
+    """Append the resource samples of every step run inside the block to `path` (jsonl)."""
+    current = _profile_file.get()
+    if current is not None:
+        # nested pipelines keep writing to the outer file
+        yield current
+        return
+    os.makedirs(os.path.dirname(str(path)) or ".", exist_ok=True)
+    token = _profile_file.set(str(path))
+    try:
+        yield str(path)
+    finally:
+        _profile_file.reset(token)
+
+
+def container_name(full_cmd):
+    """Name of the container a docker command runs in (`--name` of a run, target of an exec), else None."""
+    if full_cmd[:1] != ["docker"]:
+        return None
+    if "--name" in full_cmd:
+        return full_cmd[full_cmd.index("--name") + 1]
+    if "exec" in full_cmd:
+        i = full_cmd.index("exec") + 1
+        while i < len(full_cmd) and full_cmd[i].startswith("-"):
+            i += 1 if "=" in full_cmd[i] else 2  # every exec option we use takes a value
+        return full_cmd[i] if i < len(full_cmd) else None
+    return None
+
+
+def container_cgroup(name):
+    """cgroup v2 folder of a running container, or None (not started yet, cgroup v1, no access)."""
+    try:
+        container_id = subprocess.run(["docker", "inspect", "--format", "{{.Id}}", name],
+                                      capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    candidates = [
+        os.path.join(CGROUP_ROOT, "system.slice", f"docker-{container_id}.scope"),  # systemd driver
+        os.path.join(CGROUP_ROOT, "docker", container_id),                          # cgroupfs driver
+    ] + glob.glob(os.path.join(CGROUP_ROOT, "**", f"*{container_id}*"), recursive=True)
+    for path in candidates:
+        if os.path.exists(os.path.join(path, "cpu.stat")):
+            return path
+    return None
+
+
+def _read_keyed(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2:
+                values[parts[0]] = int(parts[1])
+    return values
+
+
+def sample_cgroup(path):
+    """Cumulative cpu seconds and io bytes, anonymous memory and pids of a cgroup v2 folder."""
+    cpu = _read_keyed(os.path.join(path, "cpu.stat"))
+    # memory.current also counts page cache (every image the step read), so use anon
+    anon = _read_keyed(os.path.join(path, "memory.stat")).get("anon", 0)
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(path, "io.stat")) as f:
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(path, "pids.current")) as f:
+            threads = int(f.read())
+    except OSError:
+        threads = 0
+    return {"cpu_s": cpu.get("usage_usec", 0) / 1e6, "mem": anon, "read": read_bytes, "write": write_bytes,
+            "threads": threads}
+
+
+def _process_tree(root_pid):
+    children = {}
+    for stat_file in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat_file) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat_file.split("/")[2]))
+    tree, todo = [], [root_pid]
+    while todo:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(children.get(pid, []))
+    return tree
+
+
+def _sample_process(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # fields[0] is field 3 (state) of proc(5): utime 14, stime 15, num_threads 20, rss 24
+    sample = {"cpu_s": (int(fields[11]) + int(fields[12])) / _CLK_TCK, "mem": int(fields[21]) * _PAGE_SIZE,
+              "threads": int(fields[17]), "read": 0, "write": 0}
+    try:
+        io = {}
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                io[key] = int(value)
+        sample["read"], sample["write"] = io.get("read_bytes", 0), io.get("write_bytes", 0)
+    except (OSError, ValueError):
+        pass
+    return sample
+
+
+class ResourceMonitor:
+    """Sample a running step every `interval` seconds; `start()`, then `stop()` once the child exits."""
+
+    def __init__(self, pid, step_name, full_cmd=(), interval=1.0):
+        self.pid = pid
+        self.step_name = step_name
+        self.container = container_name(list(full_cmd))
+        # a docker-exec container outlives the step (and serves others), a compose-run one is the step's own
+        self.shared_container = bool(self.container) and "exec" in full_cmd
+        self.interval = interval
+        self.cgroup = None
+        self.samples = []
+        self.summary = {}
+        self._seen = {}  # pid -> last sample, so processes that exited still count
+        self._baseline = None
+        self._lookups = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"resources[{step_name}]", daemon=True)
+        self._start_time = time.time()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _sample_tree(self):
+        current_rss = current_threads = 0
+        for pid in _process_tree(self.pid):
+            try:
+                sample = _sample_process(pid)
+            except (OSError, IndexError, ValueError):
+                continue
+            self._seen[pid] = sample
+            current_rss += sample["mem"]
+            current_threads += sample["threads"]
+        return {
+            "cpu_s": sum(s["cpu_s"] for s in self._seen.values()),
+            "read": sum(s["read"] for s in self._seen.values()),
+            "write": sum(s["write"] for s in self._seen.values()),
+            "mem": current_rss,
+            "threads": current_threads,
+        }
+
+    def _sample(self):
+        if self.container and self.cgroup is None and self._lookups < 5:
+            # a compose-run container may take a few samples to appear
+            self._lookups += 1
+            self.cgroup = container_cgroup(self.container)
+        if self.cgroup:
+            try:
+                sample = sample_cgroup(self.cgroup)
+            except OSError:
+                sample = None  # container is gone
+            if sample:
+                # a shared container: count only what happened since the step started
+                if self._baseline is None:
+                    self._baseline = dict(sample) if self.shared_container else dict.fromkeys(sample, 0)
+                for key in ("cpu_s", "read", "write"):
+                    sample[key] -= self._baseline[key]
+                sample["mem"] = max(0, sample["mem"] - self._baseline["mem"])
+                return sample
+        return self._sample_tree()
+
+    def _record(self):
+        sample = self._sample()
+        t = time.time() - self._start_time
+        previous = self.samples[-1] if self.samples else None
+        cpu_pct = 0.0
+        if previous and t > previous["t"]:
+            cpu_pct = 100.0 * (sample["cpu_s"] - previous["cpu_s"]) / (t - previous["t"])
+        self.samples.append({
+            "step": self.step_name,
+            "t": round(t, 2),
+            "cpu_s": round(sample["cpu_s"], 2),
+            "cpu_pct": round(cpu_pct, 1),
+            "mem_mb": round(sample["mem"] / _MB, 1),
+            "read_mb": round(sample["read"] / _MB, 1),
+            "write_mb": round(sample["write"] / _MB, 1),
+            "threads": sample["threads"],
+        })
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._record()
+            except Exception as e:  # profiling must never fail a step
+                logger.debug(f"[{self.step_name}] resource sample failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        samples = self.samples
+        last = samples[-1] if samples else {}
+        self.summary = {
+            "step": self.step_name,
+            "summary": True,
+            "source": "cgroup" if self.cgroup else "proc",
+            "mem_source": "cgroup anon above step start" if self.cgroup else "process tree rss",
+            "wall_s": round(time.time() - self._start_time, 2),
+            "cpu_s": last.get("cpu_s", 0.0),
+            "peak_mem_mb": max((s["mem_mb"] for s in samples), default=0.0),
+            "read_mb": last.get("read_mb", 0.0),
+            "write_mb": last.get("write_mb", 0.0),
+            "max_threads": max((s["threads"] for s in samples), default=0),
+        }
+        profile_file = _profile_file.get()
+        if profile_file:
+            with _profile_lock, open(profile_file, "a") as f:
+                for record in samples + [self.summary]:
+                    f.write(json.dumps(record) + "\n")
+        return self.summary
+
+
+def load_resource_summaries(path):
+    """{step: summary} from a resources-*.jsonl file (the last run of each step wins)."""
+    summaries = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("summary"):
+                    summaries[record["step"]] = record
+    except (OSError, ValueError):
+        pass
+    return summaries
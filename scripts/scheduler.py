@@ -0,0 +1,282 @@
+"""
+Task-graph scheduler for pipeline stages.
+
+Each Task declares the artifacts it reads (inputs) and writes (outputs); artifacts are
+plain strings, usually host paths.  A task depends on every task that outputs one of its
+inputs, so independent branches (gsplat training and OpenMVS densification off the same
+sparse model, model_analyzer next to the PLY export) run concurrently.
+
+Tasks also declare resources (cpu, mem_gb, gpu).  A task only starts when its resources
+fit in what is left of the machine budget, so heavy steps such as DensifyPointCloud never
+run on top of each other; a task asking for more than the whole budget runs alone.
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loguru import logger
+
+from scripts.errors import QualityCheckFailed
+from scripts.executors import pipeline_session
+
+
+def machine_resources():
+    """cpu count, total memory (GB) and a single GPU slot."""
+    mem_gb = 0.0
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    mem_gb = int(line.split()[1]) / (1024 * 1024)
+                    break
+    except OSError:
+        mem_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+    return {"cpu": os.cpu_count() or 1, "mem_gb": mem_gb, "gpu": 1}
+
+
+class Task:
+    """One pipeline step: func(*args, **kwargs) with declared artifacts and resources."""
+
+    def __init__(self, name, func, args=(), kwargs=None, inputs=(), outputs=(), after=(), cpu=1, mem_gb=1.0, gpu=0,
+                 priority=0):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.inputs = [str(a) for a in inputs]
+        self.outputs = [str(a) for a in outputs]
+        self.after = list(after)
+        self.resources = {"cpu": cpu, "mem_gb": mem_gb, "gpu": gpu}
+        self.priority = priority  # lower starts first among ready tasks
+
+    def __repr__(self):
+        return f"Task({self.name!r})"
+
+
+class TaskGraph:
+    """Tasks plus the dependencies implied by their inputs/outputs."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, task):
+        if task.name in self.tasks:
+            raise ValueError(f"Duplicate task name '{task.name}'")
+        self.tasks[task.name] = task
+        return task
+
+    def dependencies(self):
+        """{task name: set of task names it waits for}"""
+        producers = {}
+        for task in self.tasks.values():
+            for artifact in task.outputs:
+                if artifact in producers:
+                    raise ValueError(f"Artifact '{artifact}' is produced by both '{producers[artifact]}' and '{task.name}'")
+                producers[artifact] = task.name
+
+        deps = {}
+        for task in self.tasks.values():
+            names = {producers[a] for a in task.inputs if a in producers} | set(task.after)
+            unknown = names - set(self.tasks)
+            if unknown:
+                raise ValueError(f"Task '{task.name}' runs after unknown task(s): {', '.join(sorted(unknown))}")
+            deps[task.name] = names - {task.name}
+        return deps
+
+    def levels(self):
+        """Tasks grouped into waves that could run together (ignoring resources); raises on cycles."""
+        deps = self.dependencies()
+        done, levels = set(), []
+        while len(done) < len(deps):
+            ready = sorted(name for name, d in deps.items() if name not in done and d <= done)
+            if not ready:
+                raise ValueError(f"Dependency cycle between: {', '.join(sorted(set(deps) - done))}")
+            levels.append(ready)
+            done.update(ready)
+        return levels
+
+
+class Scheduler:
+    """
+    Run a TaskGraph on a thread pool within a cpu/memory/gpu budget.
+
+    Ready tasks are started in (priority, name) order, each one that fits in the remaining
+    budget (first-fit).  With keep_going, a failure only skips the tasks that depend on it;
+    on_finish(name, ok) is called as every task ends.
+    """
+
+    def __init__(self, graph, resources=None, keep_going=False, on_finish=None):
+        self.graph = graph
+        self.capacity = dict(machine_resources(), **(resources or {}))
+        self.available = dict(self.capacity)
+        self.keep_going = keep_going
+        self.on_finish = on_finish
+        self.timings = {}
+
+    def _request(self, task):
+        # never ask for more than the machine has, so oversized tasks still run (alone)
+        return {k: min(v, self.capacity.get(k, 0)) for k, v in task.resources.items()}
+
+    def _fits(self, request):
+        return all(self.available.get(k, 0) >= v for k, v in request.items())
+
+    def _run_task(self, task):
+        start_time = time.time()
+        logger.info(f"▶️ [{task.name}] started")
+        task.func(*task.args, **task.kwargs)
+        self.timings[task.name] = time.time() - start_time
+        logger.success(f"✅ [{task.name}] finished in {self.timings[task.name]:.1f} sec")
+
+    def run(self):
+        deps = self.graph.dependencies()
+        self.graph.levels()  # cycle check before anything starts
+        pending = set(deps)
+        done = set()
+        failed = set()
+        running = {}
+        failure = None
+        start_time = time.time()
+
+        max_workers = max(1, len(deps))
+        with pipeline_session(), ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending or running:
+                # tasks downstream of a failure can never run
+                blocked = [name for name in pending if deps[name] & failed]
+                while blocked:
+                    for name in blocked:
+                        failed.add(name)
+                        pending.discard(name)
+                        logger.warning(f"⏭️ [{name}] skipped: depends on a failed task")
+                    blocked = [name for name in pending if deps[name] & failed]
+
+                if failure is None or self.keep_going:
+                    for name in sorted(pending, key=lambda n: (self.graph.tasks[n].priority, n)):
+                        task = self.graph.tasks[name]
+                        request = self._request(task)
+                        if deps[name] <= done and self._fits(request):
+                            for k, v in request.items():
+                                self.available[k] -= v
+                            # in the caller's context: tasks profile into its profile_steps file
+                            running[pool.submit(contextvars.copy_context().run, self._run_task, task)] = (name, request)
+                            pending.discard(name)
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, request = running.pop(future)
+                    for k, v in request.items():
+                        self.available[k] += v
+                    try:
+                        future.result()
+                        done.add(name)
+                    except BaseException as e:  # StepFailed, QualityCheckFailed, ...
+                        logger.error(f"❌ [{name}] failed: {e!r}" + ("" if self.keep_going else "; not starting further tasks"))
+                        failed.add(name)
+                        failure = failure or (name, e)
+                    if self.on_finish:
+                        self.on_finish(name, name in done)
+
+        elapsed = time.time() - start_time
+        serial = sum(self.timings.values())
+        logger.info(f"⏱️ Graph wall time {elapsed:.1f} sec vs {serial:.1f} sec of task time "
+                    f"({len(done)} of {len(deps)} tasks)")
+        if failure:
+            name, error = failure
+            raise RuntimeError(f"Task '{name}' failed") from error
+        return self.timings
+
+
+def build_colmap_graph(project_dir, model="0", video_path=None, extract_options=None, mask_filter=None,
+                       gsplat=True, mvs=True, iterations=30000, sh_degree=3, matcher="sequential"):
+    """
+    Graph for one project folder (projects/<video>-<variant>):
+
+        extract → masks → features → match → map → {ply export, model_analyzer, gsplat, mvs}
+
+    extract runs only when video_path is given; masks only with a mask_filter; plan-pairs
+    (before match) only with matcher="planned".
+    """
+    from functools import partial
+    from pathlib import Path
+    from scripts import colmap_pipeline as colmap
+    from scripts.container_paths import host_to_container_path
+
+    project_dir = os.path.normpath(str(project_dir))
+    scene = os.path.basename(project_dir)
+    images = os.path.join(project_dir, "images")
+    model_dir = os.path.join(project_dir, "colmap", model)
+    db = os.path.join(model_dir, "db.db")
+    sparse = os.path.join(model_dir, "sparse")
+    masks = os.path.join(model_dir, "masks")
+    graph = TaskGraph()
+    graph_start = time.time()
+
+    if video_path:
+        from scripts.extract_frames import extract_frames_from_file
+        graph.add(Task("extract", extract_frames_from_file, (video_path, images),
+                       dict(tag=scene, **(extract_options or {})), outputs=[images], cpu=8, mem_gb=2))
+
+    if mask_filter:
+        from scripts.mask_generator import generate_masks_in_directory
+        graph.add(Task("masks", generate_masks_in_directory, (Path(images), Path(masks)), dict(filter=mask_filter),
+                       inputs=[images], outputs=[masks], cpu=8, mem_gb=4))
+
+    def prepare():
+        os.makedirs(sparse, exist_ok=True)
+        os.makedirs(os.path.join(model_dir, "stats"), exist_ok=True)
+
+    graph.add(Task("prepare", prepare, outputs=[model_dir], cpu=0, mem_gb=0))
+    from scripts.colmap_database import FeatureCache, matcher_runner
+    graph.add(Task("features", colmap.run_colmap_feature_extractor,
+                   (host_to_container_path(images), host_to_container_path(db),
+                    host_to_container_path(masks) if mask_filter else None),
+                   dict(run=FeatureCache().runner(db)),
+                   inputs=[images, model_dir] + ([masks] if mask_filter else []),
+                   outputs=[f"{db}:features"], cpu=8, mem_gb=4))
+    pairs = os.path.join(model_dir, "pairs.txt")
+    if matcher == "planned":
+        from scripts.pair_planner import write_pairs
+        graph.add(Task("plan-pairs", write_pairs, (images, pairs), inputs=[images, model_dir], outputs=[pairs],
+                       cpu=4, mem_gb=1))
+    graph.add(Task("match", colmap.run_colmap_matcher, (matcher, host_to_container_path(db), host_to_container_path(pairs)),
+                   dict(run=matcher_runner()), inputs=[f"{db}:features"] + ([pairs] if matcher == "planned" else []),
+                   outputs=[f"{db}:matches"], cpu=8, mem_gb=4))
+
+    def map_():
+        from scripts.colmap_database import check_view_graph
+        check_view_graph(db)
+        colmap.run_colmap_mapper(host_to_container_path(db), host_to_container_path(images),
+                                 host_to_container_path(sparse))
+        colmap.flatten_sparse_model(sparse, model_id="0")
+        if not os.path.exists(os.path.join(sparse, "points3D.bin")):
+            raise QualityCheckFailed("Mapper did not produce a model", "map")
+
+    graph.add(Task("map", map_, inputs=[f"{db}:matches"], outputs=[sparse], cpu=8, mem_gb=8))
+
+    ply = os.path.join(sparse, "0.ply")
+    graph.add(Task("export-ply", colmap.run_colmap_model_converter,
+                   (host_to_container_path(sparse), host_to_container_path(ply)),
+                   inputs=[sparse], outputs=[ply], cpu=1, mem_gb=1))
+
+    stats_file = os.path.join(model_dir, "stats", f"model_analyzer-{model}.json")
+    graph.add(Task("analyze", lambda: colmap.run_colmap_model_analyzer(
+                       host_to_container_path(sparse), stats_file, time.time() - graph_start),
+                   inputs=[sparse], outputs=[stats_file], cpu=1, mem_gb=1))
+
+    if gsplat:
+        from scripts.gsplat_pipeline import run_gsplat_pipeline
+        gsplat_dir = os.path.join(project_dir, "gsplat", model)
+        graph.add(Task("gsplat", partial(run_gsplat_pipeline, scene, images, sparse, gsplat_dir, iterations, sh_degree),
+                       inputs=[sparse], outputs=[gsplat_dir], cpu=4, mem_gb=16, gpu=1))
+
+    if mvs:
+        from scripts.openmvs_pipeline import mvs_pipeline
+        mvs_dir = os.path.join(project_dir, "mvs", model)
+        # DensifyPointCloud uses every core and a lot of memory
+        graph.add(Task("mvs", mvs_pipeline, (images, sparse, mvs_dir),
+                       inputs=[sparse], outputs=[mvs_dir], cpu=os.cpu_count() or 1, mem_gb=24))
+
+    return graph
@@ -0,0 +1,158 @@
+"""
+One columnar table of sparse-model statistics for every project (projects/stats.parquet).
+
+`cli.py stats refresh` finds every sparse model under projects/, in both layouts
+
+    projects/<scenario>/colmap/sparse/<N>        (make targets; stats/model_analyzer-sparse-<N>.json)
+    projects/<scenario>/colmap/<model>/sparse    (run-graph; <model>/stats/model_analyzer-<model>.json)
+
+and recomputes only the models whose .bin files changed since the table was written,
+judged by size + mtime (fast) or by a hash of the files (robust to copies and touches).
+Statistics come from the NumPy model reader (scripts/colmap_model.py) in a process pool;
+the pipeline's own model_analyzer JSON, when present, adds what only the run knows
+(Elapsed, CPU time, peak memory, ...).  Every row also carries the parameters parsed from the
+scenario name, so reports and notebooks load one file instead of thousands of JSONs:
+
+    from scripts.stats_store import load_stats
+    df = load_stats()
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+DEFAULT_STATS_FILE = os.path.join("projects", "stats.parquet")
+MODEL_FILES = ("cameras.bin", "images.bin", "points3D.bin")
+# keys of the pipeline's model_analyzer JSON that the .bin files cannot tell
+RUN_KEYS = ("Elapsed", "Timestamp", "CPU Time", "Peak Memory MB", "Memory Source", "Read MB", "Write MB")
+
+
+def find_models(projects_dir="projects"):
+    """[(scenario, model id, sparse model folder)] for every folder holding a points3D.bin."""
+    projects_dir = Path(projects_dir)
+    models = []
+    for folder in sorted(projects_dir.glob("*/colmap/sparse/*")):
+        if (folder / "points3D.bin").exists():
+            models.append((folder.parents[2].name, f"sparse-{folder.name}", folder))
+    for folder in sorted(projects_dir.glob("*/colmap/*/sparse")):
+        if (folder / "points3D.bin").exists():
+            models.append((folder.parents[2].name, folder.parent.name, folder))
+    return models
+
+
+def stats_json_for(folder):
+    """The model_analyzer JSON the pipeline writes for a sparse model folder."""
+    folder = Path(folder)
+    if folder.parent.name == "sparse":
+        return folder.parents[1] / "stats" / f"model_analyzer-sparse-{folder.name}.json"
+    return folder.parent / "stats" / f"model_analyzer-{folder.parent.name}.json"
+
+
+def fingerprint(folder, check="mtime"):
+    """Identity of a model's .bin files: size and mtime of each, or a hash of their contents."""
+    folder = Path(folder)
+    if check == "hash":
+        digest = hashlib.sha256()
+        for name in MODEL_FILES:
+            with open(folder / name, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+    if check == "mtime":
+        stats = [os.stat(folder / name) for name in MODEL_FILES]
+        return ";".join(f"{s.st_size}:{s.st_mtime_ns}" for s in stats)
+    raise ValueError(f"Unknown staleness check: {check}")
+
+
+def _analyze(scenario, model_id, folder, check):
+    """One table row (runs in a worker process)."""
+    from scripts.colmap_model import model_statistics
+
+    start_time = time.time()
+    row = {"Scenario": scenario, "Model ID": model_id, "Model Path": str(folder),
+           "Fingerprint": fingerprint(folder, check), "Check": check}
+    row.update(model_statistics(folder))
+    try:
+        with open(stats_json_for(folder)) as f:
+            run = json.load(f)
+        row.update({key: run[key] for key in RUN_KEYS if key in run})
+    except (OSError, ValueError):
+        pass
+    row["Analyzed"] = time.time() - start_time
+    return row
+
+
+def refresh_stats(projects_dir="projects", stats_file=DEFAULT_STATS_FILE, check="mtime", workers=None, force=False):
+    """Bring stats_file up to date with the models under projects_dir; returns the table."""
+    import pandas as pd
+
+    from scripts.colmap_pipeline import add_derived_metrics, scenario_parameters
+
+    start_time = time.time()
+    models = find_models(projects_dir)
+    previous = load_stats(stats_file) if os.path.exists(stats_file) and not force else None
+    known = {}
+    if previous is not None and "Fingerprint" in previous:
+        known = {(path, chk): fp for path, chk, fp in
+                 zip(previous["Model Path"], previous["Check"], previous["Fingerprint"])}
+
+    # stat/hash every model in parallel (I/O bound), then analyze only the stale ones (CPU bound)
+    with ThreadPoolExecutor(max_workers=workers or 8) as pool:
+        fingerprints = list(pool.map(lambda m: fingerprint(m[2], check), models))
+    stale = [m for m, fp in zip(models, fingerprints) if known.get((str(m[2]), check)) != fp]
+    logger.info(f"📊 {len(models)} sparse models under {projects_dir}, {len(stale)} to analyze")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_analyze, scenario, model_id, folder, check): folder
+                   for scenario, model_id, folder in stale}
+        for future, folder in futures.items():
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                logger.error(f"❌ Could not analyze {folder}: {e!r}")
+
+    fresh = pd.DataFrame(rows)
+    current = {str(m[2]) for m in models}
+    if previous is not None:
+        # keep the rows still up to date; drop the ones re-analyzed or whose model is gone
+        reanalyzed = set(fresh["Model Path"]) if len(fresh) else set()
+        keep = previous["Model Path"].isin(current) & ~previous["Model Path"].isin(reanalyzed)
+        table = pd.concat([previous[keep], fresh], ignore_index=True)
+    else:
+        table = fresh
+    if len(table) == 0:
+        logger.warning(f"⚠️ No sparse models found under {projects_dir}")
+        return table
+
+    if len(fresh):
+        parameters = []
+        for scenario in table["Scenario"]:
+            try:
+                parameters.append(scenario_parameters(scenario))
+            except ValueError:
+                parameters.append({})  # not a <video>-<format>_<fps>_<maxdim>_<filter> project
+        for column in ("Video", "Format", "Filter", "FPS", "MaxDim"):
+            table[column] = [p.get(column) for p in parameters]
+        table = add_derived_metrics(table)
+
+    table = table.sort_values(["Scenario", "Model ID"], ignore_index=True)
+    os.makedirs(os.path.dirname(os.path.abspath(stats_file)), exist_ok=True)
+    tmp = f"{stats_file}.{os.getpid()}.tmp"
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, stats_file)
+    logger.success(f"✅ {len(table)} models ({len(fresh)} analyzed) → {stats_file} "
+                   f"in {time.time() - start_time:.1f} sec")
+    return table
+
+
+def load_stats(stats_file=DEFAULT_STATS_FILE, columns=None):
+    """The stats table as a pandas DataFrame (optionally only some columns)."""
+    import pandas as pd
+
+    return pd.read_parquet(stats_file, columns=columns)
@@ -0,0 +1,201 @@
+"""
+Fingerprint-based skipping of pipeline steps.
+
+A step's fingerprint hashes everything that decides its result:
+
+- the full argv (service, tool and every option, with final output paths)
+- the tool version: a hash of docker/Dockerfile.<service>
+- the content of its input files/folders (sha256, memoized by size and mtime)
+- the fingerprints of the upstream steps it consumes
+
+When a step's stamp (<stamp_dir>/<step>.json) holds the same fingerprint and its outputs
+exist, the step is skipped.  Otherwise it runs with its outputs redirected to hidden
+staging paths next to the real ones, which are swapped in only after the step succeeds,
+and the stamp is written last.  A failed or interrupted step therefore leaves neither a
+half-written output nor a stamp behind.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from loguru import logger
+
+from scripts.utils import run_subprocess
+
+DOCKERFILE_DIR = "docker"
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+class StepCache:
+    """Stamps and input digests for the steps of one pipeline run (e.g. one COLMAP model folder)."""
+
+    def __init__(self, stamp_dir, to_container=None, force=False):
+        self.stamp_dir = str(stamp_dir)
+        self.to_container = to_container or (lambda path: path)
+        self.force = force
+        os.makedirs(self.stamp_dir, exist_ok=True)
+        self.memo_path = os.path.join(self.stamp_dir, "digests.json")
+        try:
+            with open(self.memo_path) as f:
+                self.memo = json.load(f)
+        except (OSError, ValueError):
+            self.memo = {}
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.memo.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        self.memo[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def digest(self, path):
+        """sha256 of a file, or of (relative name, digest) of every file in a folder."""
+        path = str(path)
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return self.file_digest(path)
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path, followlinks=True):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                if name.startswith("."):
+                    continue
+                full = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(full, path)}\0{self.file_digest(full)}\n".encode())
+        return digest.hexdigest()
+
+    def tool_version(self, service):
+        dockerfile = os.path.join(DOCKERFILE_DIR, f"Dockerfile.{service}")
+        return self.file_digest(dockerfile) if os.path.exists(dockerfile) else service
+
+    def fingerprint(self, cmd_suffix, inputs=(), upstream=()):
+        data = {
+            "argv": [str(c) for c in cmd_suffix],
+            "tool": self.tool_version(str(cmd_suffix[0])),
+            "inputs": {str(p): self.digest(p) for p in inputs},
+            "upstream": [u for u in upstream if u],
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def stamp_path(self, name):
+        return os.path.join(self.stamp_dir, f"{name}.json")
+
+    def is_fresh(self, name, fingerprint, outputs):
+        if self.force:
+            return False
+        try:
+            with open(self.stamp_path(name)) as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return stamp.get("fingerprint") == fingerprint and all(os.path.exists(p) for p in outputs)
+
+    def write_stamp(self, name, fingerprint, outputs, elapsed):
+        _write_json(self.stamp_path(name), {
+            "fingerprint": fingerprint,
+            "outputs": list(outputs),
+            "elapsed": elapsed,
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        self.save_memo()
+
+    def save_memo(self):
+        _write_json(self.memo_path, self.memo)
+
+    def step(self, name, inputs=(), outputs=(), output_dirs=(), mutates=(), upstream=(), after=None, runner=None):
+        """A run_subprocess-compatible callable for one cached step (see CachedStep)."""
+        return CachedStep(self, name, inputs, outputs, output_dirs, mutates, upstream, after, runner)
+
+
+class CachedStep:
+    """
+    Call like run_subprocess(cmd_suffix, step_name).
+
+    outputs / output_dirs are host paths of files / folders the step writes; `mutates` are
+    outputs the step updates in place (copied to staging first).  Any argv item equal to the
+    container path of an output is redirected to its staging path.  `after(staged)` runs on
+    the staged outputs before they are committed.  After the call, `fingerprint` can be
+    passed as upstream to later steps.  `runner` produces the staged outputs (default:
+    run_subprocess), e.g. FeatureCache.runner, which may copy them instead of running the tool.
+    """
+
+    def __init__(self, cache, name, inputs, outputs, output_dirs, mutates, upstream, after, runner=None):
+        self.cache = cache
+        self.name = name
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.output_dirs = [str(p) for p in output_dirs]
+        self.mutates = {str(p) for p in mutates}
+        self.upstream = list(upstream)
+        self.after = after
+        self.runner = runner or run_subprocess
+        self.fingerprint = None
+        self.skipped = False
+
+    def __call__(self, cmd_suffix, step_name):
+        cache = self.cache
+        targets = self.outputs + self.output_dirs
+        self.fingerprint = cache.fingerprint(cmd_suffix, self.inputs, self.upstream)
+        if cache.is_fresh(self.name, self.fingerprint, targets):
+            self.skipped = True
+            logger.info(f"⏭️ Skipping [{step_name}]: inputs and command unchanged")
+            return
+
+        token = uuid.uuid4().hex[:8]
+        staged = {p: os.path.join(os.path.dirname(p), f".staging-{token}-{os.path.basename(p)}") for p in targets}
+        # the stamp must not survive a run that changes the outputs
+        _remove(cache.stamp_path(self.name))
+        try:
+            for path, stage in staged.items():
+                if path in self.output_dirs:
+                    if path in self.mutates and os.path.isdir(path):
+                        shutil.copytree(path, stage)
+                    else:
+                        os.makedirs(stage)
+                elif path in self.mutates and os.path.exists(path):
+                    shutil.copyfile(path, stage)
+
+            redirect = {cache.to_container(p): cache.to_container(s) for p, s in staged.items()}
+            start_time = time.time()
+            self.runner([redirect.get(str(c), c) for c in cmd_suffix], step_name)
+            if self.after:
+                self.after(staged)
+
+            # commit: swap every staged output into place
+            for path, stage in staged.items():
+                if path in self.output_dirs:
+                    old = f"{stage}.old"
+                    if os.path.exists(path):
+                        os.rename(path, old)
+                    os.rename(stage, path)
+                    _remove(old)
+                else:
+                    os.replace(stage, path)
+            cache.write_stamp(self.name, self.fingerprint, targets, time.time() - start_time)
+        finally:
+            for stage in staged.values():
+                _remove(stage)
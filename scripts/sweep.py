@@ -0,0 +1,202 @@
+"""
+Resource-aware runner for the Makefile parameter matrix.
+
+The matrix (video-roots × format-roots × fps-roots × width-roots × filter-roots × model-roots)
+is read from the Makefile itself and expanded into the same targets make would build:
+
+    projects/<video>-<format>_<fps>_<width>_<filter>/images          (image job)
+    projects/<video>-<format>_<fps>_<width>_<filter>/colmap/<model>  (model job, after its image job)
+
+Every job still runs through `make <target>`, so the recipes stay the single source of truth.
+Jobs get a rough cost and cpu/memory estimate from image count (clip length after .skip × fps)
+and resolution, are ordered cheapest first and packed onto the cpu/memory budget by the
+task-graph scheduler.  Finished jobs are recorded in a JSON checkpoint so an interrupted
+sweep resumes where it stopped.
+"""
+
+import json
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from scripts.scheduler import Scheduler, Task, TaskGraph
+
+MATRIX_VARIABLES = ["video-roots", "format-roots", "fps-roots", "width-roots", "filter-roots", "model-roots"]
+
+# Rough relative cost per megapixel-image for each stage, and per option found in colmap-model-<n>.
+# Only the ordering matters; the units are "seconds on one of our render boxes" at best.
+COST = {
+    "decode_per_second": 0.5,       # decoding one second of 4K video
+    "image_per_mp": 0.05,           # encode/filter/tag one megapixel image
+    "extract_per_mp": 0.4,          # SIFT extraction
+    "match_per_image": 2.0,         # sequential matching, per image
+    "map_per_image": 1.5,           # incremental mapper, grows faster than linear
+}
+MODEL_FACTORS = {
+    "extract=highres": 4.0,
+    "extract=adaptive": 2.0,
+    "match=loop": 2.0,
+    "match=guided": 1.5,
+    "mapper=robust": 1.5,
+    "mapper=highquality": 2.0,
+    "mask=default": 1.2,
+}
+DEFAULT_CLIP_SECONDS = 300
+
+
+def parse_makefile_variables(makefile="Makefile"):
+    """Simple `name := value` / `name = value` assignments (define blocks and recipes are skipped)."""
+    variables = {}
+    in_define = False
+    with open(makefile) as f:
+        for line in f:
+            if line.startswith("define "):
+                in_define = True
+                continue
+            if in_define:
+                in_define = not line.startswith("endef")
+                continue
+            if line.startswith("\t") or line.lstrip().startswith("#"):
+                continue
+            match = re.match(r"^([A-Za-z0-9_.\-]+)\s*:?=\s*(.*?)\s*$", line)
+            if match:
+                variables[match.group(1)] = match.group(2)
+    return variables
+
+
+def clip_seconds(video_path, skip):
+    """Seconds of video after skip, from ffprobe; DEFAULT_CLIP_SECONDS when the video is not here."""
+    if not os.path.exists(video_path):
+        return DEFAULT_CLIP_SECONDS
+    from scripts.extract_frames import probe_video
+    try:
+        return max(0.0, probe_video(video_path)["duration"] - skip)
+    except (subprocess.CalledProcessError, OSError, KeyError, ValueError):
+        return DEFAULT_CLIP_SECONDS
+
+
+def expand_matrix(variables, videos_folder="videos", projects_folder="projects", only=None):
+    """
+    Expand the matrix into image and model jobs with cost and resource estimates.
+
+    `only` maps a matrix variable (e.g. "fps-roots") to the values to keep.
+    """
+    roots = {name: variables.get(name, "").split() for name in MATRIX_VARIABLES}
+    for name, values in (only or {}).items():
+        if values:
+            roots[name] = [v for v in roots[name] if v in values]
+
+    jobs = []
+    for video in roots["video-roots"]:
+        skip = float(variables.get(f"{video}.skip", 0) or 0)
+        seconds = clip_seconds(os.path.join(videos_folder, f"{video}.MP4"), skip)
+        for format in roots["format-roots"]:
+            for fps in roots["fps-roots"]:
+                images = max(1, int(seconds * float(fps)))
+                for width in roots["width-roots"]:
+                    megapixels = int(width) * (int(width) * 9 // 16) / 1e6
+                    for filter in roots["filter-roots"]:
+                        project = f"{video}-{format}_{fps}_{width}_{filter}"
+                        images_target = f"{projects_folder}/{project}/images"
+                        jobs.append({
+                            "id": images_target,
+                            "target": images_target,
+                            "kind": "images",
+                            "images": images,
+                            "cost": seconds * COST["decode_per_second"] + images * megapixels * COST["image_per_mp"],
+                            "cpu": 4,
+                            "mem_gb": 1.0 + 0.1 * megapixels,
+                        })
+                        for model in roots["model-roots"]:
+                            options = variables.get(f"colmap-model-{model}", "")
+                            factor = 1.0
+                            for option, weight in MODEL_FACTORS.items():
+                                if option in options:
+                                    factor *= weight
+                            cost = factor * (images * megapixels * COST["extract_per_mp"]
+                                             + images * COST["match_per_image"]
+                                             + images ** 1.3 * COST["map_per_image"])
+                            target = f"{projects_folder}/{project}/colmap/{model}"
+                            jobs.append({
+                                "id": target,
+                                "target": target,
+                                "kind": "model",
+                                "after": images_target,
+                                "images": images,
+                                "cost": cost,
+                                "cpu": 16,  # recipes run COLMAP with 16 threads
+                                "mem_gb": 2.0 + 0.004 * images * megapixels * (2.0 if "highres" in options else 1.0),
+                            })
+    return jobs
+
+
+class Checkpoint:
+    """JSON record of finished jobs: {"done": {id: seconds}, "failed": {id: time}}."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.done = data.get("done", {})
+        self.failed = data.get("failed", {})
+
+    def record(self, job_id, ok, seconds=None):
+        if ok:
+            self.done[job_id] = seconds
+            self.failed.pop(job_id, None)
+        else:
+            self.failed[job_id] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": self.done, "failed": self.failed}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def run_make_target(target, log_dir, make_args=()):
+    """Build one target with make, output to <log_dir>/<target>.log."""
+    log_file = Path(log_dir) / (target.replace("/", "__") + ".log")
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_file, "w") as log:
+        subprocess.run(["make", *make_args, target], stdout=log, stderr=subprocess.STDOUT, check=True)
+
+
+def run_sweep(jobs, checkpoint_path, cpus=None, mem_gb=None, make_args=(), retry_failed=True, limit=None):
+    """Run jobs cheapest-first within the budget, skipping those already done in the checkpoint."""
+    checkpoint = Checkpoint(checkpoint_path)
+    log_dir = Path(checkpoint_path).parent / "logs"
+
+    todo = [job for job in jobs if job["id"] not in checkpoint.done]
+    if not retry_failed:
+        todo = [job for job in todo if job["id"] not in checkpoint.failed]
+    todo.sort(key=lambda job: job["cost"])
+    if limit:
+        todo = todo[:limit]
+    queued = {job["id"] for job in todo}
+
+    graph = TaskGraph()
+    for rank, job in enumerate(todo):
+        # a model job waits for its image job only if that is part of this run
+        inputs = [job["after"]] if job.get("after") in queued else []
+        graph.add(Task(job["id"], run_make_target, (job["target"], log_dir, make_args),
+                       inputs=inputs, outputs=[job["target"]], cpu=job["cpu"], mem_gb=job["mem_gb"], priority=rank))
+
+    logger.info(f"🧮 Sweep: {len(todo)} jobs to run, {len(jobs) - len(todo)} already done or skipped")
+
+    def on_finish(name, ok):
+        checkpoint.record(name, ok, round(scheduler.timings.get(name, 0.0), 1) if ok else None)
+
+    resources = {k: v for k, v in dict(cpu=cpus, mem_gb=mem_gb).items() if v is not None}
+    scheduler = Scheduler(graph, resources, keep_going=True, on_finish=on_finish)
+    try:
+        scheduler.run()
+    except RuntimeError as e:
+        logger.warning(f"⚠️ Sweep finished with failures ({e}); see {log_dir} and {checkpoint_path}")
+    return checkpoint
@@ -4,60 +4,98 @@ import subprocess
 import time
 import json
 import re
-import matplotlib.pyplot as plt
 
 from loguru import logger
 
 # Configure Loguru
 os.makedirs("logs", exist_ok=True)
 logger.remove()
-logger.add(sys.stderr, level="INFO", colorize=True, format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <level>{message}</level>")
-logger.add("logs/pipeline.log", level="DEBUG", format="{time} | {level} | {message}")
+# enqueue=True: sinks are written by a background thread, so logging never blocks the caller
+logger.add(sys.stderr, level="INFO", colorize=True, format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <level>{message}</level>", enqueue=True)
+logger.add("logs/pipeline.log", level="DEBUG", format="{time} | {level} | {message}", enqueue=True)
 
-# Always point explicitly to the docker-compose.yml
-DOCKER_COMPOSE_PREFIX = [
-    "docker", "compose", "-f", "./docker/docker-compose.yml"
-]
+from scripts.errors import QualityCheckFailed, StepFailed
+from scripts.executors import DOCKER_COMPOSE_PREFIX, get_executor
+from scripts.log_capture import StepLogCapture
+from scripts.resource_monitor import ResourceMonitor
 
 def run_subprocess(cmd_suffix, step_name):
-    """Run a subprocess with live console output and log capture."""
-    full_cmd = DOCKER_COMPOSE_PREFIX + [
-        "run", "--rm",
-        "--user", f"{os.getuid()}:{os.getgid()}"
-    ] + cmd_suffix
+    """Run a subprocess (cmd_suffix = [service, tool, args...]) through the current executor, with live console output and log capture.  Raises StepFailed."""
+    executor = get_executor()
+    full_cmd = executor.command(cmd_suffix[0], [str(c) for c in cmd_suffix[1:]], step_name)
 
     logger.info(f"👉 Running [{step_name}]: {' '.join(full_cmd)}")
 
     start_time = time.time()
-
-    process = subprocess.Popen(
-        full_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1
-    )
-
     try:
-        with process.stdout:
-            for line in process.stdout:
-                line = line.rstrip()
-                if line:
-                    logger.info(f"[{step_name}] {line}")
-
+        process = subprocess.Popen(
+            full_cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",  # tools may print bytes that are not valid in the locale's encoding
+            bufsize=1
+        )
+    except OSError as e:
+        logger.error(f"❌ Could not start step: {step_name}: {e}")
+        raise StepFailed(step_name) from e
+
+    # output is drained by a background thread into logs/steps/*.log.gz (see log_capture)
+    capture = StepLogCapture(process.stdout, step_name).start()
+    monitor = ResourceMonitor(process.pid, step_name, full_cmd).start()
+    try:
         returncode = process.wait()
-        duration = time.time() - start_time
+    except BaseException:
+        # interrupted (Ctrl-C, cancelled task): do not leave the tool running, in its container too
+        executor.terminate(full_cmd, "KILL")
+        process.kill()
+        raise
+    finally:
+        usage = monitor.stop()
+        try:
+            capture.join()
+        finally:
+            process.stdout.close()
+    duration = time.time() - start_time
+
+    if returncode != 0:
+        logger.error(f"❌ Error during step: {step_name} (Exit code {returncode})")
+        for line in list(capture.tail)[-20:]:
+            logger.error(f"[{step_name}] {line}")
+        logger.error(f"❌ Full output: {capture.log_path}")
+        raise StepFailed(step_name, returncode, capture.log_path)
+
+    logger.success(f"✅ Step succeeded: {step_name} (Elapsed time: {duration:.1f} sec, {capture.line_count} lines → {capture.log_path})")
+    logger.info(f"📈 [{step_name}] cpu {usage['cpu_s']:.1f} sec, peak memory {usage['peak_mem_mb']:.0f} MB ({usage['mem_source']}), "
+                f"read {usage['read_mb']:.0f} MB, written {usage['write_mb']:.0f} MB, {usage['max_threads']} threads")
+
+
+def link_or_copy(src, dst):
+    """
+    Materialize src at dst as cheaply as the filesystem allows:
+    hardlink, then reflink (copy-on-write clone), then a plain copy.  Returns the method used.
+    """
+    src, dst = str(src), str(dst)
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
 
-        if returncode == 0:
-            logger.success(f"✅ Step succeeded: {step_name} (Elapsed time: {duration:.1f} sec)")
-        else:
-            logger.error(f"❌ Error during step: {step_name} (Exit code {returncode})")
-            logger.error(f"❌ Aborting pipeline after failed step: {step_name}")
-            sys.exit(returncode)
+    try:
+        import fcntl
+        FICLONE = 0x40049409
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return "reflink"
+    except (OSError, ImportError):
+        pass
 
-    except Exception as e:
-        logger.exception(f"❌ Exception during step: {step_name}: {str(e)}")
-        sys.exit(1)
+    import shutil
+    shutil.copyfile(src, dst)
+    return "copy"
 
 
 def validate_sfm_data_paths(sfm_engine):
@@ -82,8 +120,7 @@ def validate_sfm_data_paths(sfm_engine):
         for p in bad_paths[:5]:
             logger.error(f"  - {p}")
         logger.error("👉 Fix this by using '--use_relative_path' in SfMInit_ImageListing.")
-        logger.error("❌ Aborting pipeline to prevent wasting time.")
-        sys.exit(1)
+        raise QualityCheckFailed(f"{len(bad_paths)} absolute image paths in {sfm_json_path}", "validate-sfm-data")
     else:
         logger.info("✅ All image paths in sfm_data.json are relative → OK.")
 
@@ -119,8 +156,7 @@ def check_and_select_best_matches(match_files, min_valid_matches=10, min_matches
 
     if selected_file is None:
         logger.error(f"❌ No match file passed the threshold of {min_valid_matches} valid pairs.")
-        logger.error("❌ Aborting pipeline prior to SfM.")
-        sys.exit(1)
+        raise QualityCheckFailed(f"No match file with ≥{min_valid_matches} valid pairs", "select-matches")
 
     logger.success(f"✅ Selected match file: {selected_file} with {best_valid_pairs} valid pairs")
     return selected_file
@@ -178,6 +214,8 @@ def plot_match_histogram(match_file, out_path):
         logger.warning(f"⚠️ No match pairs found in: {match_file}")
         return
 
+    import matplotlib.pyplot as plt  # only needed here; keeps every other import of utils fast
+
     plt.figure(figsize=(8, 5))
     plt.hist(match_counts, bins=50, color="skyblue", edgecolor="black")
     plt.title(f"Match Count Histogram\n{os.path.basename(match_file)}")
@@ -203,4 +241,4 @@ def verify_minimum_poses( minimum_poses, sfm_engine ):
     MIN_POSES = minimum_poses
     if num_poses < MIN_POSES:
         logger.error(f"❌ Too few poses ({num_poses}) — aborting pipeline.")
-        sys.exit(1)
+        raise QualityCheckFailed(f"Too few poses ({num_poses} < {MIN_POSES})", "verify-poses")
@@ -0,0 +1,319 @@
+"""
+Directory-based work queue for running pipeline steps on other machines.
+
+Machines that share the projects/ tree (NFS or similar) each run `queue-worker`; the
+pipeline host uses the `queue` executor (GBT_EXECUTOR=queue).  Every step then becomes a
+job file in the queue folder (GBT_QUEUE_DIR, default projects/.queue):
+
+    pending/<job>.json   waiting; workers claim a job by renaming it to running/
+    running/<job>.json   claimed, with the id of the worker that owns it
+    running/<job>.beat   heartbeat: "<worker> <counter>", rewritten by the owner every few seconds
+    output/<job>.log     the step's output, appended while it runs
+    done/<job>.json      exit code plus every attempt: worker, host, start, end
+    cancel/<job>         the submitter gave up; the worker stops the step
+    history.jsonl        one line per finished attempt, for all jobs
+
+The submitting side is a small client process (`queue-submit`, started by run_subprocess
+through QueueExecutor.command) that writes the job, streams output/<job>.log to its stdout
+and exits with the step's exit code, so log capture and profiling keep working.  The
+client also acts as coordinator for its job: a job whose heartbeat has not changed for
+STALE_AFTER seconds of the client's own clock is put back in pending/ (the heartbeat is
+compared by content, so clock skew between machines and NFS attribute caching do not
+matter).  A worker only heartbeats, retries or finishes a job it still owns, and stops its
+step when the job was taken away from it.  A step that fails is retried on the next free worker up to `retries`
+times.  Workers run steps with their own executor (docker-exec by default), so containers
+live on the worker machine.
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+DEFAULT_QUEUE_DIR = os.path.join("projects", ".queue")
+HEARTBEAT_INTERVAL = 5   # seconds between worker heartbeats
+STALE_AFTER = 60         # seconds without a new heartbeat before a job is requeued
+FOLDERS = ("pending", "running", "output", "done", "cancel")
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class WorkQueue:
+    """The queue folder and the atomic moves between its states."""
+
+    def __init__(self, queue_dir=None):
+        self.queue_dir = str(queue_dir or os.environ.get("GBT_QUEUE_DIR", DEFAULT_QUEUE_DIR))
+        for folder in FOLDERS:
+            os.makedirs(os.path.join(self.queue_dir, folder), exist_ok=True)
+        self._beats = {}  # job id -> (last heartbeat seen, time.monotonic() when it changed)
+
+    def path(self, folder, job_id, suffix=".json"):
+        return os.path.join(self.queue_dir, folder, f"{job_id}{suffix}")
+
+    def submit(self, service, argv, step_name="", retries=1, cwd=None):
+        # time-ordered ids: workers take the oldest pending job first
+        job_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        job = {
+            "id": job_id,
+            "service": service,
+            "argv": [str(a) for a in argv],
+            "step": step_name,
+            "cwd": cwd or os.getcwd(),
+            "retries": retries,
+            "attempts": [],
+            "submitted": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "submitter": socket.gethostname(),
+        }
+        _write_json(self.path("pending", job_id), job)
+        return job_id
+
+    def claim(self, services=None):
+        """Oldest pending job (for one of `services`, if given) renamed into running/, or None."""
+        for name in sorted(os.listdir(os.path.join(self.queue_dir, "pending"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            if services:
+                job = _read_json(self.path("pending", job_id))
+                if not job or job["service"] not in services:
+                    continue
+            try:
+                # rename is atomic: exactly one worker wins the job
+                os.rename(self.path("pending", job_id), self.path("running", job_id))
+            except OSError:
+                continue
+            job = _read_json(self.path("running", job_id))
+            if job:
+                return job
+        return None
+
+    def owns(self, job_id, worker_id):
+        """Whether job_id is still running/ under worker_id (not requeued, not taken by another worker)."""
+        job = _read_json(self.path("running", job_id))
+        return job is not None and job.get("worker") == worker_id
+
+    def heartbeat(self, job_id, worker_id, count):
+        """Write the heartbeat of an owned job; False when the job is no longer this worker's."""
+        if not self.owns(job_id, worker_id):
+            return False
+        path = self.path("running", job_id, ".beat")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{worker_id} {count}\n")
+        os.replace(tmp, path)
+        return True
+
+    def _clear_heartbeat(self, job_id):
+        self._beats.pop(job_id, None)
+        try:
+            os.unlink(self.path("running", job_id, ".beat"))
+        except OSError:
+            pass
+
+    def requeue(self, job, attempt=None):
+        if attempt:
+            job["attempts"].append(attempt)
+        job.pop("worker", None)
+        _write_json(self.path("running", job["id"]), job)
+        self._clear_heartbeat(job["id"])
+        try:
+            os.rename(self.path("running", job["id"]), self.path("pending", job["id"]))
+        except OSError:
+            pass
+
+    def requeue_stale(self, job_id, stale_after=STALE_AFTER):
+        """Put a running job whose heartbeat stopped changing for stale_after seconds back in pending/."""
+        running = self.path("running", job_id)
+        if not os.path.exists(running):
+            self._beats.pop(job_id, None)
+            return False
+        try:
+            with open(self.path("running", job_id, ".beat")) as f:
+                beat = f.read().strip()
+        except OSError:
+            beat = None  # claimed, no heartbeat yet
+        now = time.monotonic()
+        last = self._beats.get(job_id)
+        if last is None or last[0] != beat:
+            self._beats[job_id] = (beat, now)
+            return False
+        if now - last[1] < stale_after:
+            return False
+        job = _read_json(running)
+        if not job:
+            return False
+        logger.warning(f"⚠️ Job {job_id} ({job['step']}) lost its worker {job.get('worker')}; requeueing")
+        self.requeue(job, {"worker": job.get("worker"), "returncode": None, "error": "worker lost",
+                           "finished": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        return True
+
+    def finish(self, job, returncode):
+        job["returncode"] = returncode
+        if not os.path.exists(self.path("done", job["id"])):
+            _write_json(self.path("done", job["id"]), job)
+        self._clear_heartbeat(job["id"])
+        try:
+            os.unlink(self.path("running", job["id"]))
+        except OSError:
+            pass
+
+    def record_attempt(self, job, attempt):
+        with open(os.path.join(self.queue_dir, "history.jsonl"), "a") as f:
+            f.write(json.dumps(dict(attempt, job=job["id"], step=job["step"], service=job["service"])) + "\n")
+
+    def cancel(self, job_id):
+        open(self.path("cancel", job_id, ""), "w").close()
+        try:
+            os.unlink(self.path("pending", job_id))
+        except OSError:
+            pass
+
+    def cancelled(self, job_id):
+        return os.path.exists(self.path("cancel", job_id, ""))
+
+
+def submit_and_wait(service, argv, step_name="", queue_dir=None, retries=1, poll=0.5, out=None):
+    """Submit one step, stream its output to `out` and return its exit code (the queue-submit client)."""
+    out = out or sys.stdout
+    queue = WorkQueue(queue_dir)
+    job_id = queue.submit(service, argv, step_name, retries)
+    out.write(f"📮 Queued {step_name or ' '.join(argv)} as job {job_id} in {queue.queue_dir}\n")
+    out.flush()
+
+    def give_up(signum, frame):
+        queue.cancel(job_id)
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, give_up)
+    position = 0
+    log_path = queue.path("output", job_id, ".log")
+    try:
+        while True:
+            done = _read_json(queue.path("done", job_id))
+            if os.path.exists(log_path):
+                with open(log_path, errors="replace") as log:
+                    log.seek(position)
+                    chunk = log.read()
+                    position = log.tell()
+                if chunk:
+                    out.write(chunk)
+                    out.flush()
+            if done is not None:
+                last = done["attempts"][-1] if done["attempts"] else {}
+                out.write(f"📮 Job {job_id} finished on {last.get('worker', '?')} with exit code {done['returncode']}\n")
+                out.flush()
+                return done["returncode"]
+            queue.requeue_stale(job_id)
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        queue.cancel(job_id)
+        return 130
+
+
+def _stop(process, executor, full_cmd, grace=10):
+    """Stop a job's tool where it runs (inside the container for docker executors), then its host process."""
+    if not executor.terminate(full_cmd, "TERM"):
+        process.terminate()
+    try:
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        pass
+    executor.terminate(full_cmd, "KILL")
+    if process.poll() is None:
+        process.kill()
+
+
+def _run_job(queue, job, executor, worker_id):
+    """Run one claimed job to completion (or cancellation); returns its exit code."""
+    attempt = {"worker": worker_id, "host": socket.gethostname(), "pid": os.getpid(),
+               "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    job["worker"] = worker_id
+    _write_json(queue.path("running", job["id"]), job)
+    full_cmd = executor.command(job["service"], job["argv"], job["step"])
+    start_time = time.time()
+
+    with open(queue.path("output", job["id"], ".log"), "a") as log:
+        log.write(f"--- attempt {len(job['attempts']) + 1} on {worker_id} ({attempt['host']}) ---\n")
+        log.flush()
+        # the repo may be checked out elsewhere on this machine; steps only use relative/container paths
+        cwd = job["cwd"] if os.path.isdir(job["cwd"]) else None
+        process = subprocess.Popen(full_cmd, stdout=log, stderr=subprocess.STDOUT, cwd=cwd)
+        beats = 0
+        while process.poll() is None:
+            beats += 1
+            if not queue.heartbeat(job["id"], worker_id, beats):
+                logger.warning(f"🛑 Job {job['id']} was requeued by its submitter; stopping it here")
+                _stop(process, executor, full_cmd)
+                break
+            if queue.cancelled(job["id"]):
+                logger.warning(f"🛑 Job {job['id']} cancelled by its submitter")
+                _stop(process, executor, full_cmd)
+                break
+            try:
+                process.wait(HEARTBEAT_INTERVAL)
+            except subprocess.TimeoutExpired:
+                pass
+        returncode = process.wait()
+
+    attempt.update(returncode=returncode, elapsed=round(time.time() - start_time, 1),
+                   finished=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    queue.record_attempt(job, attempt)
+    if not queue.owns(job["id"], worker_id):
+        # requeued meanwhile (and maybe claimed by another worker): the job is no longer ours to end
+        return returncode
+    if returncode != 0 and not queue.cancelled(job["id"]) and len(job["attempts"]) < job["retries"]:
+        logger.warning(f"🔁 Job {job['id']} ({job['step']}) failed with {returncode}; requeueing for retry")
+        queue.requeue(job, attempt)
+    else:
+        job["attempts"].append(attempt)
+        queue.finish(job, returncode)
+    return returncode
+
+
+def run_worker(queue_dir=None, executor_name=None, worker_id=None, services=None, poll=1.0, max_jobs=None):
+    """Claim and run jobs until interrupted (or after max_jobs); one step at a time."""
+    from scripts.executors import pipeline_session
+
+    executor_name = executor_name or os.environ.get("GBT_WORKER_EXECUTOR", "docker-exec")
+    if executor_name == "queue":
+        raise ValueError("A queue worker needs an executor that runs steps itself (docker-exec, compose-run, local)")
+    queue = WorkQueue(queue_dir)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"👷 Worker {worker_id} serving {queue.queue_dir} with {executor_name}"
+                + (f" (services: {', '.join(services)})" if services else ""))
+    jobs = 0
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    # one session for the worker's lifetime: docker-exec containers are reused across jobs
+    with pipeline_session(executor_name) as executor:
+        while not stop.is_set() and (max_jobs is None or jobs < max_jobs):
+            job = queue.claim(services)
+            if job is None:
+                stop.wait(poll)
+                continue
+            logger.info(f"▶️ {worker_id}: job {job['id']} [{job['step']}]")
+            returncode = _run_job(queue, job, executor, worker_id)
+            logger.info(f"{'✅' if returncode == 0 else '❌'} {worker_id}: job {job['id']} exit code {returncode}")
+            jobs += 1
+    return jobs